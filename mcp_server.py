@@ -1,16 +1,30 @@
 # mcp_server.py - Minimaler MCP-Server für UIN
 import json
-import subprocess
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 from mcp.server import Server, NotificationOptions
 from mcp.server.models import TextContent
 import mcp.server.stdio
 import asyncio
 
+# Extraktion läuft im Prozess (kein Python-Start pro Tool-Aufruf)
+from utils.extract_edges import create_uin_package
+from utils.edge_cache import EdgeCache
+
+# Maximale Anzahl gleichzeitig laufender Extraktionen
+DEFAULT_MAX_WORKERS = int(os.environ.get("UIN_MCP_MAX_WORKERS", os.cpu_count() or 4))
+
 class UINServer:
-    def __init__(self):
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS,
+                 cache_dir: Optional[str] = os.environ.get("UIN_EDGE_CACHE_DIR")):
         self.server = Server("uin-tools")
         
+        # OpenCV gibt das GIL bei Dekodieren/Canny/Kodieren frei, daher Threads
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="uin-tool")
+        self.cache = EdgeCache(cache_dir) if cache_dir else None
+        
         # UIN-Tools als MCP-Tools verfügbar machen
         self.server.list_tools()(self.list_tools)
         self.server.call_tool()(self.call_tool)
@@ -46,15 +60,19 @@ class UINServer:
     async def call_tool(self, name: str, arguments: dict) -> List[TextContent]:
         """Führe UIN-Tools aus"""
         if name == "extract_edges":
-            # Nutze das vorhandene Python-Skript
-            result = subprocess.run(
-                ["python", "utils/extract_edges.py", arguments["image_path"], 
-                 "-l", str(arguments.get("low_threshold", 100)),
-                 "-H", str(arguments.get("high_threshold", 200))],
-                capture_output=True,
-                text=True
-            )
-            return [TextContent(type="text", text=result.stdout)]
+            # Extraktion im Worker-Pool, der Event-Loop bleibt frei
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(
+                    self.executor,
+                    self._extract_edges,
+                    arguments["image_path"],
+                    int(arguments.get("low_threshold", 100)),
+                    int(arguments.get("high_threshold", 200))
+                )
+            except Exception as e:
+                return [TextContent(type="text", text=f"❌ Fehler: {e}")]
+            return [TextContent(type="text", text=result)]
         
         elif name == "generate_from_uin":
             uin_data = json.loads(arguments["uin_json"])
@@ -64,6 +82,15 @@ class UINServer:
         
         return [TextContent(type="text", text=f"Tool {name} nicht gefunden")]
     
+    def _extract_edges(self, image_path: str, low: int, high: int) -> str:
+        """Erstellt das UIN-Paket (läuft in einem Worker-Thread)"""
+        result = create_uin_package(image_path, "./uin_output", low, high, cache=self.cache)
+        return (f"✅ UIN-Paket erstellt:\n"
+                f"   Kantenbild: {result['edge_image']}\n"
+                f"   UIN-JSON: {result['uin_json']}\n"
+                f"   Vorschau: {result['preview']}\n"
+                f"   Kantendichte: {result['stats']['edge_percentage']:.2f}%\n")
+    
     def _uin_to_prompt(self, uin_data: dict) -> str:
         """Konvertiere UIN-JSON zu Prompt (existiert bereits in React-Code)"""
         # Nutze dieselbe Logik wie in src/App.jsx
@@ -4,76 +4,303 @@ BLIP-basierte Attribut-Extraktion für UIN
 """
 
 import torch
-from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
+from PIL import Image, ImageOps
 import cv2
 import numpy as np
 import json
-from typing import List, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
 import os
+import sys
+from pathlib import Path
+
+# Gemeinsamer Code liegt im Paket utils/ der Repo-Wurzel
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(1, str(REPO_ROOT))
+from utils.palette import dominant_colors
+
+from model_registry import (BACKEND_HELP, BACKENDS, BLIP_MODEL, EXPERIMENTAL_BACKENDS, get_blip,
+                            registry, set_num_threads)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+class ImageAnalysisContext:
+    """
+    Ein Bild, genau einmal dekodiert, mit gemeinsam genutzten Zwischenergebnissen
+    
+    Graustufen, HSV, Canny-Kanten und Farbstatistik werden beim ersten
+    Zugriff berechnet und von allen Analysen wiederverwendet. Die Zeiten
+    landen in intermediates_ms; analyzer() misst die reine Rechenzeit einer
+    Analyse (ohne darin erstmals berechnete Zwischenergebnisse).
+    
+    Pixel und Abmessungen sind EXIF-orientiert wie bei cv2.imread.
+    """
+    
+    def __init__(self, image_path: str):
+        self.image_path = image_path
+        self.intermediates_ms: Dict[str, float] = {}
+        self.analyzers_ms: Dict[str, float] = {}
+        self._cache: Dict[str, Any] = {}
+        
+        start = time.perf_counter()
+        with Image.open(image_path) as img:
+            self.mode = img.mode
+            self.format = img.format
+            # Erst drehen, dann konvertieren: Größe nach der Orientierung
+            oriented = ImageOps.exif_transpose(img)
+            self.width, self.height = oriented.size
+            # RGB-Bild dient auch direkt als BLIP-Eingabe
+            self.rgb_image = oriented.convert('RGB')
+        self.bgr = cv2.cvtColor(np.asarray(self.rgb_image), cv2.COLOR_RGB2BGR)
+        self.intermediates_ms["decode"] = (time.perf_counter() - start) * 1000
+    
+    def _get(self, name: str, compute):
+        if name not in self._cache:
+            start = time.perf_counter()
+            self._cache[name] = compute()
+            self.intermediates_ms[name] = (time.perf_counter() - start) * 1000
+        return self._cache[name]
+    
+    @property
+    def gray(self) -> np.ndarray:
+        return self._get("gray", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+    
+    @property
+    def hsv(self) -> np.ndarray:
+        return self._get("hsv", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV))
+    
+    @property
+    def edges(self) -> np.ndarray:
+        return self._get("canny", lambda: cv2.Canny(self.gray, 100, 200))
+    
+    @property
+    def edge_density(self) -> float:
+        edges = self.edges
+        return cv2.countNonZero(edges) / edges.size
+    
+    @property
+    def color_std(self) -> float:
+        """Standardabweichung über alle Kanäle (wie img.std(), ohne float64-Kopie)"""
+        def compute():
+            means, stds = cv2.meanStdDev(self.bgr)
+            means, stds = means.ravel(), stds.ravel()
+            total_mean = means.mean()
+            return float(np.sqrt(max((stds ** 2 + means ** 2).mean() - total_mean ** 2, 0.0)))
+        return self._get("color_std", compute)
+    
+    @contextmanager
+    def analyzer(self, name: str):
+        """Misst eine Analyse; Zwischenergebnisse zählen separat"""
+        intermediates_before = sum(self.intermediates_ms.values())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            shared = sum(self.intermediates_ms.values()) - intermediates_before
+            self.analyzers_ms[name] = self.analyzers_ms.get(name, 0.0) + elapsed - shared
+    
+    def timing_report(self) -> Dict[str, Any]:
+        return {
+            "intermediates_ms": dict(self.intermediates_ms),
+            "analyzers_ms": dict(self.analyzers_ms),
+            "total_ms": sum(self.intermediates_ms.values()) + sum(self.analyzers_ms.values())
+        }
 
 class UINAttributeExtractor:
-    def __init__(self, device=None):
-        """Initialisiert BLIP Model für Bildbeschreibung"""
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    def __init__(self, device=None, model_name: str = BLIP_MODEL, backend: str = "fp32",
+                 num_threads: Optional[int] = None):
+        """
+        Initialisiert den Extraktor für Bildbeschreibungen
         
-        print(f"Lade BLIP Model auf {self.device}...")
-        self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-        self.model = BlipForConditionalGeneration.from_pretrained(
-            "Salesforce/blip-image-captioning-base"
-        ).to(self.device)
+        Das BLIP Model wird erst bei der ersten Caption geladen und über die
+        Model-Registry mit allen Instanzen im Prozess geteilt.
         
-        print("BLIP Model geladen ✓")
+        Args:
+            device: "cuda" oder "cpu" (Standard: automatisch)
+            model_name: Hugging-Face-Modell
+            backend: fp32; experimentell int8 oder onnx (nur CPU, siehe model_registry)
+            num_threads: Intra-Op-Threads für die Inferenz
+        """
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model_name = model_name
+        self.backend = backend
+        self.num_threads = num_threads
+        set_num_threads(num_threads)
+        
+        # Statistik des letzten caption_batch-Aufrufs (nur für einen Aufrufer;
+        # geteilte Extraktoren nutzen caption_batch_with_stats)
+        self.last_caption_stats = {}
+        # Zeiten der letzten extract_detailed_attributes-Analyse
+        # (geteilt: extract_attributes_with_timings)
+        self.last_analysis_timings = {}
+    
+    @property
+    def _blip(self):
+        return get_blip(self.device, self.model_name, self.backend, self.num_threads)
+    
+    @property
+    def processor(self):
+        return self._blip.value[0]
+    
+    @property
+    def model(self):
+        return self._blip.value[1]
     
     def generate_caption(self, image_path: str, max_length: int = 50) -> str:
         """Generiert Bildbeschreibung mit BLIP"""
+        caption = self.caption_batch([image_path], batch_size=1, max_length=max_length)[0]
+        if caption is None:
+            raise ValueError(f"Konnte Bild nicht verarbeiten: {image_path}")
+        return caption
+    
+    def _preprocess(self, image):
+        """Lädt ein Bild (Pfad oder PIL-Bild) und liefert die BLIP pixel_values (3 x H x W)"""
+        if isinstance(image, Image.Image):
+            raw_image = image
+        else:
+            with Image.open(image) as img:
+                raw_image = ImageOps.exif_transpose(img).convert('RGB')
+        return self.processor(images=raw_image, return_tensors="pt")["pixel_values"][0]
+    
+    def caption_batch(self, image_paths: List[str], batch_size: int = 8,
+                      max_length: int = 50, prefetch_workers: int = 4) -> List[Optional[str]]:
+        """Wie caption_batch_with_stats; die Statistik landet in last_caption_stats"""
+        captions, self.last_caption_stats = self.caption_batch_with_stats(
+            image_paths, batch_size, max_length, prefetch_workers
+        )
+        return captions
+    
+    def caption_batch_with_stats(self, image_paths: List[str], batch_size: int = 8,
+                                 max_length: int = 50, prefetch_workers: int = 4
+                                 ) -> Tuple[List[Optional[str]], Dict[str, Any]]:
+        """
+        Generiert Bildbeschreibungen für viele Bilder in Mini-Batches.
         
-        # Bild laden und vorverarbeiten
-        raw_image = Image.open(image_path).convert('RGB')
+        Laden und Vorverarbeiten laufen in einem Thread-Pool dem Modell
+        voraus (höchstens zwei Batches im Voraus). Da BLIP alle Bilder auf
+        dieselbe Größe bringt, werden die pixel_values direkt gestapelt;
+        die erzeugten Token-Folgen werden von generate() gepaddet.
         
-        # BLIP Input vorbereiten
-        inputs = self.processor(raw_image, return_tensors="pt").to(self.device)
+        Args:
+            image_paths: Liste von Bildpfaden (oder bereits geladenen PIL-Bildern)
+            batch_size: Bilder pro Modellaufruf
+            max_length: Maximale Caption-Länge in Tokens
+            prefetch_workers: Threads für Laden/Vorverarbeitung
+            
+        Returns:
+            (Captions in Eingabereihenfolge (None für nicht ladbare Bilder),
+             Statistik dieses Aufrufs)
+        """
+        captions: List[Optional[str]] = [None] * len(image_paths)
+        blip = self._blip
+        registry.record_use(blip)
+        processor, model = blip.value
+        start = time.perf_counter()
+        model_seconds = 0.0
         
-        # Caption generieren
-        with torch.no_grad():
-            out = self.model.generate(**inputs, max_length=max_length)
+        with ThreadPoolExecutor(max_workers=prefetch_workers) as executor:
+            futures = {}
+            next_submit = 0
+            
+            for batch_start in range(0, len(image_paths), batch_size):
+                # Vorverarbeitung bis zwei Batches im Voraus anstoßen
+                while next_submit < min(len(image_paths), batch_start + 2 * batch_size):
+                    futures[next_submit] = executor.submit(self._preprocess, image_paths[next_submit])
+                    next_submit += 1
+                
+                indices, tensors = [], []
+                for i in range(batch_start, min(batch_start + batch_size, len(image_paths))):
+                    try:
+                        tensors.append(futures.pop(i).result())
+                        indices.append(i)
+                    except Exception as e:
+                        print(f"⚠️  {image_paths[i]}: {e}")
+                if not tensors:
+                    continue
+                
+                pixel_values = torch.stack(tensors).to(self.device)
+                # Geteiltes Modell: ein generate() zur Zeit
+                with blip.lock, torch.inference_mode():
+                    model_start = time.perf_counter()
+                    out = model.generate(pixel_values=pixel_values, max_length=max_length)
+                    model_seconds += time.perf_counter() - model_start
+                
+                for i, caption in zip(indices, processor.batch_decode(out, skip_special_tokens=True)):
+                    captions[i] = caption
         
-        caption = self.processor.decode(out[0], skip_special_tokens=True)
-        return caption
+        elapsed = time.perf_counter() - start
+        done = sum(c is not None for c in captions)
+        stats = {
+            "images": len(image_paths),
+            "captions": done,
+            "batch_size": batch_size,
+            "seconds": elapsed,
+            "model_seconds": model_seconds,
+            "captions_per_s": done / elapsed if elapsed > 0 else 0.0
+        }
+        return captions, stats
+    
+    def extract_detailed_attributes(self, image_path: str,
+                                    caption: Optional[str] = None) -> Dict[str, Any]:
+        """Wie extract_attributes_with_timings; die Zeiten landen in last_analysis_timings"""
+        attributes, self.last_analysis_timings = self.extract_attributes_with_timings(
+            image_path, caption
+        )
+        return attributes
     
-    def extract_detailed_attributes(self, image_path: str) -> Dict[str, Any]:
-        """Extrahiert detaillierte Attribute aus Bild"""
+    def extract_attributes_with_timings(self, image_path: str, caption: Optional[str] = None
+                                        ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Extrahiert detaillierte Attribute aus Bild
         
-        # Grundlegende Metadaten
-        img = Image.open(image_path)
-        width, height = img.size
-        mode = img.mode
-        format_type = img.format
+        Args:
+            image_path: Pfad zum Bild
+            caption: Bereits erzeugte Caption (z.B. aus caption_batch);
+                     sonst wird sie hier generiert
         
-        # BLIP Caption
-        caption = self.generate_caption(image_path)
+        Returns:
+            (Attribute, Zeiten dieser Analyse aus ImageAnalysisContext.timing_report)
+        """
         
-        # OpenCV für weitere Analysen
-        cv_img = cv2.imread(image_path)
+        # Bild einmal dekodieren; Zwischenergebnisse teilen sich alle Analysen
+        ctx = ImageAnalysisContext(image_path)
+        
+        # BLIP Caption (aus dem bereits geladenen Bild)
+        if caption is None:
+            with ctx.analyzer("caption"):
+                caption = self.caption_batch_with_stats([ctx.rgb_image], batch_size=1)[0][0]
+            if caption is None:
+                raise ValueError(f"Konnte Bild nicht verarbeiten: {image_path}")
         
         # Farbanalyse
-        colors = self._analyze_colors(cv_img)
+        with ctx.analyzer("colors"):
+            colors = self._analyze_colors(ctx)
         
         # Helligkeitsanalyse
-        brightness = self._analyze_brightness(cv_img)
+        with ctx.analyzer("brightness"):
+            brightness = self._analyze_brightness(ctx)
         
         # Kantendichte (Schätzung für Detailgrad)
-        edge_density = self._analyze_edge_density(cv_img)
+        with ctx.analyzer("edge_density"):
+            edge_density = self._analyze_edge_density(ctx)
         
         # Bildtyp-Klassifikation (einfache Heuristik)
-        image_type = self._classify_image_type(cv_img)
+        with ctx.analyzer("image_type"):
+            image_type = self._classify_image_type(ctx)
         
-        return {
+        with ctx.analyzer("quality"):
+            quality = self._estimate_quality(ctx)
+        
+        attributes = {
             "basic_metadata": {
-                "dimensions": f"{width}x{height}",
-                "aspect_ratio": f"{width}:{height}",
-                "color_mode": mode,
-                "format": format_type
+                "dimensions": f"{ctx.width}x{ctx.height}",
+                "aspect_ratio": f"{ctx.width}:{ctx.height}",
+                "color_mode": ctx.mode,
+                "format": ctx.format
             },
             "caption": caption,
             "colors": colors,
@@ -81,39 +308,35 @@ class UINAttributeExtractor:
             "characteristics": {
                 "edge_density": edge_density,
                 "image_type": image_type,
-                "estimated_quality": self._estimate_quality(cv_img)
+                "estimated_quality": quality
             }
         }
+        return attributes, ctx.timing_report()
     
-    def _analyze_colors(self, img: np.ndarray) -> Dict:
+    def _analyze_colors(self, ctx: ImageAnalysisContext) -> Dict:
         """Analysiert Farbverteilung"""
-        # Zu HSV konvertieren
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        hsv = ctx.hsv
         
         # Hue-Verteilung analysieren
         hue = hsv[:,:,0]
         hist_hue = cv2.calcHist([hue], [0], None, [12], [0, 180])
         hist_hue = hist_hue.flatten() / hist_hue.sum()
         
-        # Dominante Farben finden
-        unique_colors, counts = np.unique(
-            img.reshape(-1, 3), axis=0, return_counts=True
-        )
-        top_colors = unique_colors[counts.argsort()[-3:]][::-1]
+        # Dominante Farben: quantisiertes Histogramm einer Stichprobe (RGB)
+        top_colors = dominant_colors(ctx.bgr, 3, bgr=True)
         
         return {
             "hue_distribution": hist_hue.tolist(),
-            "dominant_rgb": top_colors.tolist(),
+            "dominant_rgb": [entry["color"] for entry in top_colors],
             "saturation_mean": float(hsv[:,:,1].mean()),
             "value_mean": float(hsv[:,:,2].mean())
         }
     
-    def _analyze_brightness(self, img: np.ndarray) -> Dict:
+    def _analyze_brightness(self, ctx: ImageAnalysisContext) -> Dict:
         """Analysiert Helligkeitsverteilung"""
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = ctx.gray
         
-        mean = float(gray.mean())
-        std = float(gray.std())
+        mean, std = (float(v[0][0]) for v in cv2.meanStdDev(gray))
         hist = cv2.calcHist([gray], [0], None, [8], [0, 256])
         hist = hist.flatten() / hist.sum()
         
@@ -132,22 +355,17 @@ class UINAttributeExtractor:
             "lighting_class": lighting
         }
     
-    def _analyze_edge_density(self, img: np.ndarray) -> float:
+    def _analyze_edge_density(self, ctx: ImageAnalysisContext) -> float:
         """Berechnet Kantendichte als Maß für Detailgrad"""
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 100, 200)
-        density = np.sum(edges > 0) / edges.size
-        return float(density)
+        return float(ctx.edge_density)
     
-    def _classify_image_type(self, img: np.ndarray) -> str:
+    def _classify_image_type(self, ctx: ImageAnalysisContext) -> str:
         """Klassifiziert Bildtyp basierend auf Merkmalen"""
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Kantendichte
-        edge_density = self._analyze_edge_density(img)
+        # Kantendichte (Canny aus dem Kontext, nicht erneut)
+        edge_density = ctx.edge_density
         
         # Farbvarianz
-        color_std = float(img.std())
+        color_std = ctx.color_std
         
         # Einfache Heuristiken
         if edge_density > 0.15 and color_std > 40:
@@ -159,11 +377,10 @@ class UINAttributeExtractor:
         else:
             return "general"
     
-    def _estimate_quality(self, img: np.ndarray) -> str:
+    def _estimate_quality(self, ctx: ImageAnalysisContext) -> str:
         """Schätzt Bildqualität (sehr einfache Heuristik)"""
         # Schärfe über Laplacian Variance
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+        laplacian_var = cv2.Laplacian(ctx.gray, cv2.CV_64F).var()
         
         if laplacian_var > 100:
             return "sharp"
@@ -172,17 +389,82 @@ class UINAttributeExtractor:
         else:
             return "soft/blurry"
 
+def run_batch(extractor, image_dir: str, batch_size: int,
+              output: Optional[str] = None, captions_only: bool = False):
+    """Batch-Modus: Captions in Mini-Batches, danach Attribute pro Bild"""
+    image_paths = sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    print(f"🔄 Erzeuge Captions für {len(image_paths)} Bilder (Batch-Größe {batch_size})...")
+    
+    captions = extractor.caption_batch(image_paths, batch_size=batch_size)
+    stats = extractor.last_caption_stats
+    print(f"⚡ {stats['captions']} Captions in {stats['seconds']:.1f}s "
+          f"({stats['captions_per_s']:.2f} Captions/s, Modell {stats['model_seconds']:.1f}s)")
+    
+    if captions_only:
+        output_file = output or os.path.join(image_dir, "captions.json")
+        with open(output_file, 'w') as f:
+            json.dump({os.path.basename(p): c for p, c in zip(image_paths, captions)}, f, indent=2)
+        print(f"✅ Captions gespeichert in: {output_file}")
+        return
+    
+    totals_ms: Dict[str, float] = {}
+    for image_path, caption in zip(image_paths, captions):
+        if caption is None:
+            continue
+        attributes = extractor.extract_detailed_attributes(image_path, caption=caption)
+        output_file = f"{os.path.splitext(image_path)[0]}_attributes.json"
+        with open(output_file, 'w') as f:
+            json.dump(attributes, f, indent=2)
+        timings = extractor.last_analysis_timings
+        for name, ms in {**timings["intermediates_ms"], **timings["analyzers_ms"]}.items():
+            totals_ms[name] = totals_ms.get(name, 0.0) + ms
+    print(f"✅ Attribute für {stats['captions']} Bilder gespeichert")
+    if totals_ms and stats['captions']:
+        print_timings({name: ms / stats['captions'] for name, ms in totals_ms.items()},
+                      "⏱️  Analyse pro Bild (Mittel):")
+
+def print_timings(timings_ms: Dict[str, float], title: str):
+    """Zeiten absteigend ausgeben"""
+    print(title)
+    for name, ms in sorted(timings_ms.items(), key=lambda item: -item[1]):
+        print(f"   {name:14s} {ms:8.1f} ms")
+
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Extrahiert Bildattribute mit BLIP')
-    parser.add_argument('image', help='Pfad zum Bild')
+    parser.add_argument('image', help='Pfad zum Bild (oder Verzeichnis mit --batch)')
     parser.add_argument('--output', '-o', help='Ausgabedatei (.json)')
+    parser.add_argument('--batch', '-b', action='store_true',
+                        help='Alle Bilder eines Verzeichnisses verarbeiten')
+    parser.add_argument('--batch-size', type=int, default=8, help='Bilder pro BLIP-Aufruf')
+    parser.add_argument('--captions-only', action='store_true',
+                        help='Im Batch nur Captions erzeugen (ohne OpenCV-Analysen)')
+    parser.add_argument('--backend', choices=BACKENDS + EXPERIMENTAL_BACKENDS, default='fp32',
+                        help=BACKEND_HELP)
+    parser.add_argument('--threads', type=int, help='Intra-Op-Threads für die Inferenz')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Laufenden Caption-Daemon nutzen (Modell bleibt geladen)')
     
     args = parser.parse_args()
     
     try:
-        extractor = UINAttributeExtractor()
+        extractor = None
+        if args.daemon:
+            from caption_daemon import connect_daemon
+            extractor = connect_daemon()
+            if extractor is None:
+                print("⚠️  Kein Caption-Daemon erreichbar, lade Modell lokal "
+                      "(starten mit: python caption_daemon.py)")
+        if extractor is None:
+            extractor = UINAttributeExtractor(backend=args.backend, num_threads=args.threads)
+        
+        if args.batch:
+            run_batch(extractor, args.image, args.batch_size, args.output, args.captions_only)
+            return
         
         print(f"Analysiere Bild: {args.image}")
         attributes = extractor.extract_detailed_attributes(args.image)
@@ -203,6 +485,11 @@ def main():
         print(f"💡 Beleuchtung: {attributes['brightness']['lighting_class']}")
         print(f"🎨 Bildtyp: {attributes['characteristics']['image_type']}")
         
+        timings = extractor.last_analysis_timings
+        if timings:
+            print_timings({**timings["intermediates_ms"], **timings["analyzers_ms"]},
+                          f"\n⏱️  Analyse ({timings['total_ms']:.1f} ms):")
+        
     except Exception as e:
         print(f"❌ Fehler: {e}")
         import traceback
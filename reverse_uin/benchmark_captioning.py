@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Vergleicht die Inferenz-Backends des Captioners (fp32 und die
+experimentellen int8, onnx).
+
+Alle Backends beschriften dieselben Bilder. Gemessen werden Latenz
+(Modellzeit pro Bild, Durchsatz) und die Übereinstimmung der Captions mit
+der fp32-Referenz: Anteil identischer Captions und mittlere Wort-Ähnlichkeit
+(difflib über die Wortfolgen, 1.0 = identisch). Experimentelle Backends
+laufen nur, wenn sie ausdrücklich angegeben werden; schlägt eines fehl
+(Laden, Export, Inferenz), wird es übersprungen.
+
+    python benchmark_captioning.py bilder/ --backends fp32 int8 onnx --threads 4
+"""
+
+import json
+import os
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+from attribute_extractor import IMAGE_EXTENSIONS, UINAttributeExtractor
+from model_registry import BACKENDS, EXPERIMENTAL_BACKENDS
+
+
+def caption_agreement(reference: List[Optional[str]], candidate: List[Optional[str]]) -> Dict:
+    """Übereinstimmung zweier Caption-Listen (nur Bilder mit beiden Captions)"""
+    pairs = [(r, c) for r, c in zip(reference, candidate) if r is not None and c is not None]
+    if not pairs:
+        return {"compared": 0, "exact_match": None, "word_similarity": None}
+    exact = sum(r.strip().lower() == c.strip().lower() for r, c in pairs)
+    similarity = sum(
+        SequenceMatcher(None, r.lower().split(), c.lower().split()).ratio() for r, c in pairs
+    )
+    return {
+        "compared": len(pairs),
+        "exact_match": exact / len(pairs),
+        "word_similarity": similarity / len(pairs)
+    }
+
+
+def benchmark_backends(image_paths: List[str], backends=BACKENDS, batch_size: int = 8,
+                       num_threads: Optional[int] = None, warmup: int = 1) -> Dict:
+    """
+    Captions aller Bilder mit jedem Backend erzeugen und vergleichen.
+
+    Die Referenz ist immer fp32 (wird bei Bedarf zusätzlich gerechnet).
+    Ladezeit und Aufwärmlauf zählen nicht zur Latenz.
+
+    Returns:
+        {Backend: {"ms_per_image", "captions_per_s", "load_seconds",
+                   "agreement", "captions"}}
+    """
+    order = ["fp32"] + [b for b in backends if b != "fp32"]
+    report = {}
+    for backend in order:
+        extractor = UINAttributeExtractor(device="cpu", backend=backend, num_threads=num_threads)
+        try:
+            load_seconds = extractor._blip.load_seconds
+            if warmup:
+                extractor.caption_batch_with_stats(image_paths[:warmup], batch_size=batch_size)
+            captions, stats = extractor.caption_batch_with_stats(image_paths, batch_size=batch_size)
+        except Exception as e:
+            if backend == "fp32":
+                raise
+            print(f"⚠️  {backend} übersprungen: {type(e).__name__}: {e}")
+            continue
+        report[backend] = {
+            "ms_per_image": stats["model_seconds"] * 1000 / max(stats["captions"], 1),
+            "captions_per_s": stats["captions_per_s"],
+            "load_seconds": load_seconds,
+            "agreement": caption_agreement(report["fp32"]["captions"], captions)
+            if backend != "fp32" else None,
+            "captions": captions
+        }
+    return report
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Latenz und Caption-Übereinstimmung der BLIP-Backends')
+    parser.add_argument('image_dir', help='Verzeichnis mit Testbildern')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS + EXPERIMENTAL_BACKENDS,
+                        default=list(BACKENDS),
+                        help='Zu messende Backends (int8/onnx experimentell)')
+    parser.add_argument('--batch-size', type=int, default=8, help='Bilder pro BLIP-Aufruf')
+    parser.add_argument('--threads', type=int, help='Intra-Op-Threads für die Inferenz')
+    parser.add_argument('--limit', type=int, default=32, help='Höchstens so viele Bilder')
+    parser.add_argument('--output', '-o', help='Ergebnis als JSON speichern')
+    args = parser.parse_args()
+
+    image_paths = sorted(
+        os.path.join(args.image_dir, name) for name in os.listdir(args.image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:args.limit]
+    if not image_paths:
+        raise SystemExit(f"Keine Bilder in {args.image_dir}")
+
+    report = benchmark_backends(image_paths, args.backends, args.batch_size, args.threads)
+
+    baseline = report["fp32"]["ms_per_image"]
+    print(f"\n📊 {len(image_paths)} Bilder, Batch-Größe {args.batch_size}:")
+    for backend, r in report.items():
+        line = (f"   {backend:5s} {r['ms_per_image']:8.1f} ms/Bild  "
+                f"{baseline / r['ms_per_image']:5.2f}x  (geladen in {r['load_seconds']:.1f}s)")
+        if r["agreement"] and r["agreement"]["compared"]:
+            line += (f"  identisch {r['agreement']['exact_match']:.0%}, "
+                     f"Wort-Ähnlichkeit {r['agreement']['word_similarity']:.3f}")
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Ergebnis gespeichert in: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Langlebiger Caption-Daemon für UIN
+
+Hält das BLIP Model im Speicher, damit CLI-Aufrufe es nicht jedes Mal neu
+laden müssen: Das Laden kostet dann einmal pro Rechner statt einmal pro
+Aufruf. Kommunikation über multiprocessing.connection auf localhost,
+abgesichert mit einem zufälligen Schlüssel in ~/.uin/caption_daemon.key.
+
+    python caption_daemon.py            # Daemon starten
+    python caption_daemon.py --status   # Läuft er? Welche Modelle sind geladen?
+    python caption_daemon.py --stop     # Beenden
+
+Clients (z.B. attribute_extractor.py --daemon) nutzen CaptionDaemonClient,
+der dieselben Methoden wie UINAttributeExtractor anbietet.
+"""
+
+import os
+import secrets
+import threading
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_PORT = int(os.environ.get("UIN_CAPTION_DAEMON_PORT", 8765))
+DEFAULT_ADDRESS = ("127.0.0.1", DEFAULT_PORT)
+KEY_FILE = Path.home() / ".uin" / "caption_daemon.key"
+
+
+def load_authkey(create: bool = False) -> bytes:
+    """Gemeinsamer Schlüssel für Daemon und Clients (nur für den Benutzer lesbar)"""
+    if os.environ.get("UIN_CAPTION_DAEMON_KEY"):
+        return os.environ["UIN_CAPTION_DAEMON_KEY"].encode()
+    if not KEY_FILE.exists():
+        if not create:
+            raise ConnectionRefusedError("Kein Caption-Daemon eingerichtet")
+        KEY_FILE.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    return KEY_FILE.read_text().strip().encode()
+
+
+class CaptionDaemon:
+    def __init__(self, address=DEFAULT_ADDRESS, device: Optional[str] = None,
+                 backend: str = "fp32", num_threads: Optional[int] = None):
+        from attribute_extractor import UINAttributeExtractor
+
+        self.address = address
+        # Modell wird beim ersten Auftrag geladen (oder mit warm())
+        self.extractor = UINAttributeExtractor(device=device, backend=backend,
+                                               num_threads=num_threads)
+        self._listener = None
+        self._stopped = threading.Event()
+
+    def warm(self):
+        self.extractor.model
+
+    def _dispatch(self, request: Dict[str, Any]) -> Any:
+        op = request.get("op")
+        if op == "ping":
+            from model_registry import registry
+            return {"pid": os.getpid(), "device": self.extractor.device,
+                    "backend": self.extractor.backend,
+                    "models": registry.loaded()}
+        if op == "caption_batch":
+            # Ein Extraktor für alle Client-Threads: Statistik pro Auftrag zurückgeben
+            captions, stats = self.extractor.caption_batch_with_stats(
+                request["paths"], batch_size=request.get("batch_size", 8),
+                max_length=request.get("max_length", 50)
+            )
+            return {"captions": captions, "stats": stats}
+        if op == "attributes":
+            attributes, timings = self.extractor.extract_attributes_with_timings(
+                request["path"], caption=request.get("caption")
+            )
+            return {"attributes": attributes, "timings": timings}
+        if op == "shutdown":
+            self._stopped.set()
+            return {"stopping": True}
+        raise ValueError(f"Unbekannte Operation: {op}")
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = {"ok": True, "result": self._dispatch(request)}
+                except Exception as e:
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                conn.send(response)
+                if self._stopped.is_set():
+                    # accept() des Hauptthreads mit einer Dummy-Verbindung lösen
+                    try:
+                        Client(self.address, authkey=load_authkey()).close()
+                    except OSError:
+                        pass
+                    return
+
+    def serve_forever(self):
+        self._listener = Listener(self.address, authkey=load_authkey(create=True))
+        print(f"🚀 Caption-Daemon läuft auf {self.address[0]}:{self.address[1]} (PID {os.getpid()})")
+        with self._listener:
+            while not self._stopped.is_set():
+                try:
+                    conn = self._listener.accept()
+                except Exception:
+                    # Fehlgeschlagene Authentifizierung o.ä.
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        print("👋 Caption-Daemon beendet")
+
+
+class CaptionDaemonClient:
+    """Gleiche Schnittstelle wie UINAttributeExtractor, Arbeit erledigt der Daemon"""
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        self.address = address
+        self._conn = Client(address, authkey=load_authkey())
+        self.last_caption_stats = {}
+        self.last_analysis_timings = {}
+
+    def _call(self, **request) -> Any:
+        self._conn.send(request)
+        response = self._conn.recv()
+        if not response["ok"]:
+            raise RuntimeError(f"Caption-Daemon: {response['error']}")
+        return response["result"]
+
+    def ping(self) -> Dict[str, Any]:
+        return self._call(op="ping")
+
+    def caption_batch(self, image_paths: List[str], batch_size: int = 8,
+                      max_length: int = 50) -> List[Optional[str]]:
+        # Der Daemon hat ein anderes Arbeitsverzeichnis
+        paths = [os.path.abspath(p) for p in image_paths]
+        result = self._call(op="caption_batch", paths=paths, batch_size=batch_size,
+                            max_length=max_length)
+        self.last_caption_stats = result["stats"]
+        return result["captions"]
+
+    def generate_caption(self, image_path: str, max_length: int = 50) -> str:
+        caption = self.caption_batch([image_path], batch_size=1, max_length=max_length)[0]
+        if caption is None:
+            raise ValueError(f"Konnte Bild nicht verarbeiten: {image_path}")
+        return caption
+
+    def extract_detailed_attributes(self, image_path: str,
+                                    caption: Optional[str] = None) -> Dict[str, Any]:
+        result = self._call(op="attributes", path=os.path.abspath(image_path), caption=caption)
+        self.last_analysis_timings = result["timings"]
+        return result["attributes"]
+
+    def shutdown(self):
+        return self._call(op="shutdown")
+
+    def close(self):
+        self._conn.close()
+
+
+def connect_daemon(address=DEFAULT_ADDRESS) -> Optional[CaptionDaemonClient]:
+    """Client zum laufenden Daemon oder None, falls keiner läuft"""
+    try:
+        return CaptionDaemonClient(address)
+    except (ConnectionRefusedError, OSError):
+        return None
+
+
+def main():
+    import argparse
+
+    from model_registry import BACKEND_HELP, BACKENDS, EXPERIMENTAL_BACKENDS
+
+    parser = argparse.ArgumentParser(description='BLIP Caption-Daemon (Modell bleibt geladen)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP-Port auf localhost')
+    parser.add_argument('--device', help='cuda oder cpu (Standard: automatisch)')
+    parser.add_argument('--backend', choices=BACKENDS + EXPERIMENTAL_BACKENDS, default='fp32',
+                        help=BACKEND_HELP)
+    parser.add_argument('--threads', type=int, help='Intra-Op-Threads für die Inferenz')
+    parser.add_argument('--warm', action='store_true', help='Modell sofort laden statt beim ersten Auftrag')
+    parser.add_argument('--status', action='store_true', help='Status des laufenden Daemons anzeigen')
+    parser.add_argument('--stop', action='store_true', help='Laufenden Daemon beenden')
+    args = parser.parse_args()
+
+    address = ("127.0.0.1", args.port)
+
+    if args.status or args.stop:
+        client = connect_daemon(address)
+        if client is None:
+            print("❌ Kein Caption-Daemon erreichbar")
+            raise SystemExit(1)
+        if args.stop:
+            client.shutdown()
+            print("🛑 Caption-Daemon wird beendet")
+        else:
+            status = client.ping()
+            print(f"✅ Caption-Daemon PID {status['pid']} ({status['device']}, {status['backend']})")
+            for name, info in status["models"].items():
+                print(f"   {name}: geladen in {info['load_seconds']:.1f}s, {info['uses']} Aufträge")
+        client.close()
+        return
+
+    daemon = CaptionDaemon(address, device=args.device, backend=args.backend,
+                           num_threads=args.threads)
+    if args.warm:
+        daemon.warm()
+    daemon.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
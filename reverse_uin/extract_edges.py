@@ -10,33 +10,74 @@ import base64
 from PIL import Image
 import io
 import os
+import sys
 from datetime import datetime
-from colorthief import ColorThief
+from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+# Gemeinsamer Code liegt in den Paketen utils/ und uin_capsule/ der Repo-Wurzel
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(1, str(REPO_ROOT))
+from uin_capsule import capsule_format, edge_codec
+from utils.edge_cache import EdgeCache
+from utils.image_decode import decode_image
+from utils import palette
+
 class UINReverseExtractor:
-    def __init__(self):
+    # Rauschunterdrückung vor Canny (Teil des Cache-Schlüssels)
+    BLUR_KERNEL = (5, 5)
+    BLUR_SIGMA = 1.5
+    
+    def __init__(self, cache=None):
+        """cache: Optionaler EdgeCache für wiederholte Extraktionen"""
         self.version = "uin-v0.6-hybrid"
+        self.cache = cache
+    
+    def load_image(self, image_path, target_resolution=None, grayscale=False):
+        """
+        Lädt ein Bild, optional verkleinert direkt im Decoder.
+        
+        Mit target_resolution wird der größte Faktor (2/4/8) gewählt, bei dem
+        die lange Seite noch mindestens target_resolution Pixel hat.
+        
+        Returns:
+            (Bild-Array, (Breite, Höhe) des Originals, beides EXIF-orientiert)
+        """
+        return decode_image(image_path, target_resolution, grayscale)
         
-    def extract_edges(self, image_path, low_threshold=50, high_threshold=150):
-        """Extrahiert Canny Edges aus einem Bild"""
+    def extract_edges(self, image_path, low_threshold=50, high_threshold=150,
+                      target_resolution=None):
+        """
+        Extrahiert Canny Edges aus einem Bild
+        
+        Args:
+            image_path: Pfad oder bereits geladenes Array (BGR oder Graustufen)
+            target_resolution: Mindestlänge der langen Seite; Pfade werden dann
+                verkleinert als Graustufen dekodiert, Arrays herunterskaliert
+        """
         
         # Bild laden
         if isinstance(image_path, str):
-            img = cv2.imread(image_path)
+            img, _ = self.load_image(image_path, target_resolution, grayscale=True)
         else:
             # Falls bereits numpy array
             img = image_path
+            if img is not None and target_resolution:
+                scale = target_resolution / max(img.shape[:2])
+                if scale < 1:
+                    img = cv2.resize(img, None, fx=scale, fy=scale,
+                                     interpolation=cv2.INTER_AREA)
             
         if img is None:
             raise ValueError("Bild konnte nicht geladen werden")
             
         # Zu Graustufen konvertieren
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         
         # Rauschen reduzieren
-        blurred = cv2.GaussianBlur(gray, (5, 5), 1.5)
+        blurred = cv2.GaussianBlur(gray, self.BLUR_KERNEL, self.BLUR_SIGMA)
         
         # Canny Edge Detection
         edges = cv2.Canny(blurred, low_threshold, high_threshold)
@@ -47,17 +88,20 @@ class UINReverseExtractor:
         return edges_inv
     
     def extract_colors(self, image_path, num_colors=5):
-        """Extrahiert dominante Farben"""
-        color_thief = ColorThief(image_path)
-        palette = color_thief.get_palette(color_count=num_colors)
-        
-        # Hex-Farben konvertieren
-        hex_colors = []
-        for color in palette:
-            hex_color = '#{:02x}{:02x}{:02x}'.format(color[0], color[1], color[2])
-            hex_colors.append(hex_color)
-            
-        return hex_colors
+        """
+        Extrahiert dominante Farben als Hex-Liste (nach Anteil absteigend)
+        
+        Args:
+            image_path: Pfad oder bereits geladenes BGR-Array (ohne erneutes Dekodieren)
+        """
+        if isinstance(image_path, str):
+            img, _ = self.load_image(image_path)
+        else:
+            img = image_path
+        
+        # Wie bisher mit ColorThief: fast weiße Pixel zählen nicht
+        entries = palette.extract_palette(img, num_colors, bgr=img.ndim == 3, skip_white=True)
+        return [palette.to_hex(entry["color"]) for entry in entries]
     
     def estimate_lighting(self, img):
         """Schätzt die Beleuchtung basierend auf Histogramm"""
@@ -81,9 +125,12 @@ class UINReverseExtractor:
         else:
             return "contrasty"
     
-    def estimate_composition(self, img):
-        """Schätzt grundlegende Komposition"""
-        height, width = img.shape[:2]
+    def estimate_composition(self, img, original_size=None):
+        """Schätzt grundlegende Komposition (original_size: (Breite, Höhe) vor Verkleinerung)"""
+        if original_size:
+            width, height = original_size
+        else:
+            height, width = img.shape[:2]
         
         # Aspect Ratio
         aspect = width / height
@@ -101,8 +148,8 @@ class UINReverseExtractor:
             "resolution": f"{width}x{height}"
         }
     
-    def image_to_base64(self, image_array):
-        """Konvertiert numpy array zu base64 PNG"""
+    def image_to_png_bytes(self, image_array):
+        """Kodiert numpy array als PNG-Bytes"""
         # BGR zu RGB konvertieren
         if len(image_array.shape) == 3 and image_array.shape[2] == 3:
             image_rgb = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
@@ -112,19 +159,55 @@ class UINReverseExtractor:
         pil_img = Image.fromarray(image_rgb)
         buffered = io.BytesIO()
         pil_img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        
-        return img_str
+        return buffered.getvalue()
     
-    def extract_uin_package(self, image_path, auto_threshold=True):
-        """Hauptfunktion: Extrahiert vollständiges UIN Package"""
+    def image_to_base64(self, image_array):
+        """Konvertiert numpy array zu base64 PNG"""
+        return base64.b64encode(self.image_to_png_bytes(image_array)).decode()
+    
+    def extract_uin_package(self, image_path, auto_threshold=True, target_resolution=None,
+                            container=capsule_format.FORMAT_V1,
+                            edges_encoding=edge_codec.PACKBITS_ZLIB):
+        """
+        Hauptfunktion: Extrahiert vollständiges UIN Package
+        
+        Mit target_resolution wird das Bild einmal verkleinert dekodiert und
+        alle Analysen laufen auf dieser Auflösung; die Komposition nennt
+        weiterhin die Originalauflösung.
+        
+        container: FORMAT_V1 (edges als base64-String) oder FORMAT_V2
+            (edges als kodierte Bytes für capsule_format.write_capsule)
+        edges_encoding: Kanten-Kodierung für FORMAT_V2 (siehe edge_codec)
+        
+        Mit self.cache wird ein Ergebnis für dieselbe Bilddatei und dieselben
+        Parameter direkt aus dem Cache geliefert (ohne Dekodieren/Canny/Kodieren).
+        """
         
         print(f"Extrahiere UIN Package von: {image_path}")
         
+        if self.cache is not None:
+            cache_key = self.cache.make_key(image_path, {
+                "op": "reverse_uin",
+                "auto_threshold": auto_threshold,
+                "target_resolution": target_resolution,
+                "blur": [list(self.BLUR_KERNEL), self.BLUR_SIGMA],
+                "container": container,
+                "edges_encoding": edges_encoding,
+                "palette": palette.PALETTE_VERSION,
+                "version": self.version
+            })
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                edges, attributes, edges_data = cached
+                if container != capsule_format.FORMAT_V2:
+                    edges_data = edges_data.decode('utf-8')
+                attributes["source_image"] = os.path.basename(image_path)
+                attributes["extraction_timestamp"] = datetime.now().isoformat()
+                return self._assemble_package(container, edges_data, attributes,
+                                              edges_encoding), edges
+        
         # Bild laden
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"Konnte Bild nicht laden: {image_path}")
+        img, original_size = self.load_image(image_path, target_resolution)
         
         # Automatische Threshold-Bestimmung
         if auto_threshold:
@@ -141,32 +224,44 @@ class UINReverseExtractor:
         edges = self.extract_edges(img, low, high)
         
         # Attribute extrahieren
-        colors = self.extract_colors(image_path)
+        colors = self.extract_colors(img)
         lighting = self.estimate_lighting(img)
-        composition = self.estimate_composition(img)
+        composition = self.estimate_composition(img, original_size)
         
-        # Base64 Kodierung der Edges
-        edges_b64 = self.image_to_base64(edges)
+        # Kodierung der Edges (v2: ohne base64, binäre Kantenkarte direkt gepackt)
+        if container == capsule_format.FORMAT_V2:
+            edges_data = edge_codec.encode_edges(edges, edges_encoding)
+        else:
+            edges_data = self.image_to_base64(edges)
         
-        # UIN Package erstellen
-        package = {
-            "format": "uin-capsule-v1",
-            "edges": edges_b64,
-            "attributes": {
-                "source_image": os.path.basename(image_path),
-                "colors": colors,
-                "lighting": lighting,
-                "composition": composition,
-                "canny_thresholds": {
-                    "low": low,
-                    "high": high
-                },
-                "extraction_timestamp": datetime.now().isoformat(),
-                "version": self.version
-            }
+        attributes = {
+            "source_image": os.path.basename(image_path),
+            "colors": colors,
+            "lighting": lighting,
+            "composition": composition,
+            "canny_thresholds": {
+                "low": low,
+                "high": high
+            },
+            "extraction_timestamp": datetime.now().isoformat(),
+            "version": self.version
         }
         
-        return package, edges
+        if self.cache is not None:
+            self.cache.put(cache_key, edges, attributes, edges_data)
+        
+        return self._assemble_package(container, edges_data, attributes, edges_encoding), edges
+    
+    def _assemble_package(self, container, edges_data, attributes, edges_encoding):
+        """Stellt das UIN Package Dictionary zusammen"""
+        package = {
+            "format": container,
+            "edges": edges_data,
+            "attributes": attributes
+        }
+        if container == capsule_format.FORMAT_V2:
+            package["edges_encoding"] = edges_encoding
+        return package
 
 def main():
     import argparse
@@ -176,12 +271,26 @@ def main():
     parser.add_argument('image', help='Pfad zum Eingabebild')
     parser.add_argument('--output', '-o', help='Ausgabedatei (.uin)', default=None)
     parser.add_argument('--save-edges', '-e', help='Canny Edges als PNG speichern', action='store_true')
+    parser.add_argument('--target-resolution', '-r', type=int, default=None,
+                        help='Verkleinert dekodieren (lange Seite mind. N Pixel, z.B. 1024)')
+    parser.add_argument('--binary', '-b', action='store_true',
+                        help='Als uin-capsule-v2 Binärcontainer speichern')
+    parser.add_argument('--edge-encoding', choices=edge_codec.ENCODINGS,
+                        default=edge_codec.PACKBITS_ZLIB,
+                        help='Kanten-Kodierung im v2-Container (default: packbits_zlib)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Verzeichnis für den Kanten-Cache (default: kein Cache)')
     
     args = parser.parse_args()
     
     try:
-        extractor = UINReverseExtractor()
-        package, edges = extractor.extract_uin_package(args.image)
+        cache = EdgeCache(args.cache_dir) if args.cache_dir else None
+        extractor = UINReverseExtractor(cache=cache)
+        container = capsule_format.FORMAT_V2 if args.binary else capsule_format.FORMAT_V1
+        package, edges = extractor.extract_uin_package(
+            args.image, target_resolution=args.target_resolution, container=container,
+            edges_encoding=args.edge_encoding
+        )
         
         # Ausgabedatei bestimmen
         if args.output:
@@ -191,8 +300,11 @@ def main():
             output_file = f"{base_name}.uin"
         
         # UIN Package speichern
-        with open(output_file, 'w') as f:
-            json.dump(package, f, indent=2)
+        if container == capsule_format.FORMAT_V2:
+            capsule_format.write_capsule(output_file, package, package["edges"],
+                                         args.edge_encoding)
+        else:
+            capsule_format.write_v1_stream(output_file, package, package["edges"])
         print(f"✅ UIN Package gespeichert: {output_file}")
         print(f"   Größe: {os.path.getsize(output_file)} Bytes")
         
@@ -214,6 +326,9 @@ def main():
         print(f"   Beleuchtung: {package['attributes']['lighting']}")
         print(f"   Auflösung: {package['attributes']['composition']['resolution']}")
         print(f"   Canny Thresholds: {package['attributes']['canny_thresholds']}")
+        if cache:
+            stats = cache.stats()
+            print(f"   Cache: {stats['hits']} Treffer, {stats['misses']} Fehlschläge")
         
     except Exception as e:
         print(f"❌ Fehler: {e}", file=sys.stderr)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Prozessweite Registry für ML-Modelle (BLIP)
+
+Modelle werden beim ersten Zugriff geladen und danach von allen
+Extraktor-Instanzen und Threads des Prozesses geteilt. Pro Modell gibt es
+eine Inferenz-Sperre: torch parallelisiert einen generate()-Aufruf bereits
+selbst, gleichzeitige Aufrufe würden die Kerne nur überbuchen.
+
+Inferenz-Backends für BLIP:
+    fp32  Originalmodell
+
+Experimentell (noch nicht mit dem echten BLIP-Modell verifiziert; per
+--backend wählbar, beim Laden wird gewarnt, bis ein Lauf von
+benchmark_captioning.py Latenz und Caption-Übereinstimmung belegt):
+    int8  Dynamische int8-Quantisierung aller Linear-Schichten (nur CPU)
+    onnx  Vision-Encoder (ViT, der Großteil der Rechenzeit) als ONNX in
+          ONNX Runtime; der Text-Decoder bleibt in torch. Benötigt
+          onnxruntime, der Export wird unter ~/.uin/onnx zwischengespeichert
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+BLIP_MODEL = "Salesforce/blip-image-captioning-base"
+
+BACKENDS = ("fp32",)
+EXPERIMENTAL_BACKENDS = ("int8", "onnx")
+BACKEND_HELP = "Inferenz-Backend (int8 und onnx experimentell, nur CPU)"
+
+ONNX_CACHE_DIR = Path.home() / ".uin" / "onnx"
+
+
+class ModelEntry:
+    def __init__(self, value: Any, load_seconds: float):
+        self.value = value
+        self.load_seconds = load_seconds
+        self.lock = threading.Lock()
+        self.uses = 0
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries: Dict[tuple, ModelEntry] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[tuple, threading.Lock] = {}
+
+    def get(self, key: tuple, loader: Callable[[], Any]) -> ModelEntry:
+        """
+        Liefert den Eintrag zu key; lädt ihn genau einmal über loader().
+
+        Andere Modelle bleiben während eines Ladevorgangs abrufbar.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                load_lock = self._loading.setdefault(key, threading.Lock())
+            with load_lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    start = time.perf_counter()
+                    value = loader()
+                    entry = ModelEntry(value, time.perf_counter() - start)
+                    self._entries[key] = entry
+        return entry
+
+    def record_use(self, entry: ModelEntry):
+        """Zählt einen Auftrag (z.B. ein caption_batch), nicht jeden Property-Zugriff"""
+        with self._lock:
+            entry.uses += 1
+
+    def loaded(self) -> Dict[str, Dict[str, Any]]:
+        """Übersicht der geladenen Modelle"""
+        return {
+            "/".join(map(str, key)): {"load_seconds": e.load_seconds, "uses": e.uses}
+            for key, e in self._entries.items()
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Eine Registry pro Prozess
+registry = ModelRegistry()
+
+
+def set_num_threads(num_threads: Optional[int]):
+    """Intra-Op-Threads von torch festlegen (None = torch-Standard)"""
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+
+def _onnx_vision_encoder(session):
+    """
+    Ersatz für model.vision_model: gleiche Aufrufform, Rechnung in ONNX Runtime.
+
+    Muss ein nn.Module sein - nn.Module.__setattr__ lehnt andere Objekte
+    für ein bestehendes Untermodul ab. BLIP verwendet nur das erste Element
+    der Ausgabe (last_hidden_state).
+    """
+    import torch
+
+    class ONNXVisionEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.session = session
+            self.input_name = session.get_inputs()[0].name
+
+        def forward(self, pixel_values=None, **kwargs):
+            hidden = self.session.run(None, {self.input_name: pixel_values.cpu().numpy()})[0]
+            return (torch.from_numpy(hidden).to(pixel_values.device),)
+
+    return ONNXVisionEncoder().eval()
+
+
+def _export_vision_onnx(model, model_name: str, image_size: int) -> Path:
+    import torch
+
+    path = ONNX_CACHE_DIR / f"{model_name.replace('/', '__')}_vision.onnx"
+    if path.exists():
+        return path
+
+    class VisionOnly(torch.nn.Module):
+        def __init__(self, vision_model):
+            super().__init__()
+            self.vision_model = vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values)[0]
+
+    print(f"Exportiere Vision-Encoder nach ONNX: {path}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".onnx.tmp")
+    dummy = torch.zeros(1, 3, image_size, image_size)
+    torch.onnx.export(
+        VisionOnly(model.vision_model).eval(), (dummy,), str(tmp_path),
+        input_names=["pixel_values"], output_names=["last_hidden_state"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "last_hidden_state": {0: "batch"}},
+        opset_version=17
+    )
+    tmp_path.replace(path)
+    return path
+
+
+def _apply_backend(model, backend: str, model_name: str, num_threads: Optional[int]):
+    import torch
+
+    if backend == "int8":
+        # Gewichte int8, Aktivierungen zur Laufzeit quantisiert
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if backend == "onnx":
+        import onnxruntime as ort
+
+        image_size = model.config.vision_config.image_size
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        session = ort.InferenceSession(
+            str(_export_vision_onnx(model, model_name, image_size)), options,
+            providers=["CPUExecutionProvider"]
+        )
+        model.vision_model = _onnx_vision_encoder(session)
+        return model
+
+    return model
+
+
+def get_blip(device: str, model_name: str = BLIP_MODEL, backend: str = "fp32",
+             num_threads: Optional[int] = None) -> ModelEntry:
+    """
+    BLIP-Processor und -Modell für ein Gerät (geteilt im Prozess).
+
+    Args:
+        device: "cuda" oder "cpu"
+        model_name: Hugging-Face-Modell
+        backend: Eine der BACKENDS oder EXPERIMENTAL_BACKENDS (nur CPU)
+        num_threads: Intra-Op-Threads (torch bzw. ONNX Runtime)
+
+    Returns:
+        ModelEntry mit value = (processor, model) und lock für generate()
+    """
+    if backend not in BACKENDS + EXPERIMENTAL_BACKENDS:
+        raise ValueError(f"Unbekanntes Backend: {backend} "
+                         f"(erlaubt: {', '.join(BACKENDS + EXPERIMENTAL_BACKENDS)})")
+    if backend != "fp32" and device != "cpu":
+        raise ValueError(f"Backend {backend} ist nur auf der CPU verfügbar")
+
+    def load():
+        from transformers import BlipProcessor, BlipForConditionalGeneration
+
+        set_num_threads(num_threads)
+        print(f"Lade BLIP Model auf {device} ({backend})...")
+        if backend in EXPERIMENTAL_BACKENDS:
+            print(f"⚠️  Backend {backend} ist experimentell "
+                  f"(nicht mit dem echten BLIP-Modell verifiziert)")
+        processor = BlipProcessor.from_pretrained(model_name)
+        model = BlipForConditionalGeneration.from_pretrained(model_name).to(device)
+        model.eval()
+        model = _apply_backend(model, backend, model_name, num_threads)
+        print("BLIP Model geladen ✓")
+        return processor, model
+
+    return registry.get(("blip", model_name, device, backend), load)
@@ -5,12 +5,21 @@ Baut komplette UIN Packages aus verschiedenen Komponenten
 
 import json
 import base64
+import io
 import os
+import sys
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, Any, Optional
 import cv2
 import numpy as np
 
+# Gemeinsamer Code liegt in den Paketen utils/ und uin_capsule/ der Repo-Wurzel
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(1, str(REPO_ROOT))
+from uin_capsule import capsule_format, edge_codec
+
 class UINPackageBuilder:
     def __init__(self):
         self.version = "uin-v0.6-hybrid"
@@ -18,7 +27,9 @@ class UINPackageBuilder:
     def build_from_components(self, 
                             edges_image: np.ndarray,
                             attributes: Dict[str, Any],
-                            source_info: Optional[Dict] = None) -> Dict[str, Any]:
+                            source_info: Optional[Dict] = None,
+                            container: str = capsule_format.FORMAT_V1,
+                            edges_encoding: str = edge_codec.PACKBITS_ZLIB) -> Dict[str, Any]:
         """
         Baut UIN Package aus Komponenten
         
@@ -26,42 +37,41 @@ class UINPackageBuilder:
             edges_image: Canny edges als numpy array
             attributes: UIN-Attribute Dictionary
             source_info: Informationen über die Quelle
+            container: FORMAT_V1 (edges als base64-String) oder
+                FORMAT_V2 (edges als kodierte Bytes, siehe save_package)
+            edges_encoding: Kanten-Kodierung für FORMAT_V2 (siehe edge_codec)
         
         Returns:
             Vollständiges UIN Package Dictionary
         """
         
-        # Edges zu base64 konvertieren
-        import io
-        from PIL import Image
-        
-        if len(edges_image.shape) == 2:
-            # Graustufenbild
-            pil_img = Image.fromarray(edges_image)
-        else:
+        if len(edges_image.shape) == 3 and edges_image.shape[2] == 3:
             # Farbbild zu Graustufen
-            if edges_image.shape[2] == 3:
-                gray = cv2.cvtColor(edges_image, cv2.COLOR_BGR2GRAY)
-                pil_img = Image.fromarray(gray)
-            else:
-                pil_img = Image.fromarray(edges_image)
+            edges_image = cv2.cvtColor(edges_image, cv2.COLOR_BGR2GRAY)
         
-        buffered = io.BytesIO()
-        pil_img.save(buffered, format="PNG", optimize=True)
-        edges_b64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        if container == capsule_format.FORMAT_V2:
+            edges_data = edge_codec.encode_edges(edges_image, edges_encoding)
+            edges_format = edges_encoding
+        else:
+            # Edges zu base64 konvertieren
+            png = edge_codec.encode_edges(edges_image, edge_codec.PNG)
+            edges_data = base64.b64encode(png).decode('utf-8')
+            edges_format = "png_base64"
         
         # Package zusammenstellen
         package = {
-            "format": "uin-capsule-v1",
+            "format": container,
             "version": self.version,
             "metadata": {
                 "creation_timestamp": datetime.now().isoformat(),
-                "edges_format": "png_base64",
+                "edges_format": edges_format,
                 "compression": "none"
             },
-            "edges": edges_b64,
+            "edges": edges_data,
             "attributes": attributes
         }
+        if container == capsule_format.FORMAT_V2:
+            package["edges_encoding"] = edges_encoding
         
         # Source Info hinzufügen falls vorhanden
         if source_info:
@@ -69,10 +79,27 @@ class UINPackageBuilder:
         
         return package
     
+    def save_package(self, package: Dict[str, Any], output_path: str) -> str:
+        """
+        Speichert ein Package im Container-Format aus package["format"]
+        
+        v1-Packages dürfen "edges" als base64-String oder als rohe Bytes
+        enthalten; beides wird blockweise geschrieben.
+        """
+        if package.get("format") == capsule_format.FORMAT_V2:
+            return capsule_format.write_capsule(
+                output_path, package, package["edges"],
+                package.get("edges_encoding", edge_codec.PNG)
+            )
+        
+        return capsule_format.write_v1_stream(output_path, package, package["edges"])
+    
     def build_from_files(self,
                         edges_path: str,
                         attributes_path: str,
-                        output_path: Optional[str] = None) -> str:
+                        output_path: Optional[str] = None,
+                        container: str = capsule_format.FORMAT_V1,
+                        edges_encoding: str = edge_codec.PNG) -> str:
         """
         Baut Package aus existierenden Dateien
         
@@ -80,6 +107,9 @@ class UINPackageBuilder:
             edges_path: Pfad zu Canny Edges PNG
             attributes_path: Pfad zu JSON mit Attributen
             output_path: Ausgabepfad für .uin Datei
+            container: FORMAT_V1 (JSON/base64) oder FORMAT_V2 (Binärcontainer)
+            edges_encoding: Kanten-Kodierung für FORMAT_V2; "png" übernimmt
+                die Datei unverändert, sonst wird umkodiert
         
         Returns:
             Pfad zur erstellten .uin Datei
@@ -87,7 +117,9 @@ class UINPackageBuilder:
         
         # Edges lesen und encodieren
         with open(edges_path, 'rb') as f:
-            edges_b64 = base64.b64encode(f.read()).decode('utf-8')
+            edges_data = f.read()
+        if container == capsule_format.FORMAT_V2:
+            edges_data = edge_codec.transcode(edges_data, edge_codec.PNG, edges_encoding)
         
         # Attribute laden
         with open(attributes_path, 'r') as f:
@@ -95,7 +127,7 @@ class UINPackageBuilder:
         
         # Package erstellen
         package = {
-            "format": "uin-capsule-v1",
+            "format": container,
             "version": self.version,
             "metadata": {
                 "creation_timestamp": datetime.now().isoformat(),
@@ -104,18 +136,19 @@ class UINPackageBuilder:
                     "attributes": os.path.basename(attributes_path)
                 }
             },
-            "edges": edges_b64,
+            "edges": edges_data,
             "attributes": attributes
         }
+        if container == capsule_format.FORMAT_V2:
+            package["edges_encoding"] = edges_encoding
         
         # Ausgabepfad bestimmen
         if not output_path:
             base_name = os.path.splitext(edges_path)[0]
             output_path = f"{base_name}.uin"
         
-        # Package speichern
-        with open(output_path, 'w') as f:
-            json.dump(package, f, indent=2, ensure_ascii=False)
+        # Package speichern (v1: base64 wird beim Schreiben blockweise erzeugt)
+        self.save_package(package, output_path)
         
         # Größeninfo ausgeben
         edges_size = os.path.getsize(edges_path)
@@ -128,23 +161,31 @@ class UINPackageBuilder:
         
         return output_path
     
-    def load_package(self, uin_path: str) -> Dict[str, Any]:
-        """Lädt und dekodiert UIN Package"""
+    def open_package(self, uin_path: str) -> capsule_format.LazyCapsule:
+        """
+        Öffnet UIN Package lazy (v1 oder v2).
         
-        with open(uin_path, 'r') as f:
-            package = json.load(f)
+        Attribute werden beim Zugriff geparst, die Kanten erst bei
+        edges_array dekodiert; bytes_read/bytes_decoded zeigen den Aufwand.
+        """
+        return capsule_format.LazyCapsule(uin_path)
+    
+    def load_package(self, uin_path: str) -> Dict[str, Any]:
+        """Lädt und dekodiert UIN Package (v1 oder v2)"""
         
-        # Base64 Edges dekodieren
-        edges_b64 = package.get('edges', '')
-        edges_data = base64.b64decode(edges_b64)
+        if capsule_format.is_v2(uin_path):
+            package = capsule_format.read_document(uin_path)
+            edges_data = capsule_format.read_edges(uin_path)
+            encoding = package.get('edges_encoding', edge_codec.PNG)
+        else:
+            # Base64 Edges blockweise dekodieren
+            sink = io.BytesIO()
+            package = capsule_format.read_v1_stream(uin_path, sink)
+            edges_data = sink.getvalue()
+            encoding = edge_codec.PNG
         
         # Als numpy array konvertieren
-        import io
-        from PIL import Image
-        import numpy as np
-        
-        img = Image.open(io.BytesIO(edges_data))
-        edges_array = np.array(img)
+        edges_array = edge_codec.decode_edges(edges_data, encoding)
         
         return {
             "package": package,
@@ -163,16 +204,22 @@ class UINPackageBuilder:
                 return False
         
         # Format Version prüfen
-        if package.get("format") != "uin-capsule-v1":
+        if package.get("format") not in (capsule_format.FORMAT_V1, capsule_format.FORMAT_V2):
             print("❌ Falsches Format")
             return False
         
-        # Edges sollten base64 sein
-        try:
-            base64.b64decode(package["edges"][:100] + "...")
-        except:
-            print("❌ Ungültiges base64 in edges")
-            return False
+        if package["format"] == capsule_format.FORMAT_V2:
+            # Edges sind rohe Bytes
+            if not isinstance(package["edges"], (bytes, bytearray, memoryview)):
+                print("❌ Edges sollten im v2-Container rohe Bytes sein")
+                return False
+        else:
+            # Edges sollten base64 sein
+            try:
+                base64.b64decode(package["edges"][:100] + "...")
+            except:
+                print("❌ Ungültiges base64 in edges")
+                return False
         
         # Attributes sollten ein Dictionary sein
         if not isinstance(package["attributes"], dict):
@@ -192,6 +239,21 @@ def main():
     build_parser.add_argument('--edges', '-e', required=True, help='Canny Edges PNG')
     build_parser.add_argument('--attributes', '-a', required=True, help='Attribute JSON')
     build_parser.add_argument('--output', '-o', help='Ausgabedatei')
+    build_parser.add_argument('--binary', '-b', action='store_true',
+                              help='Als uin-capsule-v2 Binärcontainer speichern')
+    build_parser.add_argument('--edge-encoding', choices=edge_codec.ENCODINGS,
+                              default=edge_codec.PNG,
+                              help='Kanten-Kodierung im v2-Container (default: png)')
+    
+    # Convert command
+    convert_parser = subparsers.add_parser('convert', help='Konvertiert zwischen v1 und v2')
+    convert_parser.add_argument('package', help='.uin Package Datei')
+    convert_parser.add_argument('output', help='Ausgabedatei')
+    convert_parser.add_argument('--to', choices=['v1', 'v2'], default='v2',
+                                help='Zielformat (default: v2)')
+    convert_parser.add_argument('--edge-encoding', choices=edge_codec.ENCODINGS,
+                                default=edge_codec.PACKBITS_ZLIB,
+                                help='Kanten-Kodierung bei --to v2 (default: packbits_zlib)')
     
     # Load command
     load_parser = subparsers.add_parser('load', help='Lädt und zeigt Package Info')
@@ -206,13 +268,22 @@ def main():
     builder = UINPackageBuilder()
     
     if args.command == 'build':
-        builder.build_from_files(args.edges, args.attributes, args.output)
+        container = capsule_format.FORMAT_V2 if args.binary else capsule_format.FORMAT_V1
+        builder.build_from_files(args.edges, args.attributes, args.output, container,
+                                 args.edge_encoding)
+    
+    elif args.command == 'convert':
+        if args.to == 'v2':
+            capsule_format.convert_v1_to_v2(args.package, args.output, args.edge_encoding)
+        else:
+            capsule_format.convert_v2_to_v1(args.package, args.output)
+        print(f"✅ Konvertiert nach {args.to}: {args.output}")
     
     elif args.command == 'load':
         try:
-            data = builder.load_package(args.package)
-            package = data["package"]
-            attributes = data["attributes"]
+            capsule = builder.open_package(args.package)
+            package = capsule.document
+            attributes = capsule.attributes
             
             print(f"📦 Package: {args.package}")
             print(f"   Format: {package.get('format')}")
@@ -227,16 +298,21 @@ def main():
                 else:
                     print(f"   {key}: {value}")
             
-            # Edge-Dimensionen zeigen
-            edges_array = data["edges_array"]
-            print(f"\n🖼️ Edges: {edges_array.shape} (Höhe x Breite)")
+            # Edge-Dimensionen zeigen (nur Header, keine Pixel dekodiert)
+            print(f"\n🖼️ Edges: {tuple(capsule.edges_shape)} (Höhe x Breite)")
+            print(f"   Gelesen: {capsule.bytes_read:,} Bytes, "
+                  f"dekodiert: {capsule.bytes_decoded:,} Bytes")
             
         except Exception as e:
             print(f"❌ Fehler beim Laden: {e}")
     
     elif args.command == 'validate':
-        with open(args.package, 'r') as f:
-            package = json.load(f)
+        if capsule_format.is_v2(args.package):
+            package = capsule_format.read_document(args.package)
+            package["edges"] = capsule_format.read_edges(args.package)
+        else:
+            with open(args.package, 'r') as f:
+                package = json.load(f)
         
         if builder.validate_package(package):
             print("✅ Package ist gültig")
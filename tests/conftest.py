@@ -0,0 +1,183 @@
+"""Gemeinsame Test-Hilfen: Repo-Wurzel importierbar machen, Beispielbild, ComfyUI-Stub-Server"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(1, str(REPO_ROOT))
+
+
+@pytest.fixture
+def sample_image(tmp_path):
+    """Kleines PNG mit klaren Kanten (Rechteck auf Verlauf)"""
+    img = np.tile(np.linspace(0, 200, 96, dtype=np.uint8), (64, 1))
+    img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    cv2.rectangle(img, (20, 16), (70, 48), (30, 180, 250), -1)
+    path = tmp_path / "sample.png"
+    cv2.imwrite(str(path), img)
+    return path
+
+
+class StubComfyUI:
+    """
+    Minimaler ComfyUI-Server (HTTP) für Client-, Tracker- und Scheduler-Tests.
+
+    Prompts sind nach `delay(index)` Sekunden fertig (index = Reihenfolge des
+    Eingangs); /history meldet sie erst dann. Zeitstempel der Ausführung
+    kommen von einer um `clock_offset` verschobenen Server-Uhr.
+    """
+
+    def __init__(self, delay=lambda index: 0.05, clock_offset=0.0, fail=()):
+        self.delay = delay
+        self.clock_offset = clock_offset
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+        self.inputs = set()
+        self.uploads = 0
+        self.prompts = {}
+        self.events = []  # (Zeit, "upload"/"submit", Nummer)
+        self.max_in_flight = 0
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def in_flight(self, now=None):
+        now = time.time() if now is None else now
+        return sum(1 for p in self.prompts.values() if p["submitted"] <= now < p["finished"])
+
+    def history(self, prompt_id):
+        prompt = self.prompts.get(prompt_id)
+        if prompt is None or time.time() < prompt["finished"]:
+            return {}
+        start_ms = (prompt["started"] + self.clock_offset) * 1000
+        end_ms = (prompt["finished"] + self.clock_offset) * 1000
+        if prompt["index"] in self.fail:
+            status = {"status_str": "error", "completed": False, "messages": [
+                ["execution_start", {"timestamp": start_ms}],
+                ["execution_error", {"timestamp": end_ms, "exception_message": "CUDA OOM"}]]}
+            outputs = {}
+        else:
+            status = {"status_str": "success", "completed": True, "messages": [
+                ["execution_start", {"timestamp": start_ms}],
+                ["execution_success", {"timestamp": end_ms}]]}
+            outputs = {"9": {"images": [{"filename": f"out_{prompt['index']}.png"}]}}
+        return {prompt_id: {"outputs": outputs, "status": status}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=b"", content_type="application/json"):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                now = time.time()
+                with stub.lock:
+                    if self.path == "/upload/image":
+                        stub.uploads += 1
+                        name = f"edge_{stub.uploads}.png"
+                        stub.inputs.add(name)
+                        stub.events.append((now, "upload", stub.uploads))
+                        return self._reply(200, {"name": name})
+                    if self.path == "/prompt":
+                        index = len(stub.prompts)
+                        prompt_id = f"p{index}"
+                        stub.prompts[prompt_id] = {
+                            "index": index, "payload": json.loads(body), "submitted": now,
+                            "started": now, "finished": now + stub.delay(index)}
+                        stub.events.append((now, "submit", index))
+                        stub.max_in_flight = max(stub.max_in_flight, stub.in_flight(now))
+                        return self._reply(200, {"prompt_id": prompt_id, "number": index})
+                self._reply(404, {"error": "unknown"})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path.startswith("/history/"):
+                    with stub.lock:
+                        return self._reply(200, stub.history(url.path.rsplit("/", 1)[1]))
+                if url.path == "/view":
+                    name = query.get("filename", [""])[0]
+                    if query.get("type", ["output"])[0] == "input" and name not in stub.inputs:
+                        return self._reply(404, {"error": "missing"})
+                    return self._reply(200, b"\x89PNG stub", "image/png")
+                self._reply(404, {"error": "unknown"})
+
+            do_HEAD = do_GET
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def comfyui_stub():
+    """Startet einen StubComfyUI; weitere Parameter über stub.delay/fail setzen"""
+    with StubComfyUI() as stub:
+        yield stub
+
+
+def make_packages(root, count):
+    """count UIN-Pakete (je Unterordner JSON + eigenes Kantenbild)"""
+    for i in range(count):
+        package = root / f"img{i:02d}"
+        package.mkdir(parents=True)
+        (package / f"img{i:02d}_attributes.uin.json").write_text(
+            json.dumps({"edge_reference": {"use_as_control": False}}))
+        edges = np.zeros((8, 8), dtype=np.uint8)
+        edges[i % 8, :] = 255 - i
+        cv2.imwrite(str(package / f"img{i:02d}_edges.png"), edges)
+    return root
+
+
+@pytest.fixture
+def autopilot_factory(comfyui_stub, tmp_path, monkeypatch):
+    """AutoPilot gegen den Stub (nur Polling, schnelle Intervalle): create(max_workers)"""
+    from workflow import comfyui_automation
+    from workflow.comfyui_automation import ComfyUIUINAutoPilot, CompletionTracker
+    from workflow.comfyui_client import ComfyUIClient, UploadRegistry
+
+    monkeypatch.setattr(comfyui_automation, "websocket", None)
+    # Workflow-Vorlage wird relativ zum Arbeitsverzeichnis gelesen
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "workflows").mkdir()
+    (tmp_path / "workflows" / "comfyui-uin-basic.json").write_text(
+        json.dumps({"6": {"inputs": {}}, "11": {"inputs": {}}}))
+
+    def create(max_workers):
+        client = ComfyUIClient(comfyui_stub.url, pool_size=max_workers + 2,
+                               upload_registry=UploadRegistry(tmp_path / "uploads.jsonl"))
+        autopilot = ComfyUIUINAutoPilot(comfyui_stub.url, max_workers=max_workers, client=client)
+        autopilot.tracker = CompletionTracker(client, poll_initial=0.01, poll_max=0.02)
+        return autopilot
+    return create
@@ -0,0 +1,48 @@
+"""ComfyUIUINAutoPilot: begrenzte Parallelität, Backpressure, Ergebnis-Reihenfolge (Stub-Server)"""
+import json
+
+from conftest import make_packages
+
+
+def test_keeps_exactly_max_workers_prompts_in_flight(comfyui_stub, autopilot_factory, tmp_path):
+    comfyui_stub.delay = lambda index: 0.2
+    packages = make_packages(tmp_path / "uin", 6)
+
+    results = autopilot_factory(3).batch_process_uin_folder(packages, tmp_path / "out")
+
+    assert len(results) == 6
+    assert comfyui_stub.max_in_flight == 3
+
+
+def test_uploads_stay_bounded_ahead_of_generation(comfyui_stub, autopilot_factory, tmp_path):
+    comfyui_stub.delay = lambda index: 0.1
+    packages = make_packages(tmp_path / "uin", 10)
+    max_workers = 2
+
+    autopilot_factory(max_workers).batch_process_uin_folder(packages, tmp_path / "out")
+
+    finished = sorted(p["finished"] for p in comfyui_stub.prompts.values())
+    for moment, kind, number in comfyui_stub.events:
+        if kind == "upload":
+            done = sum(1 for t in finished if t <= moment)
+            # Slots + Queue + ein Paket in Vorbereitung
+            assert number - done <= 2 * max_workers + 1
+    assert comfyui_stub.uploads == 10
+
+
+def test_results_in_package_order_despite_completion_order(comfyui_stub, autopilot_factory,
+                                                           tmp_path):
+    # Spätere Prompts sind schneller fertig
+    comfyui_stub.delay = lambda index: 0.25 - 0.04 * index
+    packages = make_packages(tmp_path / "uin", 5)
+
+    results = autopilot_factory(5).batch_process_uin_folder(packages, tmp_path / "out")
+
+    journal = [json.loads(line)["package"]
+               for line in (tmp_path / "out" / "batch_results.jsonl").read_text().splitlines()]
+    expected = [f"img{i:02d}_attributes.uin" for i in range(5)]
+    assert journal != expected and sorted(journal) == expected
+    assert [r["package"] for r in results] == expected
+    summary = json.loads((tmp_path / "out" / "batch_results.json").read_text())
+    assert [r["package"] for r in summary] == expected
+    assert all(r["execution_time_s"] is not None for r in summary)
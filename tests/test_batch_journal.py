@@ -0,0 +1,83 @@
+"""BatchJournal: Laden, abgeschnittene Zeilen, Kompaktierung und Fortsetzen eines Batch-Laufs"""
+import json
+
+from conftest import make_packages
+from workflow.comfyui_automation import BatchJournal
+
+
+def journal_record(root, index):
+    source = root / f"img{index:02d}" / f"img{index:02d}_attributes.uin.json"
+    return {"source": str(source), "package": source.stem, "workflow_id": f"old{index}",
+            "image_path": None, "queue_time_s": 0.0, "execution_time_s": 0.0,
+            "timestamp": 0.0}
+
+
+def test_load_skips_torn_last_line(tmp_path):
+    path = tmp_path / "batch_results.jsonl"
+    path.write_text(json.dumps({"source": "a"}) + "\n" + '{"source": "b", "pack')
+
+    assert list(BatchJournal(path).load()) == ["a"]
+
+
+def test_open_resume_truncates_torn_line_before_appending(tmp_path):
+    path = tmp_path / "batch_results.jsonl"
+    path.write_text(json.dumps({"source": "a"}) + "\n" + '{"source": "b", "pack')
+
+    journal = BatchJournal(path)
+    journal.open(resume=True)
+    journal.append({"source": "c"})
+    journal.close()
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["source"] for line in lines] == ["a", "c"]
+
+
+def test_compact_writes_records_in_given_order(tmp_path):
+    journal = BatchJournal(tmp_path / "batch_results.jsonl")
+    journal.open()
+    for source in ("c", "a", "b"):
+        journal.append({"source": source})
+    journal.close()
+
+    ordered = journal.compact(tmp_path / "batch_results.json", ["a", "b", "c", "missing"])
+
+    assert [r["source"] for r in ordered] == ["a", "b", "c"]
+    summary = json.loads((tmp_path / "batch_results.json").read_text())
+    assert [r["source"] for r in summary] == ["a", "b", "c"]
+
+
+def test_resume_after_partial_journal_submits_only_remaining_packages(comfyui_stub,
+                                                                      autopilot_factory,
+                                                                      tmp_path):
+    packages = make_packages(tmp_path / "uin", 5)
+    out = tmp_path / "out"
+    out.mkdir()
+    # Absturz nach img00 und img02, mitten im Schreiben von img03
+    partial = [journal_record(packages, 0), journal_record(packages, 2)]
+    (out / "batch_results.jsonl").write_text(
+        "".join(json.dumps(r) + "\n" for r in partial)
+        + json.dumps(journal_record(packages, 3))[:40])
+
+    results = autopilot_factory(2).batch_process_uin_folder(packages, out, resume=True)
+
+    assert len(comfyui_stub.prompts) == 3
+    lines = (out / "batch_results.jsonl").read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [r["workflow_id"] for r in records[:2]] == ["old0", "old2"]
+    assert sorted(r["package"] for r in records[2:]) == [
+        "img01_attributes.uin", "img03_attributes.uin", "img04_attributes.uin"]
+    expected = [f"img{i:02d}_attributes.uin" for i in range(5)]
+    assert [r["package"] for r in results] == expected
+    summary = json.loads((out / "batch_results.json").read_text())
+    assert [r["package"] for r in summary] == expected
+    assert summary[0]["workflow_id"] == "old0"
+
+
+def test_resume_without_journal_processes_everything(comfyui_stub, autopilot_factory, tmp_path):
+    packages = make_packages(tmp_path / "uin", 3)
+
+    results = autopilot_factory(2).batch_process_uin_folder(packages, tmp_path / "out",
+                                                            resume=True)
+
+    assert len(comfyui_stub.prompts) == 3
+    assert len(results) == 3
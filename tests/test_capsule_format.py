@@ -0,0 +1,57 @@
+"""UIN Capsule: v1/v2 Container und Roundtrip"""
+import numpy as np
+import pytest
+
+from uin_capsule import capsule_format, edge_codec
+
+
+@pytest.fixture
+def edges():
+    img = np.zeros((37, 53), dtype=np.uint8)
+    img[5, :] = 255
+    img[:, 11] = 255
+    img[20:30, 40:45] = 255
+    return img
+
+
+def test_v2_roundtrip_reads_document_without_edges(edges, tmp_path):
+    path = str(tmp_path / "a.uinc")
+    data = edge_codec.encode_edges(edges)
+    capsule_format.write_capsule(path, {"attributes": {"caption": "ä"}, "edges": "alt"},
+                                 data, edge_codec.PACKBITS_ZLIB)
+
+    document = capsule_format.read_document(path)
+    assert capsule_format.is_v2(path)
+    assert document["format"] == capsule_format.FORMAT_V2
+    assert document["attributes"] == {"caption": "ä"}
+    assert "edges" not in document
+    assert bytes(capsule_format.read_edges(path)) == data
+    assert capsule_format.read_header(path).edges_offset % 16 == 0
+    np.testing.assert_array_equal(capsule_format.read_edges_array(path), edges)
+
+
+def test_v1_stream_roundtrip(edges, tmp_path):
+    path = str(tmp_path / "a.json")
+    data = edge_codec.encode_edges(edges, edge_codec.PNG)
+    capsule_format.write_v1_stream(path, {"format": capsule_format.FORMAT_V1, "n": [1, 2]},
+                                   data, chunk_size=7)
+
+    document, loaded = capsule_format.load_any(path)
+    assert not capsule_format.is_v2(path)
+    assert document == {"format": capsule_format.FORMAT_V1, "n": [1, 2]}
+    assert loaded == data
+
+
+def test_convert_v1_v2_v1_keeps_document_and_pixels(edges, tmp_path):
+    v1 = str(tmp_path / "a.json")
+    v2 = str(tmp_path / "a.uinc")
+    back = str(tmp_path / "b.json")
+    capsule_format.write_v1_stream(v1, {"format": capsule_format.FORMAT_V1, "id": 7},
+                                   edge_codec.encode_edges(edges, edge_codec.PNG))
+
+    capsule_format.convert_v1_to_v2(v1, v2, edge_codec.PACKBITS_ZLIB)
+    capsule_format.convert_v2_to_v1(v2, back)
+
+    document, data = capsule_format.load_any(back)
+    assert document == {"format": capsule_format.FORMAT_V1, "id": 7}
+    np.testing.assert_array_equal(edge_codec.decode_edges(data, edge_codec.PNG), edges)
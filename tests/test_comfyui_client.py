@@ -0,0 +1,73 @@
+"""ComfyUIClient: Wiederholungsregeln mit gemockter Session"""
+import http.client
+from unittest import mock
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from workflow import comfyui_client
+
+
+def refused():
+    reason = NewConnectionError(None, "Failed to establish a new connection: [Errno 111]")
+    return requests.ConnectionError(MaxRetryError(None, "/prompt", reason=reason))
+
+
+def reset():
+    return requests.ConnectionError(ProtocolError("Connection aborted.", ConnectionResetError(104, "reset")))
+
+
+def remote_disconnected():
+    return requests.ConnectionError(
+        ProtocolError("Connection aborted.", http.client.RemoteDisconnected("closed"))
+    )
+
+
+def ok_response():
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {"prompt_id": "p1"}
+    return response
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(comfyui_client.time, "sleep", lambda seconds: None)
+    client = comfyui_client.ComfyUIClient("http://comfy.test", retries=2)
+    client.session = mock.Mock()
+    return client
+
+
+@pytest.mark.parametrize("error", [requests.ConnectTimeout, refused])
+def test_post_retried_when_never_sent(client, error):
+    client.session.request.side_effect = [error(), ok_response()]
+
+    response = client.request("POST", "/prompt", json={})
+
+    assert response.status_code == 200
+    assert client.session.request.call_count == 2
+
+
+@pytest.mark.parametrize("error", [reset, remote_disconnected, requests.ReadTimeout])
+def test_post_not_retried_when_possibly_sent(client, error):
+    client.session.request.side_effect = [error(), ok_response()]
+
+    with pytest.raises(requests.RequestException):
+        client.request("POST", "/prompt", json={})
+    assert client.session.request.call_count == 1
+
+
+@pytest.mark.parametrize("error", [reset, remote_disconnected, requests.ReadTimeout])
+def test_get_retried_on_any_connection_error(client, error):
+    client.session.request.side_effect = [error(), error(), ok_response()]
+
+    assert client.request("GET", "/history/p1").status_code == 200
+    assert client.session.request.call_count == 3
+
+
+def test_retries_exhausted_raises_last_error(client):
+    client.session.request.side_effect = [refused(), refused(), refused()]
+
+    with pytest.raises(requests.ConnectionError):
+        client.request("POST", "/prompt", json={})
+    assert client.session.request.call_count == 3
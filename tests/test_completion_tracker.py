@@ -0,0 +1,79 @@
+"""CompletionTracker: Websocket-Ereignisse und /history-Polling (Stub-Server)"""
+import time
+
+import pytest
+
+from workflow import comfyui_automation
+from workflow.comfyui_automation import CompletionTracker
+from workflow.comfyui_client import ComfyUIClient
+
+
+@pytest.fixture
+def polling_tracker(comfyui_stub, monkeypatch):
+    # Ohne websocket-client: nur der Polling-Pfad
+    monkeypatch.setattr(comfyui_automation, "websocket", None)
+    return CompletionTracker(ComfyUIClient(comfyui_stub.url), poll_initial=0.02, poll_max=0.1)
+
+
+def submit(tracker):
+    submitted_at = time.time()
+    result = tracker.client.queue_prompt({"1": {}}, client_id=tracker.client_id)
+    tracker.register(result["prompt_id"], submitted_at)
+    return result["prompt_id"]
+
+
+def test_polling_fallback_uses_server_durations_only(comfyui_stub, polling_tracker):
+    # Server-Uhr eine Stunde voraus: absolute Zeitstempel wären unbrauchbar
+    comfyui_stub.clock_offset = 3600
+    comfyui_stub.delay = lambda index: 0.3
+
+    completion = polling_tracker.wait(submit(polling_tracker), timeout=5)
+
+    assert completion["image"] == "out_0.png"
+    assert completion["execution_time_s"] == pytest.approx(0.3, abs=0.01)
+    assert 0 <= completion["queue_time_s"] < 0.2
+    assert completion["total_time_s"] == pytest.approx(
+        completion["queue_time_s"] + completion["execution_time_s"])
+    assert polling_tracker._prompts == {}
+
+
+def test_history_error_status_is_a_failure(comfyui_stub, polling_tracker):
+    comfyui_stub.fail = {0}
+
+    with pytest.raises(RuntimeError, match="CUDA OOM"):
+        polling_tracker.wait(submit(polling_tracker), timeout=5)
+
+
+def test_polling_times_out(comfyui_stub, polling_tracker):
+    comfyui_stub.delay = lambda index: 10
+
+    with pytest.raises(TimeoutError):
+        polling_tracker.wait(submit(polling_tracker), timeout=0.2)
+
+
+def test_websocket_events_complete_prompt_and_ignore_strays(comfyui_stub, polling_tracker):
+    comfyui_stub.delay = lambda index: 0
+    prompt_id = submit(polling_tracker)
+    polling_tracker._handle_message({"type": "execution_start", "data": {"prompt_id": "fremd"}})
+    polling_tracker._handle_message({"type": "execution_start", "data": {"prompt_id": prompt_id}})
+    polling_tracker._handle_message({"type": "executed", "data": {
+        "prompt_id": prompt_id, "output": {"images": [{"filename": "ws.png"}]}}})
+    polling_tracker._handle_message({"type": "execution_success", "data": {"prompt_id": prompt_id}})
+
+    completion = polling_tracker.wait(prompt_id, timeout=1)
+    # Nachzügler nach execution_success legt keinen neuen Eintrag an
+    polling_tracker._handle_message({"type": "executing", "data": {"prompt_id": prompt_id, "node": None}})
+
+    assert completion["image"] == "ws.png"
+    assert completion["execution_time_s"] is not None
+    assert polling_tracker._prompts == {}
+
+
+def test_execution_error_event_raises(comfyui_stub, polling_tracker):
+    comfyui_stub.delay = lambda index: 10
+    prompt_id = submit(polling_tracker)
+    polling_tracker._handle_message({"type": "execution_error", "data": {
+        "prompt_id": prompt_id, "exception_message": "Node 11 fehlt"}})
+
+    with pytest.raises(RuntimeError, match="Node 11 fehlt"):
+        polling_tracker.wait(prompt_id, timeout=1)
@@ -0,0 +1,97 @@
+"""EdgeCache: Schlüsseltrennung, Verdrängung und gemeinsame Nutzung durch beide Extraktionspfade"""
+import os
+
+import numpy as np
+import pytest
+
+from utils import extract_edges
+from utils.edge_cache import EdgeCache
+
+
+def test_edges_then_package_share_cache_dir(sample_image, tmp_path):
+    cache = EdgeCache(tmp_path / "cache")
+    edges, stats = extract_edges.extract_canny_edges(sample_image, cache=cache)
+
+    result = extract_edges.create_uin_package(sample_image, tmp_path / "out", cache=cache)
+
+    assert not result["cache_hit"]
+    written = (tmp_path / "out" / "sample_edges.png").read_bytes()
+    assert written.startswith(b"\x89PNG")
+    assert result["stats"] == stats
+
+
+def test_package_hit_skips_decode(sample_image, tmp_path, monkeypatch):
+    cache = EdgeCache(tmp_path / "cache")
+    first = extract_edges.create_uin_package(sample_image, tmp_path / "a", cache=cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Bild wurde trotz Cache-Treffer dekodiert")
+    monkeypatch.setattr(extract_edges, "decode_image", fail)
+
+    second = extract_edges.create_uin_package(sample_image, tmp_path / "b", cache=cache)
+
+    assert second["cache_hit"]
+    for name in ("sample_edges.png", "sample_preview.jpg"):
+        assert (tmp_path / "a" / name).read_bytes() == (tmp_path / "b" / name).read_bytes()
+    assert second["stats"] == first["stats"]
+
+
+def test_keys_differ_by_params_and_content(sample_image, tmp_path):
+    cache = EdgeCache(tmp_path / "cache")
+    base = cache.make_key(sample_image, {"op": "canny", "low": 100})
+
+    assert cache.make_key(sample_image, {"op": "canny", "low": 100}) == base
+    assert cache.make_key(sample_image, {"op": "canny", "low": 101}) != base
+    assert cache.make_key(sample_image, {"op": "canny_png", "low": 100}) != base
+
+    other = tmp_path / "other.png"
+    other.write_bytes(sample_image.read_bytes() + b"\0")
+    assert cache.make_key(other, {"op": "canny", "low": 100}) != base
+
+
+def test_roundtrip_with_and_without_payload(tmp_path):
+    cache = EdgeCache(tmp_path / "cache")
+    edges = np.zeros((5, 7), dtype=np.uint8)
+    edges[2, 3] = 255
+
+    cache.put("a" * 40, edges, {"n": 1})
+    cache.put("b" * 40, edges, {"n": 2}, b"payload")
+
+    got_edges, meta, payload = cache.get("a" * 40)
+    assert np.array_equal(got_edges, edges) and meta == {"n": 1} and payload is None
+    assert cache.get("b" * 40)[2] == b"payload"
+    assert cache.get("c" * 40) is None
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = EdgeCache(tmp_path / "cache")
+    edges = np.full((16, 16), 255, dtype=np.uint8)
+    payload = os.urandom(4096)
+    keys = [f"{i:02d}" + "0" * 38 for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, edges, {}, payload)
+        os.utime(cache._entry_path(key), (1000 + i, 1000 + i))
+    entry_size = cache._entry_path(keys[0]).stat().st_size
+
+    # Platz für zwei Einträge: die beiden ältesten müssen weichen
+    cache.max_bytes = int(entry_size * 2.5)
+    cache.put("99" + "0" * 38, edges, {}, payload)
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.get("99" + "0" * 38) is not None
+    assert cache.stats()["size_bytes"] <= cache.max_bytes
+    assert cache.evictions == 2
+
+
+def test_overwriting_key_does_not_double_count_size(tmp_path):
+    cache = EdgeCache(tmp_path / "cache")
+    edges = np.full((16, 16), 255, dtype=np.uint8)
+
+    for size in (4096, 1024, 2048):
+        cache.put("a" * 40, edges, {}, os.urandom(size))
+
+    assert cache._total_bytes == cache._entry_path("a" * 40).stat().st_size
+    assert cache._total_bytes == cache.stats()["size_bytes"]
+    assert cache.evictions == 0
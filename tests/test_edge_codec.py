@@ -0,0 +1,29 @@
+"""Kanten-Kodierung: Roundtrip aller Kodierungen"""
+import numpy as np
+import pytest
+
+from uin_capsule import edge_codec
+
+
+@pytest.fixture
+def edges():
+    img = np.zeros((37, 53), dtype=np.uint8)
+    img[5, :] = 255
+    img[:, 11] = 255
+    img[20:30, 40:45] = 255
+    return img
+
+
+@pytest.mark.parametrize("encoding", edge_codec.ENCODINGS)
+def test_edge_codec_roundtrip(edges, encoding):
+    data = edge_codec.encode_edges(edges, encoding)
+
+    assert edge_codec.peek_shape(data, encoding) == edges.shape
+    np.testing.assert_array_equal(edge_codec.decode_edges(data, encoding), edges)
+
+
+def test_edge_codec_bit_encodings_threshold_gray(edges):
+    gray = edges // 2 + 100  # 100 bzw. 227
+    data = edge_codec.encode_edges(gray, edge_codec.PACKBITS_ZLIB)
+
+    np.testing.assert_array_equal(edge_codec.decode_edges(data), edges)
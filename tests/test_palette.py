@@ -0,0 +1,44 @@
+"""Farbpaletten: Engine und Palette im UIN-Paket (für den Offline-Generator)"""
+import json
+
+import numpy as np
+import pytest
+
+from utils import extract_edges, palette
+from utils.edge_cache import EdgeCache
+from workflow.roundtrip_generators import FALLBACK_PALETTE, _parse_palette
+
+
+def test_package_contains_palette_also_on_cache_hit(sample_image, tmp_path):
+    cache = EdgeCache(tmp_path / "cache")
+    first = extract_edges.create_uin_package(sample_image, tmp_path / "a", cache=cache)
+    second = extract_edges.create_uin_package(sample_image, tmp_path / "b", cache=cache)
+
+    colors = json.loads((tmp_path / "a" / "sample_attributes.uin.json").read_text())["colors"]
+    cached = json.loads((tmp_path / "b" / "sample_attributes.uin.json").read_text())["colors"]
+
+    assert second["cache_hit"] and not first["cache_hit"]
+    assert colors == cached
+    # Rechteck (BGR 30,180,250) ist die stärkste Einzelfarbe
+    assert "#fab41e" in colors
+    assert _parse_palette({"colors": colors}) != FALLBACK_PALETTE
+
+
+def test_fully_white_image_has_no_palette_with_skip_white():
+    white = np.full((40, 60, 3), 255, dtype=np.uint8)
+
+    assert palette.extract_palette(white, skip_white=True) == []
+    only = palette.extract_palette(white)
+    assert only == [{"color": [255, 255, 255], "fraction": 1.0}]
+
+
+def test_grayscale_input_yields_gray_colors():
+    gray = np.zeros((64, 64), dtype=np.uint8)
+    gray[:, 16:] = 128
+    gray[:, 48:] = 220
+
+    entries = palette.extract_palette(gray, count=5)
+
+    assert [entry["color"] for entry in entries] == [[128, 128, 128], [0, 0, 0], [220, 220, 220]]
+    assert [entry["fraction"] for entry in entries] == pytest.approx([0.5, 0.25, 0.25])
+    assert palette.to_hex(entries[0]["color"]) == "#808080"
@@ -0,0 +1,38 @@
+"""StreamingStats: Perzentile aus dem Histogramm, Sonderwerte"""
+import numpy as np
+import pytest
+
+from workflow.roundtrip_metrics import StreamingStats
+
+
+def test_percentiles_match_numpy_within_one_bin():
+    values = np.random.default_rng(0).uniform(0, 1, 5000)
+    stats = StreamingStats(0, 1, bins=100)
+    for value in values:
+        stats.add(value)
+
+    for q in (5, 50, 95):
+        assert stats.percentile(q) == pytest.approx(np.percentile(values, q), abs=0.01)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.summary()["std"] == pytest.approx(values.std(ddof=1))
+
+
+def test_out_of_range_and_non_finite_values():
+    stats = StreamingStats(0, 10, bins=10)
+    for value in (-5, 1.5, 2.5, 50, float("inf"), float("nan")):
+        stats.add(value)
+
+    summary = stats.summary()
+    assert summary["count"] == 4
+    assert summary["non_finite"] == 2
+    assert summary["histogram"]["underflow"] == 1
+    assert summary["histogram"]["overflow"] == 1
+    assert stats.percentile(0) == -5
+    assert stats.percentile(100) == 50
+
+
+def test_empty_stats():
+    summary = StreamingStats(0, 1).summary()
+
+    assert summary["count"] == 0
+    assert summary["mean"] is None and summary["p50"] is None
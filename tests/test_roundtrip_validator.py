@@ -0,0 +1,46 @@
+"""UINRoundtripValidator: eigene Paket-Ordner pro Bild, Reports im Batch (offline)"""
+import json
+import shutil
+from pathlib import Path
+
+from workflow.roundtrip_generators import EdgePaletteGenerator
+from workflow.roundtrip_validator import UINRoundtripValidator
+
+
+def fake_report(original_path, generated_path, metrics, uin_data, output_dir, name=None):
+    # Matplotlib ist optional; nur Pfad und Datei wie der echte Report
+    path = Path(output_dir) / f"report_{name}.png"
+    path.write_bytes(b"report")
+    return str(path)
+
+
+def test_same_stem_different_suffix_get_separate_packages(sample_image, tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    shutil.copy(sample_image, images / "a.png")
+    shutil.copy(sample_image, images / "a.jpg")
+    out = tmp_path / "out"
+    validator = UINRoundtripValidator(generator=EdgePaletteGenerator())
+    validator._create_validation_report = fake_report
+
+    summary = validator.batch_validation(images, out, workers=2, report=True)
+
+    assert summary["succeeded"] == 2
+    assert (out / "a_jpg" / "a_jpg_generated.png").exists()
+    assert (out / "a_png" / "a_png_generated.png").exists()
+    assert [r["image"] for r in summary["reports"]] == ["a.jpg", "a.png"]
+    assert all(Path(r["report"]).exists() for r in summary["reports"])
+    assert json.loads((out / "summary.json").read_text())["reports"] == summary["reports"]
+    records = [json.loads(line) for line in (out / "results.jsonl").read_text().splitlines()]
+    assert sorted(r["report"] for r in records) == sorted(r["report"] for r in summary["reports"])
+
+
+def test_batch_without_reports_lists_none(sample_image, tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    shutil.copy(sample_image, images / "a.png")
+
+    summary = UINRoundtripValidator(generator=EdgePaletteGenerator()).batch_validation(
+        images, tmp_path / "out", workers=1)
+
+    assert summary["succeeded"] == 1 and summary["reports"] == []
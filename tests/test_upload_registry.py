@@ -0,0 +1,80 @@
+"""Upload-Dedupe: UploadRegistry (JSONL-Log) und ComfyUIClient.upload_image (Stub-Server)"""
+import json
+
+import pytest
+
+from workflow.comfyui_client import ComfyUIClient, UploadRegistry
+
+
+@pytest.fixture
+def edge_png(tmp_path):
+    path = tmp_path / "a_edges.png"
+    path.write_bytes(b"\x89PNG edges a")
+    return path
+
+
+def test_same_content_uploaded_once_per_server(comfyui_stub, edge_png, tmp_path):
+    copy = tmp_path / "b_edges.png"
+    copy.write_bytes(edge_png.read_bytes())
+    client = ComfyUIClient(comfyui_stub.url, upload_registry=UploadRegistry(tmp_path / "u.jsonl"))
+
+    names = {client.upload_image(edge_png), client.upload_image(copy)}
+
+    assert comfyui_stub.uploads == 1 and len(names) == 1
+    assert client.uploads_skipped == 1
+
+
+def test_later_run_reuses_upload_after_server_check(comfyui_stub, edge_png, tmp_path):
+    first = ComfyUIClient(comfyui_stub.url, upload_registry=UploadRegistry(tmp_path / "u.jsonl"))
+    name = first.upload_image(edge_png)
+
+    second = ComfyUIClient(comfyui_stub.url, upload_registry=UploadRegistry(tmp_path / "u.jsonl"))
+
+    assert second.upload_image(edge_png) == name
+    assert comfyui_stub.uploads == 1
+
+
+def test_missing_file_on_server_invalidates_and_reuploads(comfyui_stub, edge_png, tmp_path):
+    registry_path = tmp_path / "u.jsonl"
+    ComfyUIClient(comfyui_stub.url, upload_registry=UploadRegistry(registry_path)).upload_image(edge_png)
+    comfyui_stub.inputs.clear()  # z.B. input/ auf dem Server geleert
+
+    client = ComfyUIClient(comfyui_stub.url, upload_registry=UploadRegistry(registry_path))
+    name = client.upload_image(edge_png)
+
+    assert comfyui_stub.uploads == 2 and name == "edge_2.png"
+    assert [json.loads(line)["name"] for line in registry_path.read_text().splitlines()] == \
+        ["edge_1.png", None, "edge_2.png"]
+
+
+def test_concurrent_workers_do_not_overwrite_each_other(tmp_path):
+    path = tmp_path / "u.jsonl"
+    worker_a, worker_b = UploadRegistry(path), UploadRegistry(path)
+
+    worker_a.record("http://s", "aaa", "a.png")
+    worker_b.record("http://s", "bbb", "b.png")
+
+    assert worker_a.lookup("http://s", "bbb") == "b.png"
+    assert worker_b.lookup("http://s", "aaa") == "a.png"
+    fresh = UploadRegistry(path)
+    assert fresh.lookup("http://s", "aaa") == "a.png" and fresh.lookup("http://s", "bbb") == "b.png"
+
+
+def test_log_is_compacted_on_load_and_ignores_torn_line(tmp_path):
+    path = tmp_path / "u.jsonl"
+    registry = UploadRegistry(path)
+    for i in range(200):
+        registry.record("http://s", "same", f"v{i}.png")
+    registry.record("http://s", "gone", "x.png")
+    registry.forget("http://s", "gone")
+    with open(path, "a") as f:
+        f.write('{"server": "http://s", "digest": "tor')
+
+    reloaded = UploadRegistry(path)
+
+    assert reloaded.lookup("http://s", "same") == "v199.png"
+    assert reloaded.lookup("http://s", "gone") is None
+    assert len(path.read_text().splitlines()) == 1
+    # Neue Einträge anderer Worker nach der Kompaktierung
+    registry.record("http://s", "new", "n.png")
+    assert reloaded.lookup("http://s", "new") == "n.png"
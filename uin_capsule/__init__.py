@@ -0,0 +1 @@
+"""UIN Capsule: Container-Formate (v1/v2) und Kanten-Kodierung"""
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+UIN Capsule Container v2 - Binärformat ohne base64
+
+Layout einer .uin Datei im Format "uin-capsule-v2":
+
+    [Header, 48 Bytes]  Magic, Version, Offsets/Längen der Sektionen
+    [JSON]              Dokument ohne "edges" (format, attributes, metadata, ...)
+    [Edges]             Rohes Kantenbild (z.B. PNG) an bekanntem Offset
+
+Attribute können gelesen werden, ohne die Kantendaten anzufassen; die
+Kantendaten lassen sich per mmap direkt aus der Datei einblenden.
+v1-Dateien (JSON mit base64 "edges") werden beim Lesen erkannt und können
+verlustfrei in beide Richtungen konvertiert werden.
+
+LazyCapsule liest beide Formate bedarfsgesteuert: nur Attribute, oder
+zusätzlich die Kantenkarte, wenn sie tatsächlich gebraucht wird.
+"""
+
+import base64
+import io
+import json
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple, Union
+
+import numpy as np
+
+try:
+    import edge_codec
+except ImportError:
+    from . import edge_codec
+
+FORMAT_V1 = "uin-capsule-v1"
+FORMAT_V2 = "uin-capsule-v2"
+
+MAGIC = b"UINC"
+CONTAINER_VERSION = 2
+
+# magic, version, reserved, json_offset, json_length, edges_offset, edges_length, reserved
+_HEADER = struct.Struct("<4sHHQQQQQ")
+HEADER_SIZE = _HEADER.size
+
+# Kantendaten werden auf diese Grenze ausgerichtet (mmap/NumPy-freundlich)
+_ALIGNMENT = 16
+
+# Blockgröße für das Streaming von v1-Dateien (Zeichen bzw. Bytes)
+STREAM_CHUNK_SIZE = 64 * 1024
+_EDGES_PLACEHOLDER = "__uin_capsule_edges_stream__"
+_JSON_DECODER = json.JSONDecoder()
+
+
+@dataclass
+class CapsuleHeader:
+    version: int
+    json_offset: int
+    json_length: int
+    edges_offset: int
+    edges_length: int
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def is_v2(path: str) -> bool:
+    """Prüft anhand der Magic Bytes, ob eine Datei ein v2-Container ist"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_capsule(path: str, document: Dict[str, Any], edges: bytes,
+                  edges_encoding: str = None) -> str:
+    """
+    Schreibt einen v2-Container.
+
+    Args:
+        path: Ausgabepfad
+        document: Capsule-Dokument; ein evtl. vorhandenes "edges"-Feld wird ignoriert
+        edges: Kodierte Kantendaten (siehe edge_codec)
+        edges_encoding: Kodierung der Kantendaten; ohne Angabe gilt
+            document["edges_encoding"] bzw. "png"
+
+    Returns:
+        Pfad zur geschriebenen Datei
+    """
+    document = {k: v for k, v in document.items() if k != "edges"}
+    document["format"] = FORMAT_V2
+    if edges_encoding:
+        document["edges_encoding"] = edges_encoding
+    document.setdefault("edges_encoding", edge_codec.PNG)
+    json_bytes = json.dumps(document, ensure_ascii=False).encode('utf-8')
+
+    json_offset = HEADER_SIZE
+    edges_offset = _align(json_offset + len(json_bytes))
+    padding = edges_offset - (json_offset + len(json_bytes))
+
+    header = _HEADER.pack(MAGIC, CONTAINER_VERSION, 0,
+                          json_offset, len(json_bytes),
+                          edges_offset, len(edges), 0)
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(json_bytes)
+        f.write(b"\0" * padding)
+        f.write(edges)
+
+    return path
+
+
+def read_header(path: str) -> CapsuleHeader:
+    """Liest nur den Header eines v2-Containers"""
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    return _parse_header(raw, path)
+
+
+def _parse_header(raw: bytes, path: str) -> CapsuleHeader:
+    if len(raw) < HEADER_SIZE or raw[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"Kein {FORMAT_V2} Container: {path}")
+    _, version, _, json_offset, json_length, edges_offset, edges_length, _ = _HEADER.unpack(raw)
+    if version != CONTAINER_VERSION:
+        raise ValueError(f"Nicht unterstützte Container-Version {version}: {path}")
+    return CapsuleHeader(version, json_offset, json_length, edges_offset, edges_length)
+
+
+def read_document(path: str) -> Dict[str, Any]:
+    """Liest Header und JSON-Sektion, ohne die Kantendaten zu lesen"""
+    with open(path, 'rb') as f:
+        header = _parse_header(f.read(HEADER_SIZE), path)
+        f.seek(header.json_offset)
+        return json.loads(f.read(header.json_length).decode('utf-8'))
+
+
+def read_edges(path: str, use_mmap: bool = False) -> Union[bytes, memoryview]:
+    """
+    Liest die rohen Kantendaten eines v2-Containers.
+
+    Args:
+        use_mmap: Kantendaten per mmap einblenden statt zu kopieren. Der
+            zurückgegebene memoryview bleibt gültig, solange er referenziert wird.
+    """
+    with open(path, 'rb') as f:
+        header = _parse_header(f.read(HEADER_SIZE), path)
+        if header.edges_length == 0:
+            return b""
+        if use_mmap:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(mapped)[header.edges_offset:header.edges_offset + header.edges_length]
+        f.seek(header.edges_offset)
+        return f.read(header.edges_length)
+
+
+def read_edges_array(path: str, use_mmap: bool = False) -> np.ndarray:
+    """Liest und dekodiert die Kantenkarte eines v2-Containers als uint8-Array"""
+    encoding = read_document(path).get("edges_encoding", edge_codec.PNG)
+    return edge_codec.decode_edges(read_edges(path, use_mmap), encoding)
+
+
+def write_v1_stream(path: str, document: Dict[str, Any],
+                    edges: Union[bytes, memoryview, str],
+                    chunk_size: int = STREAM_CHUNK_SIZE, indent: int = 2) -> str:
+    """
+    Schreibt eine v1-Capsule (JSON mit base64 "edges") blockweise.
+
+    Das Dokument ohne Kanten wird normal serialisiert; die Kantendaten
+    werden in Blöcken base64-kodiert direkt in die Datei geschrieben, ohne
+    den vollständigen base64-String oder das JSON-Dokument im Speicher
+    aufzubauen.
+
+    Args:
+        document: Capsule-Dokument; "edges" wird durch die Kantendaten ersetzt
+        edges: Rohe Kantendaten (bytes/memoryview, z.B. BytesIO.getbuffer())
+            oder bereits base64-kodierter String
+    """
+    document = dict(document)
+    document["edges"] = _EDGES_PLACEHOLDER
+    text = json.dumps(document, indent=indent, ensure_ascii=False)
+    prefix, _, suffix = text.partition(json.dumps(_EDGES_PLACEHOLDER))
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(prefix)
+        f.write('"')
+        if isinstance(edges, str):
+            for start in range(0, len(edges), chunk_size):
+                f.write(edges[start:start + chunk_size])
+        else:
+            # Vielfaches von 3, damit zwischen den Blöcken kein Padding entsteht
+            step = max(3, chunk_size // 4 * 3)
+            view = memoryview(edges)
+            for start in range(0, len(view), step):
+                f.write(base64.b64encode(view[start:start + step]).decode('ascii'))
+        f.write('"')
+        f.write(suffix)
+
+    return path
+
+
+class _JSONStreamScanner:
+    """Minimaler Scanner für das Top-Level-Objekt einer v1-Datei"""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Bereits verarbeiteten Teil verwerfen
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError("Unerwartetes Dateiende in UIN Capsule")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Ungültige UIN Capsule: '{char}' erwartet")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _JSON_DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # Zahlen am Pufferende könnten abgeschnitten sein
+            if end == len(self.buf) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def stream_base64(self, sink):
+        """Dekodiert einen base64-String blockweise in sink (None = überspringen)"""
+        self.expect('"')
+        carry = ""
+        while True:
+            end = self.buf.find('"', self.pos)
+            stop = end if end >= 0 else len(self.buf)
+            if sink is not None:
+                # JSON darf "/" als "\/" maskieren; base64 enthält keine Backslashes
+                piece = carry + self.buf[self.pos:stop].replace("\\", "")
+                usable = len(piece) // 4 * 4
+                if usable:
+                    sink.write(base64.b64decode(piece[:usable]))
+                carry = piece[usable:]
+            if end >= 0:
+                self.pos = end + 1
+                break
+            self.pos = stop
+            if not self.fill():
+                raise ValueError("Unerwartetes Dateiende in UIN Capsule")
+        if carry:
+            sink.write(base64.b64decode(carry))
+
+
+def read_v1_stream(path: str, edges_sink=None,
+                   chunk_size: int = STREAM_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Liest eine v1-Capsule inkrementell.
+
+    Das "edges"-Feld wird blockweise base64-dekodiert in edges_sink
+    geschrieben (oder ohne Dekodierung übersprungen, wenn edges_sink None
+    ist); der base64-String wird nie vollständig im Speicher gehalten.
+
+    Returns:
+        Dokument ohne "edges"
+    """
+    document = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        scanner = _JSONStreamScanner(f, chunk_size)
+        scanner.expect('{')
+        if scanner.peek() == '}':
+            return document
+        while True:
+            key = scanner.value()
+            scanner.expect(':')
+            if key == 'edges' and scanner.peek() == '"':
+                scanner.stream_base64(edges_sink)
+            else:
+                document[key] = scanner.value()
+            delimiter = scanner.peek()
+            scanner.pos += 1
+            if delimiter == '}':
+                return document
+            if delimiter != ',':
+                raise ValueError("Ungültige UIN Capsule: ',' oder '}' erwartet")
+
+
+def load_any(path: str) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Lädt v1- oder v2-Capsules einheitlich.
+
+    Returns:
+        (Dokument ohne "edges", rohe Kantendaten)
+    """
+    if is_v2(path):
+        return read_document(path), bytes(read_edges(path))
+
+    sink = io.BytesIO()
+    document = read_v1_stream(path, sink)
+    return document, sink.getvalue()
+
+
+def convert_v1_to_v2(v1_path: str, v2_path: str,
+                     edges_encoding: str = edge_codec.PNG) -> str:
+    """
+    Konvertiert eine JSON/base64 Capsule in einen v2-Container.
+
+    Mit edges_encoding != "png" wird die Kantenkarte umkodiert; der Rückweg
+    nach v1 liefert dann eine pixelgleiche, aber neu kodierte PNG.
+    """
+    document, edges = load_any(v1_path)
+    document["v1_format"] = document.get("format", FORMAT_V1)
+    edges = edge_codec.transcode(edges, edge_codec.PNG, edges_encoding)
+    return write_capsule(v2_path, document, edges, edges_encoding)
+
+
+def convert_v2_to_v1(v2_path: str, v1_path: str) -> str:
+    """
+    Konvertiert einen v2-Container zurück in eine JSON/base64 Capsule.
+
+    v1 enthält immer PNG; andere Kanten-Kodierungen werden umkodiert.
+    """
+    document, edges = load_any(v2_path)
+    encoding = document.pop("edges_encoding", edge_codec.PNG)
+    edges = edge_codec.transcode(edges, encoding, edge_codec.PNG)
+    document["format"] = document.pop("v1_format", FORMAT_V1)
+
+    return write_v1_stream(v1_path, document, edges)
+
+
+class LazyCapsule:
+    """
+    Lazy geladene Capsule (v1 oder v2).
+
+    Attribute werden erst beim Zugriff geparst, die Kantenkarte erst beim
+    ersten Zugriff auf edges_array/edges_image dekodiert. bytes_read und
+    bytes_decoded zeigen, wie viel tatsächlich gelesen bzw. dekodiert wurde.
+    """
+
+    def __init__(self, path: str, use_mmap: bool = False):
+        self.path = path
+        self.use_mmap = use_mmap
+        self.bytes_read = 0
+        self.bytes_decoded = 0
+        self._v2 = None
+        self._document = None
+        self._edges_data = None
+        self._edges_array = None
+
+    @property
+    def is_v2(self) -> bool:
+        if self._v2 is None:
+            self._v2 = is_v2(self.path)
+        return self._v2
+
+    @property
+    def document(self) -> Dict[str, Any]:
+        """Capsule-Dokument ohne "edges" (v2: nur Header + JSON-Sektion gelesen)"""
+        if self._document is None:
+            if self.is_v2:
+                header = read_header(self.path)
+                self._document = read_document(self.path)
+                self.bytes_read += HEADER_SIZE + header.json_length
+            else:
+                # Kanten beim Scannen überspringen, nicht dekodieren
+                self._document = read_v1_stream(self.path)
+                self.bytes_read += os.path.getsize(self.path)
+        return self._document
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        return self.document.get('attributes', {})
+
+    @property
+    def edges_encoding(self) -> str:
+        if self.is_v2:
+            return self.document.get('edges_encoding', edge_codec.PNG)
+        return edge_codec.PNG
+
+    @property
+    def edges_data(self) -> Union[bytes, memoryview]:
+        """Kodierte Kantendaten (v1: base64-dekodiert, v2: direkt aus der Datei)"""
+        if self._edges_data is None:
+            if self.is_v2:
+                self._edges_data = read_edges(self.path, self.use_mmap)
+                self.bytes_read += len(self._edges_data)
+            else:
+                sink = io.BytesIO()
+                document = read_v1_stream(self.path, sink)
+                if self._document is None:
+                    self._document = document
+                self._edges_data = sink.getvalue()
+                self.bytes_read += os.path.getsize(self.path)
+                self.bytes_decoded += len(self._edges_data)
+        return self._edges_data
+
+    @property
+    def edges_shape(self) -> Tuple[int, int]:
+        """(Höhe, Breite) der Kantenkarte, ohne die Pixel zu dekodieren"""
+        if self._edges_array is not None:
+            return self._edges_array.shape[:2]
+        return edge_codec.peek_shape(self.edges_data, self.edges_encoding)
+
+    @property
+    def edges_array(self) -> np.ndarray:
+        """Kantenkarte als uint8-Array, beim ersten Zugriff dekodiert"""
+        if self._edges_array is None:
+            self._edges_array = edge_codec.decode_edges(self.edges_data, self.edges_encoding)
+            self.bytes_decoded += self._edges_array.nbytes
+        return self._edges_array
+
+    @property
+    def edges_image(self):
+        """Kantenkarte als PIL.Image"""
+        from PIL import Image
+        return Image.fromarray(self.edges_array)
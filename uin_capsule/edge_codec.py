@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Kanten-Codec für UIN Capsules
+
+Canny-Karten sind strikt binär (0/255). Statt sie als 8-Bit-PNG abzulegen,
+werden sie hier auf 1 Bit pro Pixel gepackt (np.packbits) und mit zlib
+komprimiert. Dekodieren ist vollständig vektorisiert und liefert direkt
+ein uint8-Array mit 0/255.
+
+Unterstützte Kodierungen:
+    "png"           8-Bit Graustufen-PNG (Kompatibilität, Standard in v1)
+    "png1"          1-Bit PNG (bilevel), von jedem Bildbetrachter lesbar
+    "packbits_zlib" Rohes Bitfeld + zlib, etwa so klein wie png1, aber
+                    um ein Vielfaches schneller (Standard für v2-Container)
+"""
+
+import io
+import struct
+import time
+import zlib
+from typing import Dict, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+PNG = "png"
+PNG_1BIT = "png1"
+PACKBITS_ZLIB = "packbits_zlib"
+
+ENCODINGS = (PNG, PNG_1BIT, PACKBITS_ZLIB)
+
+# Höhe, Breite des Bitfelds
+_PACKBITS_HEADER = struct.Struct("<II")
+
+
+def _to_gray(edges: np.ndarray) -> np.ndarray:
+    """Reduziert mehrkanalige Kantenbilder auf einen Kanal"""
+    if edges.ndim == 3:
+        edges = edges[:, :, 0]
+    return edges
+
+
+def encode_edges(edges: np.ndarray, encoding: str = PACKBITS_ZLIB,
+                 level: int = 6) -> bytes:
+    """
+    Kodiert eine Kantenkarte.
+
+    Args:
+        edges: uint8-Array (Werte > 127 gelten bei Bit-Kodierungen als gesetzt)
+        encoding: Eine der ENCODINGS
+        level: zlib-Kompressionsstufe für packbits_zlib
+    """
+    edges = _to_gray(edges)
+
+    if encoding == PACKBITS_ZLIB:
+        height, width = edges.shape
+        bits = np.packbits(edges > 127, axis=None)
+        return _PACKBITS_HEADER.pack(height, width) + zlib.compress(bits.tobytes(), level)
+
+    buffered = io.BytesIO()
+    if encoding == PNG_1BIT:
+        Image.fromarray(edges > 127).save(buffered, format="PNG", optimize=True)
+    elif encoding == PNG:
+        Image.fromarray(edges).save(buffered, format="PNG", optimize=True)
+    else:
+        raise ValueError(f"Unbekannte Kanten-Kodierung: {encoding}")
+    return buffered.getvalue()
+
+
+def decode_edges(data: Union[bytes, memoryview], encoding: str = PACKBITS_ZLIB) -> np.ndarray:
+    """
+    Dekodiert Kantendaten zu einem uint8-Array (Höhe x Breite).
+
+    Bit-Kodierungen liefern 0/255; "png" liefert die gespeicherten Grauwerte.
+    """
+    if encoding == PACKBITS_ZLIB:
+        height, width = _PACKBITS_HEADER.unpack_from(data, 0)
+        raw = zlib.decompress(data[_PACKBITS_HEADER.size:])
+        bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), count=height * width)
+        # 0/1 -> 0/255, bleibt uint8
+        return (bits * np.uint8(255)).reshape(height, width)
+
+    if encoding in (PNG, PNG_1BIT):
+        img = Image.open(io.BytesIO(bytes(data)))
+        if img.mode == "1":
+            return np.asarray(img, dtype=np.uint8) * 255
+        return np.asarray(img if img.mode == "L" else img.convert("L"))
+
+    raise ValueError(f"Unbekannte Kanten-Kodierung: {encoding}")
+
+
+def peek_shape(data: Union[bytes, memoryview], encoding: str = PACKBITS_ZLIB) -> Tuple[int, int]:
+    """Liest (Höhe, Breite) aus dem Header der Kantendaten, ohne Pixel zu dekodieren"""
+    if encoding == PACKBITS_ZLIB:
+        return _PACKBITS_HEADER.unpack_from(data, 0)
+    if encoding in (PNG, PNG_1BIT):
+        # PIL liest beim Öffnen nur den Header
+        width, height = Image.open(io.BytesIO(bytes(data))).size
+        return height, width
+    raise ValueError(f"Unbekannte Kanten-Kodierung: {encoding}")
+
+
+def transcode(data: bytes, source: str, target: str) -> bytes:
+    """Wandelt Kantendaten zwischen zwei Kodierungen um"""
+    if source == target:
+        return data
+    return encode_edges(decode_edges(data, source), target)
+
+
+def benchmark(edges: np.ndarray, repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Vergleicht Größe sowie Kodier-/Dekodierzeit aller Kodierungen.
+
+    Returns:
+        {Kodierung: {"bytes", "encode_ms", "decode_ms"}}
+    """
+    report = {}
+    for encoding in ENCODINGS:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            data = encode_edges(edges, encoding)
+        encode_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decode_edges(data, encoding)
+        decode_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        report[encoding] = {"bytes": len(data), "encode_ms": encode_ms, "decode_ms": decode_ms}
+    return report
+
+
+def main():
+    import argparse
+    import cv2
+
+    parser = argparse.ArgumentParser(description='Vergleicht Kanten-Kodierungen für UIN Capsules')
+    parser.add_argument('image', help='Eingabebild (wird per Canny in Kanten umgewandelt)')
+    parser.add_argument('--low', type=int, default=100, help='Unterer Canny-Threshold')
+    parser.add_argument('--high', type=int, default=200, help='Oberer Canny-Threshold')
+    parser.add_argument('--repeat', type=int, default=5, help='Wiederholungen pro Messung')
+    args = parser.parse_args()
+
+    gray = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise SystemExit(f"Konnte Bild nicht laden: {args.image}")
+    edges = cv2.Canny(gray, args.low, args.high)
+
+    report = benchmark(edges, args.repeat)
+    baseline = report[PNG]["bytes"]
+    print(f"📐 Kantenkarte: {edges.shape[1]}x{edges.shape[0]}")
+    for encoding, r in report.items():
+        print(f"   {encoding:14s} {r['bytes']:>10,} Bytes ({r['bytes'] / baseline:6.1%})  "
+              f"encode {r['encode_ms']:8.1f} ms  decode {r['decode_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,42 +10,76 @@ from PIL import Image
 import os
 from typing import Dict, Any, Tuple
 import tempfile
+import numpy as np
+
+try:
+    import capsule_format
+    import edge_codec
+except ImportError:
+    from . import capsule_format, edge_codec
 
 class UINCapsule:
     """Handles UIN Capsule format for Stable Diffusion integration"""
     
+    @staticmethod
+    def open(capsule_path: str, use_mmap: bool = False) -> capsule_format.LazyCapsule:
+        """Öffnet UIN Capsule lazy (Attribute/Kanten werden erst beim Zugriff gelesen)"""
+        return capsule_format.LazyCapsule(capsule_path, use_mmap)
+    
+    @staticmethod
+    def load_attributes(capsule_path: str) -> Dict[str, Any]:
+        """Lädt nur die Attribute, ohne die Kantenkarte zu dekodieren"""
+        return UINCapsule.open(capsule_path).attributes
+    
     @staticmethod
     def load(capsule_path: str) -> Tuple[Dict[str, Any], Image.Image]:
-        """Lädt UIN Capsule"""
-        with open(capsule_path, 'r') as f:
-            capsule = json.load(f)
+        """Lädt UIN Capsule (v1 JSON/base64 oder v2 Binärcontainer)"""
+        if capsule_format.is_v2(capsule_path):
+            document = capsule_format.read_document(capsule_path)
+            edges_array = edge_codec.decode_edges(
+                capsule_format.read_edges(capsule_path),
+                document.get('edges_encoding', edge_codec.PNG)
+            )
+            return document.get('attributes', {}), Image.fromarray(edges_array)
         
-        # Base64 Edges dekodieren
-        edges_b64 = capsule.get('edges', '')
-        edges_data = base64.b64decode(edges_b64)
-        edges_img = Image.open(io.BytesIO(edges_data))
+        # Base64 Edges blockweise dekodieren (ohne den String komplett zu halten)
+        edges_data = io.BytesIO()
+        capsule = capsule_format.read_v1_stream(capsule_path, edges_data)
+        edges_data.seek(0)
+        edges_img = Image.open(edges_data)
         
         return capsule.get('attributes', {}), edges_img
     
     @staticmethod
     def save(attributes: Dict[str, Any], edges_image: Image.Image, 
-            output_path: str) -> str:
-        """Speichert UIN Capsule"""
-        # Edges zu base64
+            output_path: str, container: str = capsule_format.FORMAT_V1,
+            edges_encoding: str = edge_codec.PACKBITS_ZLIB) -> str:
+        """
+        Speichert UIN Capsule
+        
+        container: capsule_format.FORMAT_V1 (JSON mit base64) oder
+            capsule_format.FORMAT_V2 (Binärcontainer, Kanten ohne base64)
+        edges_encoding: Kanten-Kodierung im v2-Container (siehe edge_codec)
+        """
+        if container == capsule_format.FORMAT_V2:
+            edges_data = edge_codec.encode_edges(
+                np.asarray(edges_image.convert("L")), edges_encoding
+            )
+            return capsule_format.write_capsule(
+                output_path, {"attributes": attributes}, edges_data, edges_encoding
+            )
+        
         buffered = io.BytesIO()
         edges_image.save(buffered, format="PNG", optimize=True)
-        edges_b64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
         
         capsule = {
             "format": "uin-capsule-v1",
-            "edges": edges_b64,
+            "edges": None,
             "attributes": attributes
         }
         
-        with open(output_path, 'w') as f:
-            json.dump(capsule, f, indent=2)
-        
-        return output_path
+        # Edges blockweise als base64 direkt aus dem Encoder-Puffer schreiben
+        return capsule_format.write_v1_stream(output_path, capsule, buffered.getbuffer())
     
     @staticmethod
     def create_sd_webui_config(capsule_path: str) -> Dict[str, Any]:
@@ -91,7 +125,7 @@ class UINCapsule:
     @staticmethod
     def create_comfyui_workflow(capsule_path: str) -> Dict[str, Any]:
         """Erstellt ComfyUI Workflow aus UIN Capsule"""
-        attributes, _ = UINCapsule.load(capsule_path)
+        attributes = UINCapsule.load_attributes(capsule_path)
         
         # Einfacher ComfyUI Workflow
         workflow = {
@@ -0,0 +1 @@
+"""UIN Utilities: Kantenextraktion, Edge-Cache, Farbpaletten und gemeinsames Dekodieren"""
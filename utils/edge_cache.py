@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+UIN Edge Cache
+Inhaltsadressierter Festplatten-Cache für Kantenextraktionen.
+
+Der Schlüssel besteht aus dem Hash der Bilddatei, allen Parametern der
+Extraktion (Thresholds, Blur, Auflösung, ...) und CACHE_VERSION. Einträge
+werden bei Überschreiten von max_bytes nach LRU (Zugriffszeit) verdrängt.
+Mehrere Prozesse können dasselbe Verzeichnis nutzen; Einträge werden
+atomar geschrieben.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+# Erhöhen, wenn sich die Extraktion ändert -> alte Einträge werden ignoriert
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(path):
+    """Inhalts-Hash einer Datei (blake2b, blockweise gelesen)"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EdgeCache:
+    """
+    Festplatten-Cache für Kantenkarten samt Metadaten.
+
+    Einträge enthalten die Kantenkarte (bit-gepackt), ein JSON-Dokument mit
+    Metadaten und optional eine bereits kodierte Nutzlast (z.B. PNG/base64),
+    damit auch das Kodieren bei einem Treffer entfällt.
+    """
+
+    def __init__(self, cache_dir="./.uin_cache", max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._total_bytes = None
+
+    def make_key(self, image_path, params, image_hash=None):
+        """
+        Erzeugt den Cache-Schlüssel für ein Bild und seine Extraktionsparameter.
+
+        Args:
+            image_path: Pfad zum Quellbild (Inhalt wird gehasht)
+            params: Dictionary mit allen Parametern, die das Ergebnis beeinflussen
+            image_hash: Bereits berechneter hash_file(image_path) für mehrere
+                Schlüssel desselben Bildes
+        """
+        material = json.dumps(
+            {"image": image_hash or hash_file(image_path), "params": params,
+             "version": CACHE_VERSION},
+            sort_keys=True
+        )
+        return hashlib.blake2b(material.encode('utf-8'), digest_size=20).hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.npz"
+
+    def get(self, key):
+        """
+        Liefert (edges, meta, payload) oder None bei einem Fehlschlag.
+
+        payload ist None, falls beim Speichern keine Nutzlast angegeben wurde.
+        """
+        path = self._entry_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                height, width = entry["shape"]
+                bits = np.unpackbits(entry["bits"], count=int(height) * int(width))
+                edges = (bits * np.uint8(255)).reshape(int(height), int(width))
+                meta = json.loads(str(entry["meta"]))
+                payload = entry["payload"].tobytes() if entry["has_payload"] else None
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            self.misses += 1
+            return None
+
+        # Zugriffszeit für LRU aktualisieren
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return edges, meta, payload
+
+    def put(self, key, edges, meta, payload=None):
+        """
+        Speichert eine Kantenkarte (Werte > 127 gelten als Kante).
+
+        Args:
+            key: Schlüssel aus make_key
+            edges: uint8-Kantenkarte (Höhe x Breite)
+            meta: JSON-serialisierbares Dictionary (z.B. Statistiken, Attribute)
+            payload: Optional bereits kodierte Daten (bytes oder str)
+        """
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+
+        # Überschreiben: alte Größe nicht doppelt zählen
+        try:
+            old_size = path.stat().st_size
+        except OSError:
+            old_size = 0
+
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    shape=np.array(edges.shape[:2], dtype=np.int64),
+                    bits=np.packbits(edges > 127, axis=None),
+                    meta=np.array(json.dumps(meta)),
+                    payload=np.frombuffer(payload or b"", dtype=np.uint8),
+                    has_payload=np.array(payload is not None)
+                )
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+        if self._total_bytes is not None:
+            self._total_bytes += path.stat().st_size - old_size
+        self._evict_if_needed()
+
+    def _entries(self):
+        entries = []
+        for path in self.cache_dir.glob("*/*.npz"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict_if_needed(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        # Neu scannen (andere Prozesse schreiben evtl. mit) und älteste löschen
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def stats(self):
+        """Treffer-/Fehlschlag-Statistik und aktuelle Größe"""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes
+        }
+
+    def clear(self):
+        """Entfernt alle Einträge"""
+        for _, _, path in self._entries():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        self._total_bytes = 0
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="UIN Edge Cache verwalten")
+    parser.add_argument("cache_dir", help="Cache-Verzeichnis")
+    parser.add_argument("--clear", action="store_true", help="Alle Einträge löschen")
+    args = parser.parse_args()
+
+    cache = EdgeCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+        print(f"🗑️ Cache geleert: {args.cache_dir}")
+    stats = cache.stats()
+    print(f"📦 Cache: {args.cache_dir}")
+    print(f"   Einträge: {stats['entries']:,}")
+    print(f"   Größe: {stats['size_bytes'] / 1024 / 1024:.1f} MB "
+          f"(max {stats['max_bytes'] / 1024 / 1024:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,40 +8,73 @@ import cv2
 import numpy as np
 import json
 import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
 from pathlib import Path
 from PIL import Image
 
-def extract_canny_edges(image_path, low_threshold=100, high_threshold=200):
+try:
+    from edge_cache import EdgeCache, DEFAULT_MAX_BYTES, hash_file
+    from image_decode import decode_image
+    import palette
+except ImportError:
+    from .edge_cache import EdgeCache, DEFAULT_MAX_BYTES, hash_file
+    from .image_decode import decode_image
+    from . import palette
+
+PIPELINE_STAGES = ("cache", "decode", "gray", "canny", "encode", "palette", "preview", "json")
+
+# Anzahl der Palettenfarben im UIN-Paket
+PACKAGE_PALETTE_SIZE = 5
+
+@contextmanager
+def _timed_stage(timings, name):
+    """Misst die Laufzeit einer Pipeline-Stufe in Millisekunden"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def edges_from_array(img, low_threshold=100, high_threshold=200, timings=None,
+                     original_size=None):
     """
-    Extrahiert Canny-Kanten aus einem Bild.
+    Berechnet Canny-Kanten aus einem bereits dekodierten Bild.
     
     Args:
-        image_path: Pfad zum Eingabebild
+        img: BGR- oder Graustufen-Array
         low_threshold: Unterer Threshold für Canny
         high_threshold: Oberer Threshold für Canny
+        timings: Optionales Dictionary für Stufen-Zeiten (gray, canny)
+        original_size: (Breite, Höhe) des Originals, falls img verkleinert dekodiert wurde
         
     Returns:
         edges: Numpy-Array mit den Kanten (0=keine Kante, 255=Kante)
         stats: Dictionary mit Statistiken
     """
-    # Bild laden und in Graustufen konvertieren
-    img = cv2.imread(str(image_path))
-    if img is None:
-        raise ValueError(f"Konnte Bild nicht laden: {image_path}")
+    timings = {} if timings is None else timings
     
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    with _timed_stage(timings, "gray"):
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     
     # Canny Edge Detection anwenden
-    edges = cv2.Canny(gray, low_threshold, high_threshold)
+    with _timed_stage(timings, "canny"):
+        edges = cv2.Canny(gray, low_threshold, high_threshold)
+        edge_pixels = cv2.countNonZero(edges)
     
     # Statistiken berechnen
-    height, width = img.shape[:2]
-    edge_pixels = np.sum(edges > 0)
+    height, width = edges.shape[:2]
     total_pixels = width * height
     edge_density = edge_pixels / total_pixels
+    orig_width, orig_height = original_size or (width, height)
     
     stats = {
-        "original_dimensions": {"width": width, "height": height},
+        "original_dimensions": {"width": orig_width, "height": orig_height},
+        "edge_dimensions": {"width": width, "height": height},
         "edge_pixel_count": int(edge_pixels),
         "edge_density": float(edge_density),
         "edge_percentage": float(edge_density * 100),
@@ -50,19 +83,81 @@ def extract_canny_edges(image_path, low_threshold=100, high_threshold=200):
     
     return edges, stats
 
-def create_uin_package(image_path, output_dir, low_thresh=100, high_thresh=200):
+def _cache_params(low_threshold, high_threshold, target_resolution, op="canny"):
+    """
+    Alle Parameter, die das Ergebnis der Kantenextraktion beeinflussen.
+    
+    op trennt die Eintragsarten, die unterschiedliche Nutzlasten tragen:
+    canny (nur Kanten), canny_png (Kanten + kodierte PNG, Statistiken und
+    Palette als Meta) und canny_preview (Kanten + Vorschau-JPEG).
+    """
+    return {
+        "op": op,
+        "low": low_threshold,
+        "high": high_threshold,
+        "blur": None,
+        "target_resolution": target_resolution
+    }
+
+def extract_canny_edges(image_path, low_threshold=100, high_threshold=200,
+                        target_resolution=None, cache=None):
+    """
+    Extrahiert Canny-Kanten aus einem Bild.
+    
+    Args:
+        image_path: Pfad zum Eingabebild
+        low_threshold: Unterer Threshold für Canny
+        high_threshold: Oberer Threshold für Canny
+        target_resolution: Mindestlänge der langen Seite; das Bild wird dann
+            verkleinert direkt als Graustufenbild dekodiert (z.B. 512 oder 1024)
+        cache: Optionaler EdgeCache; bei einem Treffer entfällt die Extraktion
+        
+    Returns:
+        edges: Numpy-Array mit den Kanten (0=keine Kante, 255=Kante)
+        stats: Dictionary mit Statistiken
+    """
+    if cache is not None:
+        key = cache.make_key(image_path, _cache_params(low_threshold, high_threshold,
+                                                       target_resolution))
+        cached = cache.get(key)
+        if cached is not None:
+            edges, stats, _ = cached
+            return edges, stats
+    
+    img, original_size = decode_image(image_path, target_resolution, grayscale=True)
+    edges, stats = edges_from_array(img, low_threshold, high_threshold,
+                                    original_size=original_size)
+    
+    if cache is not None:
+        cache.put(key, edges, stats)
+    return edges, stats
+
+def create_uin_package(image_path, output_dir, low_thresh=100, high_thresh=200,
+                       target_resolution=None, cache=None, preview=True):
     """
     Erstellt ein komplettes UIN-Paket aus einem Bild.
     
+    Das Quellbild wird genau einmal dekodiert und die Dateigrößen werden
+    einmal ermittelt; alle Stufen (decode, gray, canny, encode, preview,
+    json) arbeiten auf denselben Daten und werden einzeln gemessen.
+    
     Args:
         image_path: Pfad zum Eingabebild
         output_dir: Ausgabeverzeichnis
         low_thresh: Unterer Canny-Threshold
         high_thresh: Oberer Canny-Threshold
+        target_resolution: Mindestlänge der langen Seite für verkleinertes Dekodieren
+        cache: Optionaler EdgeCache; ein Treffer liefert Kanten, Statistiken,
+            Palette und fertig kodierte PNG (und die Vorschau), sodass ohne
+            Dekodieren nur noch geschrieben wird
+        preview: Vorschau-Bild erzeugen
         
     Returns:
-        Dictionary mit Pfaden zu den generierten Dateien
+        Dictionary mit Pfaden zu den generierten Dateien, Statistiken,
+        Stufen-Zeiten in Millisekunden ("timings") und "cache_hit"
     """
+    timings = {}
+    
     # Ausgabeverzeichnis erstellen
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
@@ -70,67 +165,126 @@ def create_uin_package(image_path, output_dir, low_thresh=100, high_thresh=200):
     # Basisnamen für Dateien
     base_name = Path(image_path).stem
     
-    # 1. Kanten extrahieren
-    edges, stats = extract_canny_edges(image_path, low_thresh, high_thresh)
+    # 0. Cache-Lookup (Kanten, Statistiken, Palette und kodierte PNG; Vorschau separat)
+    cached = preview_jpg = None
+    if cache is not None:
+        with _timed_stage(timings, "cache"):
+            image_hash = hash_file(image_path)
+            params = _cache_params(low_thresh, high_thresh, target_resolution, "canny_png")
+            params["palette"] = palette.PALETTE_VERSION
+            key = cache.make_key(image_path, params, image_hash)
+            cached = cache.get(key)
+            if preview:
+                preview_key = cache.make_key(image_path,
+                                             _cache_params(low_thresh, high_thresh,
+                                                           target_resolution, "canny_preview"),
+                                             image_hash)
+                if cached is not None:
+                    preview_cached = cache.get(preview_key)
+                    preview_jpg = preview_cached[2] if preview_cached else None
+    
+    # 1. Bild höchstens einmal dekodieren, Dateigröße einmalig bestimmen
+    img_original = None
+    with _timed_stage(timings, "decode"):
+        original_bytes = Path(image_path).stat().st_size
+        if cached is None or (preview and preview_jpg is None):
+            img_original, original_size = decode_image(image_path, target_resolution)
+    
+    if cached is None:
+        # 2. Kanten extrahieren (gray + canny)
+        edges, stats = edges_from_array(img_original, low_thresh, high_thresh, timings,
+                                        original_size=original_size)
+        
+        # 3. Kantenbild kodieren (Größe aus dem Puffer)
+        with _timed_stage(timings, "encode"):
+            ok, edge_png = cv2.imencode(".png", edges)
+            if not ok:
+                raise ValueError(f"Konnte Kantenbild nicht kodieren: {image_path}")
+            edge_png = edge_png.tobytes()
+        
+        # 4. Farbpalette des Originals (wie reverse_uin: fast weiß zählt nicht)
+        with _timed_stage(timings, "palette"):
+            entries = palette.extract_palette(img_original, PACKAGE_PALETTE_SIZE,
+                                              bgr=img_original.ndim == 3, skip_white=True)
+            colors = [palette.to_hex(entry["color"]) for entry in entries]
+        
+        if cache is not None:
+            cache.put(key, edges, {"statistics": stats, "colors": colors}, edge_png)
+    else:
+        edges, meta, edge_png = cached
+        stats, colors = meta["statistics"], meta["colors"]
     
-    # 2. Kantenbild speichern
     edge_path = output_path / f"{base_name}_edges.png"
-    cv2.imwrite(str(edge_path), edges)
-    
-    # 3. Vorschau-Bild erstellen (Original + Kanten)
-    img_original = cv2.imread(str(image_path))
-    preview = np.hstack([img_original, cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)])
-    preview_path = output_path / f"{base_name}_preview.jpg"
-    cv2.imwrite(str(preview_path), preview)
-    
-    # 4. UIN-JSON mit extrahierten Attributen erstellen
-    uin_data = {
-        "version": "0.6",
-        "metadata": {
-            "source_image": str(image_path),
-            "extraction_method": "canny_edge_detection",
-            "extraction_timestamp": np.datetime64('now').astype(str),
-            "statistics": stats
-        },
-        "edge_reference": {
-            "file_name": edge_path.name,
-            "canny_thresholds": {"low": low_thresh, "high": high_thresh},
-            "recommended_use": "controlnet_canny_input"
-        },
-        "canvas": {
-            "aspect_ratio": f"{stats['original_dimensions']['width']}:{stats['original_dimensions']['height']}",
-            "bounds": {
-                "x": [-stats['original_dimensions']['width']/100, stats['original_dimensions']['width']/100],
-                "y": [-stats['original_dimensions']['height']/100, stats['original_dimensions']['height']/100],
-                "z": [-1, 3]
-            }
-        },
-        "suggested_objects": [
-            {
-                "id": "main_subject_1",
-                "type": "detected_subject",
-                "note": "Passen Sie diese Attribute basierend auf Ihrem Bild an",
-                "position": {"x": 0, "y": 0, "z": 0, "anchor": "center"},
-                "suggested_attributes": {
-                    "detail_level": "high" if stats['edge_density'] > 0.1 else "medium",
-                    "lighting_suggestion": "balanced studio lighting",
-                    "style_suggestion": "photorealistic"
+    edge_path.write_bytes(edge_png)
+    edge_size = len(edge_png)
+    
+    # 5. Vorschau-Bild erstellen (Original + Kanten)
+    preview_path = None
+    if preview:
+        with _timed_stage(timings, "preview"):
+            if preview_jpg is None:
+                edges_bgr = edges if img_original.ndim == 2 else cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+                ok, preview_jpg = cv2.imencode(".jpg", np.hstack([img_original, edges_bgr]))
+                if not ok:
+                    raise ValueError(f"Konnte Vorschau nicht kodieren: {image_path}")
+                preview_jpg = preview_jpg.tobytes()
+                if cache is not None:
+                    cache.put(preview_key, edges, stats, preview_jpg)
+            preview_path = output_path / f"{base_name}_preview.jpg"
+            preview_path.write_bytes(preview_jpg)
+    
+    # 6. UIN-JSON mit extrahierten Attributen erstellen und speichern
+    with _timed_stage(timings, "json"):
+        uin_data = {
+            "version": "0.6",
+            "metadata": {
+                "source_image": str(image_path),
+                "extraction_method": "canny_edge_detection",
+                "extraction_timestamp": np.datetime64('now').astype(str),
+                "statistics": stats
+            },
+            "edge_reference": {
+                "file_name": edge_path.name,
+                "canny_thresholds": {"low": low_thresh, "high": high_thresh},
+                "recommended_use": "controlnet_canny_input"
+            },
+            "canvas": {
+                "aspect_ratio": f"{stats['original_dimensions']['width']}:{stats['original_dimensions']['height']}",
+                "bounds": {
+                    "x": [-stats['original_dimensions']['width']/100, stats['original_dimensions']['width']/100],
+                    "y": [-stats['original_dimensions']['height']/100, stats['original_dimensions']['height']/100],
+                    "z": [-1, 3]
                 }
+            },
+            "colors": colors,
+            "suggested_objects": [
+                {
+                    "id": "main_subject_1",
+                    "type": "detected_subject",
+                    "note": "Passen Sie diese Attribute basierend auf Ihrem Bild an",
+                    "position": {"x": 0, "y": 0, "z": 0, "anchor": "center"},
+                    "suggested_attributes": {
+                        "detail_level": "high" if stats['edge_density'] > 0.1 else "medium",
+                        "lighting_suggestion": "balanced studio lighting",
+                        "style_suggestion": "photorealistic"
+                    }
+                }
+            ],
+            "compression_info": {
+                "original_size_kb": original_bytes / 1024,
+                "edge_image_size_kb": edge_size / 1024,
+                "compression_ratio": ">95%" if edge_size < original_bytes * 0.05 else ">90%"
             }
-        ],
-        "compression_info": {
-            "original_size_kb": Path(image_path).stat().st_size / 1024,
-            "edge_image_size_kb": edge_path.stat().st_size / 1024,
-            "compression_ratio": ">95%" if edge_path.stat().st_size < Path(image_path).stat().st_size * 0.05 else ">90%"
         }
-    }
-    
-    # 5. UIN-JSON speichern
-    json_path = output_path / f"{base_name}_attributes.uin.json"
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(uin_data, f, indent=2, ensure_ascii=False)
+        
+        json_path = output_path / f"{base_name}_attributes.uin.json"
+        json_bytes = json.dumps(uin_data, indent=2, ensure_ascii=False).encode('utf-8')
+        json_path.write_bytes(json_bytes)
+        json_size = len(json_bytes)
     
-    # 6. README für das Paket erstellen
+    # 7. README für das Paket erstellen
+    preview_line = (f"3. `{preview_path.name}` - Vorschau (Original + Kanten)\n"
+                    if preview_path else "")
     readme_content = f"""# UIN Kompaktpaket: {base_name}
 
 ## Generiert am: {uin_data['metadata']['extraction_timestamp']}
@@ -138,8 +292,7 @@ def create_uin_package(image_path, output_dir, low_thresh=100, high_thresh=200):
 ### Enthaltene Dateien:
 1. `{edge_path.name}` - Extrahierte Canny-Kanten (ControlNet-ready)
 2. `{json_path.name}` - UIN-Attribute im JSON-Format
-3. `{preview_path.name}` - Vorschau (Original + Kanten)
-
+{preview_line}
 ### Nutzung:
 1. **Für KI-Generierung**:
    - Laden Sie `{edge_path.name}` in ControlNet (Canny-Modell)
@@ -148,7 +301,7 @@ def create_uin_package(image_path, output_dir, low_thresh=100, high_thresh=200):
 
 2. **Für Kompression**:
    - Original: {uin_data['compression_info']['original_size_kb']:.1f} KB
-   - UIN-Paket: {uin_data['compression_info']['edge_image_size_kb'] + json_path.stat().st_size/1024:.1f} KB
+   - UIN-Paket: {uin_data['compression_info']['edge_image_size_kb'] + json_size/1024:.1f} KB
    - Kompression: {uin_data['compression_info']['compression_ratio']}
 
 ### Statistiken:
@@ -167,12 +320,61 @@ def create_uin_package(image_path, output_dir, low_thresh=100, high_thresh=200):
     return {
         "edge_image": str(edge_path),
         "uin_json": str(json_path),
-        "preview": str(preview_path),
+        "preview": str(preview_path) if preview_path else None,
         "readme": str(readme_path),
-        "stats": stats
+        "stats": stats,
+        "timings": timings,
+        "cache_hit": cached is not None
     }
 
-def batch_process_directory(input_dir, output_base_dir, low_thresh=100, high_thresh=200):
+_WORKER_CACHES = {}
+
+def _get_cache(cache_dir, max_bytes):
+    """Ein EdgeCache pro Prozess und Verzeichnis (auch in Worker-Prozessen)"""
+    if not cache_dir:
+        return None
+    if cache_dir not in _WORKER_CACHES:
+        _WORKER_CACHES[cache_dir] = EdgeCache(cache_dir, max_bytes)
+    return _WORKER_CACHES[cache_dir]
+
+def _process_single_image(img_file, output_dir, low_thresh, high_thresh,
+                          target_resolution=None, cache_dir=None,
+                          cache_max_bytes=DEFAULT_MAX_BYTES, preview=True):
+    """
+    Verarbeitet ein einzelnes Bild isoliert (auch in Worker-Prozessen).
+    
+    Fehler werden abgefangen und als Ergebnis zurückgegeben, damit ein
+    defektes Bild den restlichen Batch nicht abbricht.
+    
+    Returns:
+        Tuple aus (Ergebnis-Dictionary, Latenz in Sekunden)
+    """
+    start = time.perf_counter()
+    try:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        result = create_uin_package(img_file, output_dir, low_thresh, high_thresh,
+                                    target_resolution,
+                                    cache=_get_cache(cache_dir, cache_max_bytes),
+                                    preview=preview)
+    except Exception as e:
+        result = {"source_image": str(img_file), "error": str(e)}
+    return result, time.perf_counter() - start
+
+def _init_worker():
+    """Begrenzt OpenCV pro Worker auf einen Thread (keine Überbuchung der Kerne)"""
+    cv2.setNumThreads(1)
+
+def _percentile(values, pct):
+    """Perzentil (nearest-rank) einer Liste von Messwerten"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def batch_process_directory(input_dir, output_base_dir, low_thresh=100, high_thresh=200,
+                            workers=1, target_resolution=None, cache_dir=None,
+                            cache_max_bytes=DEFAULT_MAX_BYTES, preview=True):
     """
     Verarbeitet alle Bilder in einem Verzeichnis.
     
@@ -181,33 +383,70 @@ def batch_process_directory(input_dir, output_base_dir, low_thresh=100, high_thr
         output_base_dir: Basis-Ausgabeverzeichnis
         low_thresh: Unterer Canny-Threshold
         high_thresh: Oberer Canny-Threshold
+        workers: Anzahl paralleler Prozesse (1 = sequentiell im aktuellen Prozess)
+        target_resolution: Mindestlänge der langen Seite für verkleinertes Dekodieren
+        cache_dir: Verzeichnis eines gemeinsamen EdgeCache (None = ohne Cache)
+        cache_max_bytes: Maximale Cache-Größe in Bytes
+        preview: Vorschau-Bilder erzeugen
     """
     input_path = Path(input_dir)
     output_base = Path(output_base_dir)
+    output_base.mkdir(parents=True, exist_ok=True)
     
     supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']
     
+    # Sortiert, damit die Ergebnisreihenfolge reproduzierbar ist
+    image_files = sorted(
+        f for f in input_path.iterdir() if f.suffix.lower() in supported_formats
+    )
+    jobs = [(f, output_base / f.stem) for f in image_files]
+    
     results = []
+    latencies = []
+    batch_start = time.perf_counter()
     
-    for img_file in input_path.iterdir():
-        if img_file.suffix.lower() in supported_formats:
-            print(f"Verarbeite: {img_file.name}")
-            
-            # Einzelausgabeverzeichnis für jedes Bild
-            output_dir = output_base / img_file.stem
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            try:
-                result = create_uin_package(
-                    img_file, 
-                    output_dir, 
-                    low_thresh, 
-                    high_thresh
-                )
+    if workers > 1:
+        print(f"Starte {workers} Worker-Prozesse für {len(jobs)} Bilder...")
+        # Chunks reduzieren den IPC-Overhead bei sehr vielen kleinen Bildern
+        chunksize = max(1, len(jobs) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker) as executor:
+            # executor.map liefert die Ergebnisse in Eingabereihenfolge
+            outcomes = executor.map(
+                _process_single_image,
+                [f for f, _ in jobs],
+                [d for _, d in jobs],
+                repeat(low_thresh),
+                repeat(high_thresh),
+                repeat(target_resolution),
+                repeat(cache_dir),
+                repeat(cache_max_bytes),
+                repeat(preview),
+                chunksize=chunksize
+            )
+            for (img_file, output_dir), (result, latency) in zip(jobs, outcomes):
                 results.append(result)
-                print(f"  ✓ Paket erstellt in: {output_dir}")
-            except Exception as e:
-                print(f"  ✗ Fehler bei {img_file.name}: {e}")
+                latencies.append(latency)
+                _report_result(img_file, output_dir, result)
+    else:
+        for img_file, output_dir in jobs:
+            print(f"Verarbeite: {img_file.name}")
+            result, latency = _process_single_image(
+                img_file, output_dir, low_thresh, high_thresh, target_resolution,
+                cache_dir, cache_max_bytes, preview
+            )
+            results.append(result)
+            latencies.append(latency)
+            _report_result(img_file, output_dir, result)
+    
+    elapsed = time.perf_counter() - batch_start
+    
+    # Mittlere Zeit pro Pipeline-Stufe über alle erfolgreichen Bilder
+    timed = [r["timings"] for r in results if "timings" in r]
+    stage_means = {
+        stage: sum(t.get(stage, 0.0) for t in timed) / len(timed)
+        for stage in PIPELINE_STAGES if any(stage in t for t in timed)
+    }
     
     # Zusammenfassung erstellen
     summary = {
@@ -215,6 +454,15 @@ def batch_process_directory(input_dir, output_base_dir, low_thresh=100, high_thr
         "successful": len([r for r in results if "edge_image" in r]),
         "failed": len([r for r in results if "edge_image" not in r]),
         "total_compression_saving": 0,
+        "performance": {
+            "workers": workers,
+            "elapsed_seconds": elapsed,
+            "images_per_second": len(results) / elapsed if elapsed > 0 else 0.0,
+            "latency_p50_ms": _percentile(latencies, 50) * 1000,
+            "latency_p95_ms": _percentile(latencies, 95) * 1000,
+            "stage_mean_ms": stage_means,
+            "cache_hits": len([r for r in results if r.get("cache_hit")])
+        },
         "results": results
     }
     
@@ -222,9 +470,30 @@ def batch_process_directory(input_dir, output_base_dir, low_thresh=100, high_thr
     with open(summary_path, 'w', encoding='utf-8') as f:
         json.dump(summary, f, indent=2, ensure_ascii=False)
     
+    perf = summary["performance"]
     print(f"\n✅ Verarbeitung abgeschlossen!")
     print(f"   Erfolgreich: {summary['successful']}/{summary['total_processed']}")
+    print(f"   Durchsatz: {perf['images_per_second']:.2f} Bilder/s ({workers} Worker)")
+    print(f"   Latenz pro Bild: p50 {perf['latency_p50_ms']:.1f} ms, "
+          f"p95 {perf['latency_p95_ms']:.1f} ms")
+    print(f"   Stufen (Mittel): {_format_timings(stage_means)}")
+    if cache_dir:
+        print(f"   Cache-Treffer: {perf['cache_hits']}/{summary['total_processed']}")
     print(f"   Zusammenfassung: {summary_path}")
+    
+    return summary
+
+def _format_timings(timings):
+    """Formatiert Stufen-Zeiten als kompakte Zeile"""
+    return ", ".join(f"{stage} {timings[stage]:.1f} ms"
+                     for stage in PIPELINE_STAGES if stage in timings)
+
+def _report_result(img_file, output_dir, result):
+    """Gibt den Status eines verarbeiteten Bildes aus"""
+    if "error" in result:
+        print(f"  ✗ Fehler bei {img_file.name}: {result['error']}")
+    else:
+        print(f"  ✓ Paket erstellt in: {output_dir}")
 
 def main():
     parser = argparse.ArgumentParser(description="UIN Edge Extraction Tool")
@@ -237,20 +506,48 @@ def main():
                        help="Oberer Canny-Threshold (default: 200)")
     parser.add_argument("-b", "--batch", action="store_true",
                        help="Batch-Verarbeitung eines ganzen Verzeichnisses")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                       help="Parallele Worker-Prozesse für Batch-Modus "
+                            f"(default: 1, 0 = alle {os.cpu_count()} Kerne)")
+    parser.add_argument("-r", "--target-resolution", type=int, default=None,
+                       help="Verkleinert dekodieren, bis die lange Seite mindestens "
+                            "diese Pixelzahl hat (z.B. 512 oder 1024)")
+    parser.add_argument("--cache-dir", default=None,
+                       help="Verzeichnis für den Kanten-Cache (default: kein Cache)")
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                       help="Maximale Cache-Größe in MB (default: 1024)")
+    parser.add_argument("--no-preview", action="store_true",
+                       help="Keine Vorschau-Bilder erzeugen")
     
     args = parser.parse_args()
     
+    cache_max_bytes = args.cache_size_mb * 1024 * 1024
+    
     if args.batch:
         print(f"Batch-Verarbeitung: {args.input} -> {args.output}")
-        batch_process_directory(args.input, args.output, args.low, args.high)
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        batch_process_directory(args.input, args.output, args.low, args.high,
+                                workers=workers,
+                                target_resolution=args.target_resolution,
+                                cache_dir=args.cache_dir,
+                                cache_max_bytes=cache_max_bytes,
+                                preview=not args.no_preview)
     else:
         print(f"Einzelbild-Verarbeitung: {args.input}")
-        result = create_uin_package(args.input, args.output, args.low, args.high)
+        cache = EdgeCache(args.cache_dir, cache_max_bytes) if args.cache_dir else None
+        result = create_uin_package(args.input, args.output, args.low, args.high,
+                                    args.target_resolution, cache=cache,
+                                    preview=not args.no_preview)
         print(f"\n✅ UIN-Paket erstellt:")
         print(f"   Kantenbild: {result['edge_image']}")
         print(f"   UIN-JSON: {result['uin_json']}")
         print(f"   Vorschau: {result['preview']}")
         print(f"   Kantendichte: {result['stats']['edge_percentage']:.2f}%")
+        print(f"   Stufen: {_format_timings(result['timings'])}")
+        if cache:
+            stats = cache.stats()
+            print(f"   Cache: {'Treffer' if result['cache_hit'] else 'neu berechnet'} "
+                  f"({stats['entries']} Einträge, {stats['size_bytes'] / 1024:.0f} KB)")
 
 if __name__ == "__main__":
     main()
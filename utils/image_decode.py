@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+UIN Image Decode
+Gemeinsames Dekodieren für beide Kanten-Extraktoren (utils/ und reverse_uin/).
+
+Mit target_resolution wird der eingebaute Downscale des Decoders genutzt
+(IMREAD_REDUCED_*), sodass große JPEGs nie in voller Auflösung im Speicher
+landen. OpenCV wendet dabei die EXIF-Orientierung an; die Originalgröße
+aus dem Header wird deshalb ebenfalls orientiert gemeldet.
+"""
+
+import cv2
+from PIL import Image
+
+REDUCED_DECODE_FLAGS = {
+    # Faktor: (Farbe, Graustufen) - JPEG skaliert direkt in der DCT
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    1: (cv2.IMREAD_COLOR, cv2.IMREAD_GRAYSCALE),
+}
+
+# EXIF-Orientierungen, bei denen das Bild um 90° gedreht gespeichert ist
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+_EXIF_ORIENTATION = 0x0112
+
+def reduced_decode_factor(image_size, target_resolution=None):
+    """
+    Wählt den größten Decoder-Verkleinerungsfaktor (1, 2, 4, 8), bei dem
+    die lange Bildseite noch mindestens target_resolution Pixel hat.
+
+    Args:
+        image_size: (Breite, Höhe) des Originalbildes
+        target_resolution: Gewünschte Mindestlänge der langen Seite (None = voll)
+    """
+    if not target_resolution:
+        return 1
+    long_side = max(image_size)
+    for factor in (8, 4, 2):
+        if long_side // factor >= target_resolution:
+            return factor
+    return 1
+
+def oriented_size(image_path):
+    """
+    (Breite, Höhe) aus dem Header, nach EXIF-Orientierung - ohne Pixeldaten
+    zu dekodieren. Entspricht der Größe, die cv2.imread liefert.
+    """
+    with Image.open(image_path) as header:
+        width, height = header.size
+        if header.getexif().get(_EXIF_ORIENTATION, 1) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+    return width, height
+
+def decode_image(image_path, target_resolution=None, grayscale=False):
+    """
+    Dekodiert ein Bild genau einmal, optional verkleinert im Decoder.
+
+    Args:
+        image_path: Pfad zum Eingabebild
+        target_resolution: Mindestlänge der langen Seite nach dem Dekodieren
+        grayscale: Direkt als Graustufenbild dekodieren
+
+    Returns:
+        img: BGR- bzw. Graustufen-Array (EXIF-orientiert)
+        original_size: (Breite, Höhe) des Originalbildes (EXIF-orientiert)
+
+    Raises:
+        ValueError: Falls das Bild nicht gelesen werden kann
+    """
+    factor = 1
+    original_size = None
+    if target_resolution:
+        # Nur den Header lesen, um die Originalgröße zu kennen
+        try:
+            original_size = oriented_size(image_path)
+        except Exception as e:
+            raise ValueError(f"Konnte Bild nicht laden: {image_path}") from e
+        factor = reduced_decode_factor(original_size, target_resolution)
+
+    flag = REDUCED_DECODE_FLAGS[factor][1 if grayscale else 0]
+    img = cv2.imread(str(image_path), flag)
+    if img is None:
+        raise ValueError(f"Konnte Bild nicht laden: {image_path}")
+    if original_size is None:
+        original_size = (img.shape[1], img.shape[0])
+    return img, original_size
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Vektorisierte Farbpaletten für UIN (gemeinsam für beide Extraktoren und
+utils/extract_edges.create_uin_package)
+
+Statt jedes Pixel zu sortieren (np.unique) oder in reinem Python zu
+clustern (ColorThief/MMCQ) arbeitet die Engine in drei Schritten:
+
+    1. Stichprobe: jedes n-te Pixel in beiden Richtungen, höchstens
+       max_pixels - der Speicherbedarf ist unabhängig von der Bildgröße
+    2. Histogramm: Kanäle auf `bits` Bit quantisieren, zu einem Schlüssel
+       packen und mit np.bincount zählen (inkl. Farbsummen je Bin, damit
+       jeder Bin seine mittlere echte Farbe liefert)
+    3. dominant_colors: die häufigsten Bins
+       extract_palette: gewichtetes k-Means über die belegten Bins
+       (höchstens 2^(3*bits) Punkte statt Millionen Pixel)
+
+Alle Funktionen erwarten uint8-Bilder (H x W x 3/4 oder H x W) und liefern
+Farben in derselben Kanalreihenfolge wie die Eingabe, außer mit bgr=True
+(dann RGB).
+"""
+
+import math
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Version der Paletten-Berechnung (Teil von Cache-Schlüsseln)
+PALETTE_VERSION = "bincount-kmeans-1"
+
+DEFAULT_MAX_PIXELS = 256 * 1024
+DEFAULT_BITS = 5
+
+
+def sample_pixels(image: np.ndarray, max_pixels: int = DEFAULT_MAX_PIXELS,
+                  bgr: bool = False, skip_white: bool = False) -> np.ndarray:
+    """
+    Gleichmäßige Pixel-Stichprobe als N x 3 uint8.
+
+    Args:
+        image: uint8-Bild (Graustufen, 3 oder 4 Kanäle; Alpha < 125 wird verworfen)
+        max_pixels: Obergrenze der Stichprobe
+        bgr: Eingabe ist BGR (OpenCV) - Ergebnis ist dann RGB
+        skip_white: Fast weiße Pixel (alle Kanäle > 250) ignorieren wie ColorThief
+    """
+    height, width = image.shape[:2]
+    step = max(1, math.ceil(math.sqrt(height * width / max_pixels)))
+    sample = image[::step, ::step]
+
+    if sample.ndim == 2:
+        pixels = np.repeat(sample.reshape(-1, 1), 3, axis=1)
+    else:
+        pixels = sample.reshape(-1, sample.shape[2])
+        if pixels.shape[1] == 4:
+            pixels = pixels[pixels[:, 3] >= 125, :3]
+        if bgr:
+            pixels = pixels[:, ::-1]
+
+    if skip_white:
+        pixels = pixels[~(pixels > 250).all(axis=1)]
+    return np.ascontiguousarray(pixels)
+
+
+def color_histogram(pixels: np.ndarray, bits: int = DEFAULT_BITS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantisiertes 3D-Histogramm der Pixel.
+
+    Returns:
+        (mittlere Farbe je belegtem Bin als float64 M x 3, Pixelanzahl je Bin M)
+    """
+    shift = 8 - bits
+    q = (pixels >> shift).astype(np.int32)
+    keys = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    size = 1 << (3 * bits)
+
+    counts = np.bincount(keys, minlength=size)
+    used = np.flatnonzero(counts)
+    sums = np.stack([
+        np.bincount(keys, weights=pixels[:, c], minlength=size)[used] for c in range(3)
+    ], axis=1)
+    counts = counts[used]
+    return sums / counts[:, None], counts
+
+
+def _squared_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Quadrierte Abstände M x k über |p|² - 2 p·c + |c|² (eine Matrixmultiplikation)"""
+    return np.maximum(
+        (points * points).sum(axis=1)[:, None] - 2 * points @ centers.T
+        + (centers * centers).sum(axis=1)[None, :], 0
+    )
+
+
+def _weighted_kmeans(points: np.ndarray, weights: np.ndarray, k: int,
+                     iterations: int = 12) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k-Means über gewichtete Punkte (Histogramm-Bins).
+
+    Deterministische Initialisierung: schwerster Bin, danach jeweils der Bin
+    mit dem größten Gewicht x Abstand² zu den bisherigen Zentren.
+    """
+    points = points.astype(np.float32)
+    weights = weights.astype(np.float64)
+
+    centers = [points[np.argmax(weights)]]
+    d2 = ((points - centers[0]) ** 2).sum(axis=1)
+    while len(centers) < k:
+        index = np.argmax(weights * d2)
+        if d2[index] == 0:
+            break
+        centers.append(points[index])
+        d2 = np.minimum(d2, ((points - points[index]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+    weighted = points * weights[:, None]
+
+    for _ in range(iterations):
+        labels = _squared_distances(points, centers).argmin(axis=1)
+        cluster_weights = np.bincount(labels, weights=weights, minlength=len(centers))
+        sums = np.stack([
+            np.bincount(labels, weights=weighted[:, c], minlength=len(centers))
+            for c in range(3)
+        ], axis=1)
+        filled = cluster_weights > 0
+        updated = centers.copy()
+        updated[filled] = sums[filled] / cluster_weights[filled, None]
+        if np.allclose(updated, centers, atol=0.5):
+            centers = updated
+            break
+        centers = updated
+
+    labels = _squared_distances(points, centers).argmin(axis=1)
+    cluster_weights = np.bincount(labels, weights=weights, minlength=len(centers))
+    return centers, cluster_weights
+
+
+def dominant_colors(image: np.ndarray, count: int = 3, bits: int = DEFAULT_BITS,
+                    max_pixels: int = DEFAULT_MAX_PIXELS, bgr: bool = False) -> List[Dict]:
+    """
+    Häufigste Farben (Histogramm-Bins, nach Anteil absteigend).
+
+    Returns:
+        [{"color": [c0, c1, c2], "fraction": Anteil der Stichprobe}, ...]
+    """
+    pixels = sample_pixels(image, max_pixels, bgr=bgr)
+    if len(pixels) == 0:
+        return []
+    means, counts = color_histogram(pixels, bits)
+    top = np.argsort(-counts, kind="stable")[:count]
+    return [
+        {"color": np.rint(means[i]).astype(int).tolist(), "fraction": float(counts[i] / len(pixels))}
+        for i in top
+    ]
+
+
+def extract_palette(image: np.ndarray, count: int = 5, bits: int = DEFAULT_BITS,
+                    max_pixels: int = DEFAULT_MAX_PIXELS, bgr: bool = False,
+                    skip_white: bool = False) -> List[Dict]:
+    """
+    Repräsentative Palette mit `count` Farben (gewichtetes k-Means).
+
+    Returns:
+        [{"color": [c0, c1, c2], "fraction": Anteil der Stichprobe}, ...]
+        nach Anteil absteigend (weniger Farben, falls das Bild weniger hat)
+    """
+    pixels = sample_pixels(image, max_pixels, bgr=bgr, skip_white=skip_white)
+    if len(pixels) == 0:
+        return []
+    means, counts = color_histogram(pixels, bits)
+    centers, weights = _weighted_kmeans(means, counts, count)
+    order = np.argsort(-weights, kind="stable")
+    return [
+        {"color": np.clip(np.rint(centers[i]), 0, 255).astype(int).tolist(),
+         "fraction": float(weights[i] / len(pixels))}
+        for i in order if weights[i] > 0
+    ]
+
+
+def to_hex(color) -> str:
+    """[r, g, b] -> '#rrggbb'"""
+    return '#{:02x}{:02x}{:02x}'.format(*color)
+
+
+def _palette_distance(reference: List[Tuple[int, int, int]], candidate: List[List[int]]) -> float:
+    """Mittlerer RGB-Abstand jeder Referenzfarbe zur nächsten Kandidatenfarbe"""
+    if not reference or not candidate:
+        return float("nan")
+    ref = np.array(reference, dtype=np.float64)
+    cand = np.array(candidate, dtype=np.float64)
+    return float(np.sqrt(((ref[:, None] - cand[None]) ** 2).sum(axis=2)).min(axis=1).mean())
+
+
+def benchmark(width: int = 2048, height: int = 2048, repeat: int = 3,
+              count: int = 5) -> Dict[str, Dict]:
+    """
+    Vergleicht die Engine mit den bisherigen Implementierungen auf einem
+    synthetischen Foto-ähnlichen Bild (weiche Farbflächen plus Rauschen).
+
+        np.unique      Top-3 über alle Pixel (bisher _analyze_colors)
+        colorthief     MMCQ in reinem Python (bisher extract_colors), falls installiert
+        dominant       dominant_colors (neu, _analyze_colors)
+        palette        extract_palette (neu, extract_colors)
+
+    Returns:
+        {Name: {"ms", "mpix_per_s"[, "palette_distance"]}}
+    """
+    import io
+
+    import cv2
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    coarse = rng.integers(0, 256, (height // 64 + 1, width // 64 + 1, 3), dtype=np.uint8)
+    image = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    image = np.clip(image + rng.normal(0, 6, image.shape), 0, 255).astype(np.uint8)
+    megapixels = width * height / 1e6
+
+    candidates = {
+        "np.unique": lambda: np.unique(image.reshape(-1, 3), axis=0, return_counts=True),
+        "dominant": lambda: dominant_colors(image, 3, bgr=True),
+        "palette": lambda: extract_palette(image, count, bgr=True, skip_white=True),
+    }
+    try:
+        from colorthief import ColorThief
+        png = io.BytesIO()
+        Image.fromarray(image[:, :, ::-1]).save(png, format="PNG")
+        candidates["colorthief"] = lambda: ColorThief(io.BytesIO(png.getvalue())).get_palette(color_count=count)
+    except ImportError:
+        pass
+
+    report, results = {}, {}
+    for name, func in candidates.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[name] = func()
+            best = min(best, time.perf_counter() - start)
+        report[name] = {"ms": best * 1000, "mpix_per_s": megapixels / best}
+
+    if "colorthief" in results:
+        ours = [entry["color"] for entry in results["palette"]]
+        report["palette"]["palette_distance"] = _palette_distance(results["colorthief"], ours)
+    return report
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Dominante Farben / Palette eines Bildes')
+    parser.add_argument('image', nargs='?', help='Pfad zum Bild')
+    parser.add_argument('--colors', '-n', type=int, default=5, help='Anzahl Palettenfarben')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Mit np.unique und ColorThief vergleichen')
+    parser.add_argument('--size', type=int, default=2048, help='Kantenlänge des Benchmark-Bildes')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        report = benchmark(args.size, args.size, count=args.colors)
+        print(f"📊 {args.size}x{args.size} px:")
+        for name, r in report.items():
+            extra = (f"  (Abstand zu ColorThief: {r['palette_distance']:.1f})"
+                     if "palette_distance" in r else "")
+            print(f"   {name:10s} {r['ms']:9.1f} ms  {r['mpix_per_s']:8.1f} MP/s{extra}")
+        return
+
+    if not args.image:
+        parser.error("Bild angeben (oder --benchmark)")
+
+    import cv2
+    img = cv2.imread(args.image, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise SystemExit(f"Konnte Bild nicht laden: {args.image}")
+    for entry in extract_palette(img, args.colors, bgr=img.ndim == 3):
+        print(f"   {to_hex(entry['color'])}  {entry['fraction']:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
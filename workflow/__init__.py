@@ -0,0 +1 @@
+"""UIN Workflow: ComfyUI-Client und -Automation, Roundtrip-Validierung"""
@@ -0,0 +1,97 @@
+# workflows/benchmark_imports.py
+"""
+Misst die Import-Zeit der Workflow-Module und prüft, dass der Import
+keine Nebenwirkungen hat.
+
+Jedes Modul wird in einem frischen Python-Prozess aus der Repo-Wurzel
+über seinen Paketnamen (workflow.…) geladen, genau wie es andere Module
+importieren - ein Modul, das nur aus dem eigenen Verzeichnis heraus
+importierbar ist, fällt so auf. Dabei ist Netzwerkzugriff gesperrt - ein Modul, das beim Import eine Verbindung
+aufbaut, schlägt fehl. Zusätzlich wird gemeldet, welche schweren Pakete
+(cv2, matplotlib, torch, ...) schon beim Import geladen werden.
+
+Mit --max-ms als Wächter in CI nutzbar (Exit-Code 1 bei Überschreitung).
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+MODULES = [
+    "workflow.comfyui_client",
+    "workflow.comfyui_automation",
+    "workflow.native.comfyui_automation",
+    "workflow.roundtrip_generators",
+    "workflow.roundtrip_validator",
+]
+
+HEAVY_MODULES = ["cv2", "matplotlib", "torch", "transformers", "numpy", "PIL", "aiohttp"]
+
+_CHILD = r"""
+import importlib, json, socket, sys, time
+
+def _blocked(*args, **kwargs):
+    raise RuntimeError("Netzwerkzugriff beim Import")
+socket.socket.connect = _blocked
+socket.create_connection = _blocked
+
+name, heavy = sys.argv[1], json.loads(sys.argv[2])
+start = time.perf_counter()
+importlib.import_module(name)
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed_ms, "heavy": [m for m in heavy if m in sys.modules]}))
+"""
+
+
+def measure(name, repeat=3):
+    """
+    Importiert ein Modul (Paketname) `repeat`-mal in neuen Prozessen.
+
+    Returns:
+        {"ms": bestes Ergebnis, "heavy": [...]} oder {"error": Meldung}
+    """
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", _CHILD, name, json.dumps(HEAVY_MODULES)],
+            capture_output=True, text=True, cwd=REPO_ROOT
+        )
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else f"Exit-Code {proc.returncode}"}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if best is None or result["ms"] < best["ms"]:
+            best = result
+    return best
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Import-Zeit der Workflow-Module messen')
+    parser.add_argument('--repeat', type=int, default=3, help='Messungen pro Modul (bestes zählt)')
+    parser.add_argument('--max-ms', type=float, help='Budget pro Modul; Exit-Code 1 bei Überschreitung')
+    args = parser.parse_args()
+
+    failed = False
+    print("⏱️  Import-Zeiten:")
+    for name in MODULES:
+        result = measure(name, args.repeat)
+
+        if "error" in result:
+            print(f"   ✗ {name}: {result['error']}")
+            failed = True
+            continue
+
+        over = args.max_ms is not None and result["ms"] > args.max_ms
+        failed = failed or over
+        heavy = f"  (lädt: {', '.join(result['heavy'])})" if result["heavy"] else ""
+        print(f"   {'✗' if over else '✓'} {name:36s} {result['ms']:8.1f} ms{heavy}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,278 @@
 # workflows/comfyui_automation.py
-import requests
 import json
 import base64
+import sys
 from pathlib import Path
 import time
+import uuid
 from queue import Queue
-from threading import Thread
+from threading import Thread, Lock, Event
+
+# Workflow-Module werden als Paket importiert (auch beim Start als Skript)
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(1, str(REPO_ROOT))
+
+# Gemeinsamer HTTP-Client (Pool, Timeouts, Retry)
+from workflow.comfyui_client import ComfyUIClient, UploadRegistry
+
+# Optional: websocket-client für ComfyUIs Fortschritts-Stream (/ws)
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+class CompletionTracker:
+    """
+    Verfolgt die Fertigstellung aller laufenden Prompts über eine einzige
+    Websocket-Verbindung zu ComfyUI (/ws?clientId=...).
+    
+    Ohne Websocket (Paket fehlt, Verbindung getrennt) wird /history mit
+    exponentiell wachsendem Intervall abgefragt. Auch bei aktiver Verbindung
+    prüft ein seltener Poll, ob eine Nachricht verloren ging.
+    
+    Pro Prompt werden Wartezeit in der Queue und Ausführungszeit getrennt
+    gemessen. Alle Zeitpunkte stammen von der lokalen Uhr (time.time());
+    aus /history wird nur die Ausführungsdauer übernommen (Differenz zweier
+    Server-Zeitstempel), damit abweichende Uhren die Werte nicht verfälschen.
+    
+    Ereignisse für unbekannte oder bereits abgeschlossene Prompts werden
+    ignoriert - verpasste Ereignisse holt der Kontroll-Poll nach.
+    """
+    
+    def __init__(self, client, client_id=None, poll_initial=0.25, poll_max=5.0):
+        self.client = client
+        self.server_url = client.server_url
+        self.client_id = client_id or uuid.uuid4().hex
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.connected = Event()
+        self._prompts = {}
+        self._lock = Lock()
+        self._thread = None
+    
+    def _entry(self, prompt_id):
+        with self._lock:
+            entry = self._prompts.get(prompt_id)
+            if entry is None:
+                entry = {"done": Event(), "submitted": None, "started": None,
+                         "finished": None, "image": None, "error": None}
+                self._prompts[prompt_id] = entry
+            return entry
+    
+    def register(self, prompt_id, submitted_at):
+        """Meldet einen soeben eingereihten Prompt an"""
+        self._entry(prompt_id)["submitted"] = submitted_at
+        self._ensure_listener()
+    
+    def _ensure_listener(self):
+        if websocket is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._listen, daemon=True)
+                self._thread.start()
+    
+    def _listen(self):
+        """Empfängt Ereignisse aller Prompts; verbindet bei Abbruch neu"""
+        ws_url = self.server_url.replace("http", "ws", 1) + f"/ws?clientId={self.client_id}"
+        backoff = self.poll_initial
+        while True:
+            try:
+                ws = websocket.create_connection(ws_url, timeout=10)
+                ws.settimeout(None)
+            except Exception:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.poll_max * 6)
+                continue
+            
+            self.connected.set()
+            backoff = self.poll_initial
+            try:
+                while True:
+                    message = ws.recv()
+                    # Binäre Frames sind Vorschaubilder
+                    if isinstance(message, str):
+                        self._handle_message(json.loads(message))
+            except Exception:
+                pass
+            finally:
+                self.connected.clear()
+                ws.close()
+    
+    def _handle_message(self, message):
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if prompt_id is None:
+            return
+        with self._lock:
+            entry = self._prompts.get(prompt_id)
+        # Fremde Prompts, Ereignisse vor register() und Nachzügler wie das
+        # abschließende executing(node=None) legen keine neuen Einträge an
+        if entry is None or entry["done"].is_set():
+            return
+        now = time.time()
+        kind = message.get("type")
+        
+        if kind == "execution_start":
+            entry["started"] = now
+        elif kind == "executed":
+            images = (data.get("output") or {}).get("images")
+            if images and entry["image"] is None:
+                entry["image"] = images[0]["filename"]
+        elif kind == "execution_error":
+            entry["error"] = data.get("exception_message", "execution_error")
+            entry["finished"] = now
+            entry["done"].set()
+        elif kind == "execution_success" or (kind == "executing" and data.get("node") is None):
+            entry["finished"] = now
+            entry["done"].set()
+    
+    def _poll_history(self, prompt_id, entry):
+        """Ein Abruf von /history; True, wenn der Prompt fertig ist"""
+        history = self.client.get_history(prompt_id)
+        if prompt_id not in history:
+            return False
+        
+        record = history[prompt_id]
+        for node_output in record.get("outputs", {}).values():
+            if "images" in node_output and entry["image"] is None:
+                entry["image"] = node_output["images"][0]["filename"]
+        
+        # Neuere ComfyUI-Versionen liefern Zeitstempel (ms, Server-Uhr);
+        # nur ihre Differenz wird verwendet
+        status = record.get("status", {})
+        server_times = {}
+        for name, info in status.get("messages", []):
+            if "timestamp" in info:
+                server_times[name] = info["timestamp"] / 1000
+            if name == "execution_error" and entry["error"] is None:
+                entry["error"] = info.get("exception_message", "execution_error")
+        if status.get("status_str") == "error" and entry["error"] is None:
+            entry["error"] = "execution_error"
+        
+        if entry["finished"] is None:
+            entry["finished"] = time.time()
+        end = server_times.get("execution_success", server_times.get("execution_error"))
+        if entry["started"] is None and "execution_start" in server_times and end is not None:
+            entry["started"] = entry["finished"] - (end - server_times["execution_start"])
+        entry["done"].set()
+        return True
+    
+    def wait(self, prompt_id, timeout=300):
+        """
+        Wartet auf einen Prompt.
+        
+        Returns:
+            Dictionary mit image, queue_time_s, execution_time_s, total_time_s
+        """
+        entry = self._entry(prompt_id)
+        deadline = time.time() + timeout
+        interval = self.poll_initial
+        
+        while not entry["done"].is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"Generierung {prompt_id} timeout nach {timeout}s")
+            
+            # Mit Websocket nur seltener Kontroll-Poll
+            wait_s = self.poll_max if self.connected.is_set() else interval
+            if entry["done"].wait(min(wait_s, remaining)):
+                break
+            self._poll_history(prompt_id, entry)
+            interval = min(interval * 2, self.poll_max)
+        
+        if entry["started"] is None and entry["error"] is None:
+            # execution_start kam vor register(): Dauer aus /history
+            try:
+                self._poll_history(prompt_id, entry)
+            except Exception:
+                pass
+        
+        with self._lock:
+            self._prompts.pop(prompt_id, None)
+        
+        if entry["error"]:
+            raise RuntimeError(f"Generierung {prompt_id} fehlgeschlagen: {entry['error']}")
+        
+        submitted, started, finished = entry["submitted"], entry["started"], entry["finished"]
+        return {
+            "image": entry["image"],
+            "queue_time_s": started - submitted if started and submitted else None,
+            "execution_time_s": finished - started if finished and started else None,
+            "total_time_s": finished - submitted if finished and submitted else None
+        }
+
+class BatchJournal:
+    """
+    Append-only Journal (JSONL) der fertigen Pakete eines Batch-Laufs.
+    
+    Jede Zeile ist ein Ergebnis und wird sofort geschrieben; nach einem
+    Absturz gehen höchstens die gerade laufenden Pakete verloren. Eine
+    abgeschnittene letzte Zeile wird beim Laden ignoriert.
+    """
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+        self._lock = Lock()
+    
+    def load(self):
+        """Bisherige Ergebnisse als {source: Ergebnis}"""
+        records = {}
+        if not self.path.exists():
+            return records
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records[record["source"]] = record
+        return records
+    
+    def open(self, resume=False):
+        if resume and self.path.exists():
+            # Abgeschnittene letzte Zeile entfernen, bevor angehängt wird
+            with open(self.path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+        self._file = open(self.path, "a" if resume else "w")
+    
+    def append(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def compact(self, summary_path, order):
+        """Schreibt alle Ergebnisse einmalig in Paket-Reihenfolge als JSON"""
+        records = self.load()
+        ordered = [records[source] for source in order if source in records]
+        with open(summary_path, "w") as f:
+            json.dump(ordered, f, indent=2)
+        return ordered
 
 class ComfyUIUINAutoPilot:
-    def __init__(self, server_url="http://localhost:8188", max_workers=2):
+    def __init__(self, server_url="http://localhost:8188", max_workers=2, client=None):
         self.server_url = server_url
-        self.workflow_queue = Queue()
+        # Ein Pool-Slot pro Worker plus Upload und Tracker
+        # Gleiche Kantenbilder (z.B. mehrere Seeds) nur einmal hochladen
+        self.client = client or ComfyUIClient(server_url, pool_size=max_workers + 2,
+                                              upload_registry=UploadRegistry())
+        self.max_workers = max_workers
+        # Begrenzt: höchstens max_workers vorbereitete (hochgeladene) Pakete
+        # warten auf einen freien Slot -> Backpressure für den Upload
+        self.workflow_queue = Queue(maxsize=max_workers)
         self.results = []
+        self._results_lock = Lock()
+        # Gemeinsamer Tracker für alle laufenden Prompts
+        self.tracker = CompletionTracker(self.client)
         
     def create_workflow_from_uin(self, uin_json_path, edge_image_path):
         """Erstelle ComfyUI-Workflow aus UIN-Paket"""
@@ -38,89 +299,144 @@ class ComfyUIUINAutoPilot:
         
         return workflow
     
-    def batch_process_uin_folder(self, uin_folder, output_dir="./comfyui_output"):
-        """Verarbeite einen ganzen Ordner mit UIN-Paketen"""
+    def batch_process_uin_folder(self, uin_folder, output_dir="./comfyui_output", resume=False):
+        """
+        Verarbeite einen ganzen Ordner mit UIN-Paketen
+        
+        Ergebnisse landen fortlaufend in batch_results.jsonl; mit resume=True
+        werden dort bereits erfasste Pakete übersprungen. batch_results.json
+        wird einmal am Ende aus dem Journal geschrieben.
+        """
         Path(output_dir).mkdir(exist_ok=True)
         
         uin_packages = []
-        for item in Path(uin_folder).iterdir():
+        for item in sorted(Path(uin_folder).iterdir()):
             if item.is_dir():
-                json_files = list(item.glob("*.uin.json"))
+                json_files = sorted(item.glob("*.uin.json"))
                 if json_files:
+                    # <name>_attributes.uin.json -> <name>_edges.png (wie create_uin_package)
                     uin_packages.append({
                         "json": json_files[0],
-                        "edges": item / json_files[0].stem.replace("_attributes", "_edges") + ".png"
+                        "edges": item / json_files[0].name.replace("_attributes.uin.json", "_edges.png")
                     })
         
-        print(f"🔄 Starte Batch-Verarbeitung von {len(uin_packages)} UIN-Paketen...")
+        journal = BatchJournal(Path(output_dir) / "batch_results.jsonl")
+        done = journal.load() if resume else {}
+        pending = [package for package in uin_packages if str(package["json"]) not in done]
+        
+        if done:
+            print(f"⏭️  Fortsetzen: {len(uin_packages) - len(pending)} Pakete bereits erledigt")
+        print(f"🔄 Starte Batch-Verarbeitung von {len(pending)} UIN-Paketen "
+              f"({self.max_workers} parallel)...")
+        
+        journal.open(resume)
+        try:
+            # Vorbereitung (Upload + Workflow) läuft dem Generieren voraus
+            producer = Thread(target=self._prepare_packages, args=(pending,), daemon=True)
+            producer.start()
+            
+            # max_workers Slots halten je einen Prompt auf dem Server in Bearbeitung
+            workers = [
+                Thread(target=self._generation_worker,
+                       args=(len(pending), journal), daemon=True)
+                for _ in range(self.max_workers)
+            ]
+            for worker in workers:
+                worker.start()
+            
+            producer.join()
+            for worker in workers:
+                worker.join()
+        finally:
+            journal.close()
+        
+        # Kompaktierung: Zusammenfassung einmal in Paket-Reihenfolge
+        batch_results = journal.compact(
+            Path(output_dir) / "batch_results.json",
+            [str(package["json"]) for package in uin_packages]
+        )
+        with self._results_lock:
+            self.results.extend(batch_results)
         
+        print(f"✅ Batch abgeschlossen! {len(batch_results)}/{len(uin_packages)} erfolgreich")
+        if self.client.uploads_skipped:
+            print(f"   ♻️  {self.client.uploads_skipped} Uploads übersprungen (bereits auf dem Server)")
+        return self.results
+    
+    def _prepare_packages(self, uin_packages):
+        """Lädt Kantenbilder hoch und legt fertige Workflows in die Queue"""
         for i, package in enumerate(uin_packages):
             print(f"  [{i+1}/{len(uin_packages)}] Verarbeite {package['json'].name}")
-            
             try:
-                # Erstelle Workflow
                 workflow = self.create_workflow_from_uin(
                     package["json"], 
                     package["edges"]
                 )
-                
+            except Exception as e:
+                print(f"    ✗ Fehler: {e}")
+                continue
+            
+            # Blockiert, solange alle Slots belegt und die Queue voll ist
+            self.workflow_queue.put((i, package, workflow))
+        
+        # Ein Endsignal pro Worker
+        for _ in range(self.max_workers):
+            self.workflow_queue.put(None)
+    
+    def _generation_worker(self, total, journal):
+        """Sendet Workflows an ComfyUI und wartet auf deren Fertigstellung"""
+        while True:
+            item = self.workflow_queue.get()
+            if item is None:
+                break
+            i, package, workflow = item
+            
+            try:
                 # Sende an ComfyUI
                 result = self._queue_prompt(workflow)
                 
                 # Warte auf Fertigstellung
-                image_path = self._wait_for_completion(result["prompt_id"])
-                
-                # Speichere Ergebnis
-                self.results.append({
-                    "package": package["json"].stem,
-                    "workflow_id": result["prompt_id"],
-                    "image_path": image_path,
-                    "timestamp": time.time()
-                })
-                
-                # Backup der Ergebnisse
-                with open(f"{output_dir}/batch_results.json", "w") as f:
-                    json.dump(self.results, f, indent=2)
-                    
+                completion = self._wait_for_completion(result["prompt_id"])
             except Exception as e:
-                print(f"    ✗ Fehler: {e}")
+                print(f"    ✗ Fehler ({package['json'].name}): {e}")
                 continue
-        
-        print(f"✅ Batch abgeschlossen! {len(self.results)}/{len(uin_packages)} erfolgreich")
-        return self.results
+            
+            print(f"    ✓ [{i+1}/{total}] {package['json'].name}")
+            
+            # Ergebnis sofort ins Journal
+            journal.append({
+                "source": str(package["json"]),
+                "package": package["json"].stem,
+                "workflow_id": result["prompt_id"],
+                "image_path": completion["image_path"],
+                "queue_time_s": completion["queue_time_s"],
+                "execution_time_s": completion["execution_time_s"],
+                "timestamp": time.time()
+            })
     
     def _upload_image(self, image_path):
         """Lade Bild auf ComfyUI Server"""
-        with open(image_path, "rb") as f:
-            files = {"image": (Path(image_path).name, f)}
-            response = requests.post(f"{self.server_url}/upload/image", files=files)
-        
-        return response.json()["name"]
+        return self.client.upload_image(image_path)
     
     def _queue_prompt(self, workflow):
         """Sende Workflow an ComfyUI"""
-        response = requests.post(f"{self.server_url}/prompt", json={"prompt": workflow})
-        return response.json()
+        submitted_at = time.time()
+        # client_id leitet die Fortschritts-Ereignisse an unseren Websocket
+        result = self.client.queue_prompt(workflow, client_id=self.tracker.client_id)
+        self.tracker.register(result["prompt_id"], submitted_at)
+        return result
     
     def _wait_for_completion(self, prompt_id, timeout=300):
-        """Warte auf Fertigstellung der Generierung"""
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
-            response = requests.get(f"{self.server_url}/history/{prompt_id}")
-            history = response.json()
-            
-            if prompt_id in history:
-                # Extrahiere den ersten generierten Bild-Pfad
-                outputs = history[prompt_id]["outputs"]
-                for node_id, node_output in outputs.items():
-                    if "images" in node_output:
-                        image_info = node_output["images"][0]
-                        return f"{self.server_url}/view?filename={image_info['filename']}"
-            
-            time.sleep(2)
-        
-        raise TimeoutError(f"Generierung {prompt_id} timeout nach {timeout}s")
+        """Warte auf Fertigstellung der Generierung (Bild-URL und Zeiten)"""
+        completion = self.tracker.wait(prompt_id, timeout)
+        image_path = None
+        if completion["image"]:
+            image_path = self.client.view_url(completion["image"])
+        return {
+            "image_path": image_path,
+            "queue_time_s": completion["queue_time_s"],
+            "execution_time_s": completion["execution_time_s"]
+        }
     
     def _generate_detailed_prompt(self, uin_data):
         """Erweitere Prompt-Generierung für bessere Ergebnisse"""
@@ -164,6 +480,22 @@ class ComfyUIUINAutoPilot:
         
         return ", ".join(prompt_parts)
 
-# Beispiel-Nutzung
-pilot = ComfyUIUINAutoPilot()
-results = pilot.batch_process_uin_folder("./uin_packages")
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='UIN-Pakete stapelweise über ComfyUI generieren')
+    parser.add_argument('uin_folder', nargs='?', default='./uin_packages',
+                        help='Ordner mit UIN-Paketen (je ein Unterordner)')
+    parser.add_argument('-o', '--output', default='./comfyui_output', help='Ausgabe-Ordner')
+    parser.add_argument('--server', default='http://localhost:8188', help='ComfyUI Server-URL')
+    parser.add_argument('-w', '--workers', type=int, default=2,
+                        help='Gleichzeitig laufende Prompts auf dem Server')
+    parser.add_argument('--resume', action='store_true',
+                        help='Bereits erledigte Pakete aus dem Journal überspringen')
+    args = parser.parse_args()
+    
+    pilot = ComfyUIUINAutoPilot(args.server, max_workers=args.workers)
+    pilot.batch_process_uin_folder(args.uin_folder, args.output, resume=args.resume)
+
+if __name__ == "__main__":
+    main()
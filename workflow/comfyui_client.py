@@ -0,0 +1,444 @@
+# workflows/comfyui_client.py
+"""
+Gemeinsame HTTP-Schicht für die ComfyUI-API.
+
+ComfyUIClient hält eine requests.Session mit Connection-Pool (Keep-Alive),
+setzt für jede Anfrage ein Timeout und wiederholt fehlgeschlagene Anfragen
+mit exponentiellem Backoff und Jitter. AsyncComfyUIClient bietet dieselben
+Methoden für asyncio (benötigt aiohttp).
+
+POST-Anfragen (Upload, Prompt) sind nicht idempotent und werden nur
+wiederholt, wenn die Verbindung gar nicht erst zustande kam (Connect-
+Timeout, Verbindungsaufbau abgelehnt) oder der Server mit 429/503
+ablehnt. Abgebrochene Verbindungen (Reset, RemoteDisconnected) und
+Lese-Timeouts können nach dem Empfang des Bodys auftreten und werden
+für POST nicht wiederholt - sonst könnte ein Prompt doppelt laufen.
+
+Mit einer UploadRegistry werden identische Bilder nur einmal pro Server
+hochgeladen; der zurückgegebene Name wird wiederverwendet.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Gemeinsamer Code liegt in den Paketen utils/ und uin_capsule/ der Repo-Wurzel
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(1, str(REPO_ROOT))
+
+# Optional: asyncio-Variante
+try:
+    import aiohttp
+    # Fehler vor dem Senden: Verbindungsaufbau, Connect-Timeout (aiohttp >= 3.10)
+    _ASYNC_NEVER_SENT = (aiohttp.ClientConnectorError,) + tuple(
+        filter(None, [getattr(aiohttp, "ConnectionTimeoutError", None)])
+    )
+except ImportError:
+    aiohttp = None
+    _ASYNC_NEVER_SENT = ()
+
+# (Verbindungsaufbau, Antwort) in Sekunden
+DEFAULT_TIMEOUT = (5, 30)
+UPLOAD_TIMEOUT = (5, 120)
+
+# Statuscodes, bei denen ein erneuter Versuch sinnvoll ist
+RETRY_STATUS = {429, 502, 503, 504}
+RETRY_STATUS_POST = {429, 503}
+
+
+def hash_file(path):
+    """Inhalts-Hash wie im Edge-Cache (Import erst bei Bedarf, zieht numpy)"""
+    from utils.edge_cache import hash_file as _hash_file
+    return _hash_file(path)
+
+
+def never_sent(exc):
+    """
+    True, wenn die Anfrage den Server sicher nicht erreicht hat.
+
+    Nur dann darf eine nicht idempotente Anfrage wiederholt werden:
+    Connect-Timeout oder ein fehlgeschlagener Verbindungsaufbau
+    (urllib3 NewConnectionError, z.B. Connection refused, DNS).
+    """
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    if not isinstance(exc, requests.ConnectionError):
+        return False
+    # requests verpackt urllib3-Fehler: ConnectionError(MaxRetryError(reason=...))
+    seen = set()
+    pending = [exc]
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, NewConnectionError):
+            return True
+        pending.extend([getattr(current, "reason", None), current.__cause__, current.__context__])
+        pending.extend(arg for arg in getattr(current, "args", ()) if isinstance(arg, BaseException))
+    return False
+
+
+def backoff_delay(attempt, base=0.5, cap=10.0):
+    """Exponentieller Backoff mit vollem Jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+DEFAULT_UPLOAD_REGISTRY = "./.uin_cache/comfyui_uploads.jsonl"
+
+
+class UploadRegistry:
+    """
+    Merkt sich, welche Bildinhalte (Hash) auf welchem Server unter welchem
+    Namen liegen, und überdauert so mehrere Läufe.
+
+    Append-only Log (JSONL): jede Änderung ist eine Zeile
+    {"server", "digest", "name"} (name None = vergessen), geschrieben mit
+    O_APPEND - mehrere Worker-Prozesse überschreiben sich nicht. Vor jedem
+    lookup() werden neu angehängte Zeilen anderer Worker nachgelesen. Beim
+    Laden wird das Log kompaktiert, sobald es deutlich mehr Zeilen als
+    Einträge hat.
+    """
+
+    # Kompaktieren ab so vielen überzähligen Zeilen
+    COMPACT_SLACK = 64
+
+    def __init__(self, path=DEFAULT_UPLOAD_REGISTRY):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._servers = {}
+        self._inode = None
+        self._offset = 0
+        with self._lock:
+            lines = self._refresh()
+            if lines > 2 * self._size() + self.COMPACT_SLACK:
+                self._compact()
+
+    def _size(self):
+        return sum(len(names) for names in self._servers.values())
+
+    def _apply(self, record):
+        names = self._servers.setdefault(record["server"], {})
+        if record.get("name") is None:
+            names.pop(record["digest"], None)
+        else:
+            names[record["digest"]] = record["name"]
+
+    def _refresh(self):
+        """Liest neu angehängte Zeilen (nach Kompaktierung: alles); liefert die Zeilenzahl"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return 0
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Datei wurde (von einem anderen Worker) kompaktiert
+            self._servers, self._inode, self._offset = {}, stat.st_ino, 0
+        if stat.st_size == self._offset:
+            return 0
+
+        lines = 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # wird gerade geschrieben
+                self._offset += len(line)
+                lines += 1
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return lines
+
+    def _append(self, record):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        # Pro Zeile öffnen: nach einer Kompaktierung landet sie in der neuen Datei
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _compact(self):
+        """Schreibt den aktuellen Stand atomar als neues Log"""
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                for server, names in self._servers.items():
+                    for digest, name in names.items():
+                        f.write(json.dumps({"server": server, "digest": digest, "name": name}) + "\n")
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        stat = os.stat(self.path)
+        self._inode, self._offset = stat.st_ino, stat.st_size
+
+    def lookup(self, server_url, digest):
+        with self._lock:
+            self._refresh()
+            return self._servers.get(server_url, {}).get(digest)
+
+    def record(self, server_url, digest, name):
+        with self._lock:
+            self._servers.setdefault(server_url, {})[digest] = name
+            self._append({"server": server_url, "digest": digest, "name": name})
+
+    def forget(self, server_url, digest):
+        with self._lock:
+            if self._servers.get(server_url, {}).pop(digest, None) is not None:
+                self._append({"server": server_url, "digest": digest, "name": None})
+
+
+class ComfyUIClient:
+    def __init__(self, server_url="http://localhost:8188", timeout=DEFAULT_TIMEOUT,
+                 retries=3, backoff=0.5, pool_size=10, upload_registry=None):
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.upload_registry = upload_registry
+        # In diesem Lauf bereits auf dem Server bestätigte Namen
+        self._verified = set()
+        self.uploads_skipped = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """Anfrage mit Timeout und Wiederholung; liefert die Response"""
+        idempotent = method.upper() in ("GET", "HEAD")
+        retry_status = RETRY_STATUS if idempotent else RETRY_STATUS_POST
+
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+
+            # Datei-Uploads vor jedem Versuch zurückspulen
+            for entry in (kwargs.get("files") or {}).values():
+                entry[1].seek(0)
+
+            try:
+                response = self.session.request(
+                    method, f"{self.server_url}{path}",
+                    timeout=timeout or self.timeout, **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Möglicherweise gesendet: nur idempotente Methoden wiederholen
+                if last or not (idempotent or never_sent(e)):
+                    raise
+            else:
+                if response.status_code not in retry_status or last:
+                    response.raise_for_status()
+                    return response
+
+            time.sleep(backoff_delay(attempt, self.backoff))
+
+    def upload_image(self, image_path):
+        """
+        Lädt ein Bild hoch und liefert den Namen auf dem Server.
+
+        Ist der Inhalt laut upload_registry bereits vorhanden und meldet der
+        Server die Datei noch, entfällt der Upload.
+        """
+        registry = self.upload_registry
+        digest = None
+        if registry is not None:
+            digest = hash_file(image_path)
+            name = registry.lookup(self.server_url, digest)
+            if name is not None:
+                if name in self._verified or self.image_exists(name):
+                    self._verified.add(name)
+                    self.uploads_skipped += 1
+                    return name
+                # Server kennt die Datei nicht mehr (z.B. input/ geleert)
+                registry.forget(self.server_url, digest)
+
+        with open(image_path, "rb") as f:
+            files = {"image": (Path(image_path).name, f)}
+            response = self.request("POST", "/upload/image", files=files, timeout=UPLOAD_TIMEOUT)
+        name = response.json()["name"]
+
+        if registry is not None:
+            registry.record(self.server_url, digest, name)
+            self._verified.add(name)
+        return name
+
+    def image_exists(self, name):
+        """Prüft per HEAD, ob eine hochgeladene Datei im input-Ordner liegt"""
+        try:
+            self.request("HEAD", "/view", params={"filename": name, "type": "input"})
+        except requests.HTTPError:
+            return False
+        return True
+
+    def queue_prompt(self, workflow, client_id=None):
+        """Reiht einen Workflow ein"""
+        payload = {"prompt": workflow}
+        if client_id:
+            payload["client_id"] = client_id
+        return self.request("POST", "/prompt", json=payload).json()
+
+    def get_history(self, prompt_id):
+        return self.request("GET", f"/history/{prompt_id}").json()
+
+    def view_url(self, filename):
+        return f"{self.server_url}/view?filename={filename}"
+
+    def fetch_image(self, filename, folder_type="output"):
+        """Lädt ein Bild vom Server (Standard: Ausgabe-Ordner) als Bytes"""
+        return self.request("GET", "/view", params={"filename": filename, "type": folder_type},
+                            timeout=UPLOAD_TIMEOUT).content
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncComfyUIClient:
+    """asyncio-Variante von ComfyUIClient (gleiche Methoden, awaitable)"""
+
+    def __init__(self, server_url="http://localhost:8188", timeout=DEFAULT_TIMEOUT,
+                 retries=3, backoff=0.5, pool_size=10, upload_registry=None):
+        if aiohttp is None:
+            raise ImportError("AsyncComfyUIClient benötigt aiohttp (pip install aiohttp)")
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.upload_registry = upload_registry
+        self._verified = set()
+        self.uploads_skipped = 0
+        self._session = None
+
+    def _client_timeout(self, timeout):
+        connect, read = timeout or self.timeout
+        return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self._client_timeout(None)
+            )
+        return self._session
+
+    async def request(self, method, path, timeout=None, data_factory=None, raw=False, **kwargs):
+        """
+        Anfrage mit Timeout und Wiederholung; liefert den JSON-Body
+        (mit raw=True die Bytes).
+
+        data_factory erzeugt den Body pro Versuch neu (z.B. FormData für
+        Uploads, die nach dem Senden verbraucht sind).
+        """
+        session = await self._get_session()
+        idempotent = method.upper() in ("GET", "HEAD")
+        retry_status = RETRY_STATUS if idempotent else RETRY_STATUS_POST
+
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            if data_factory is not None:
+                kwargs["data"] = data_factory()
+
+            try:
+                async with session.request(method, f"{self.server_url}{path}",
+                                           timeout=self._client_timeout(timeout),
+                                           **kwargs) as response:
+                    if response.status not in retry_status or last:
+                        response.raise_for_status()
+                        if method.upper() == "HEAD":
+                            return None
+                        if raw:
+                            return await response.read()
+                        return await response.json()
+            except _ASYNC_NEVER_SENT:
+                # Verbindung kam nicht zustande: auch POST darf wiederholt werden
+                if last:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                # Reset, ServerDisconnected, Lese-Timeout: evtl. schon gesendet
+                if last or not idempotent:
+                    raise
+
+            await asyncio.sleep(backoff_delay(attempt, self.backoff))
+
+    async def upload_image(self, image_path):
+        registry = self.upload_registry
+        digest = None
+        if registry is not None:
+            digest = hash_file(image_path)
+            name = registry.lookup(self.server_url, digest)
+            if name is not None:
+                if name in self._verified or await self.image_exists(name):
+                    self._verified.add(name)
+                    self.uploads_skipped += 1
+                    return name
+                registry.forget(self.server_url, digest)
+
+        content = Path(image_path).read_bytes()
+
+        def form():
+            data = aiohttp.FormData()
+            data.add_field("image", content, filename=Path(image_path).name)
+            return data
+
+        result = await self.request("POST", "/upload/image", data_factory=form,
+                                    timeout=UPLOAD_TIMEOUT)
+        name = result["name"]
+
+        if registry is not None:
+            registry.record(self.server_url, digest, name)
+            self._verified.add(name)
+        return name
+
+    async def image_exists(self, name):
+        try:
+            await self.request("HEAD", "/view", params={"filename": name, "type": "input"})
+        except aiohttp.ClientResponseError:
+            return False
+        return True
+
+    async def queue_prompt(self, workflow, client_id=None):
+        payload = {"prompt": workflow}
+        if client_id:
+            payload["client_id"] = client_id
+        return await self.request("POST", "/prompt", json=payload)
+
+    async def get_history(self, prompt_id):
+        return await self.request("GET", f"/history/{prompt_id}")
+
+    def view_url(self, filename):
+        return f"{self.server_url}/view?filename={filename}"
+
+    async def fetch_image(self, filename, folder_type="output"):
+        return await self.request("GET", "/view", raw=True, timeout=UPLOAD_TIMEOUT,
+                                  params={"filename": filename, "type": folder_type})
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
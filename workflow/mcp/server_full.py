@@ -1,7 +1,15 @@
 # mcp_server_full.py
 import json
 import asyncio
-import subprocess
+import base64
+import copy
+import functools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
@@ -9,6 +17,149 @@ from mcp.server import Server, NotificationOptions
 from mcp.server.models import TextContent, ImageContent, EmbeddedResource
 import mcp.server.stdio
 
+# Extraktion läuft im Prozess (kein Python-Start pro Tool-Aufruf)
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(1, str(REPO_ROOT))
+from utils.extract_edges import create_uin_package
+from utils.edge_cache import EdgeCache
+
+# Maximale Anzahl gleichzeitig laufender Tool-Ausführungen
+DEFAULT_MAX_WORKERS = int(os.environ.get("UIN_MCP_MAX_WORKERS", os.cpu_count() or 4))
+
+WORKFLOW_TEMPLATE_PATH = Path("workflows/comfyui-uin-basic.json")
+SCHEMA_PATH = Path("docs/UIN_SCHEMA_v0.6.json")
+
+class LoopLagMonitor:
+    """
+    Misst die Verzögerung des Event-Loops.
+    
+    Ein Hintergrund-Task schläft `interval` Sekunden; wacht er später auf,
+    war der Loop in der Zwischenzeit blockiert. Die Differenz ist der Lag.
+    """
+    
+    def __init__(self, interval: float = 0.1, window: int = 600):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Lag-Statistik in Millisekunden über das letzte Fenster"""
+        ordered = sorted(self.samples)
+        
+        def pct(p):
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+        
+        return {
+            "samples": len(ordered),
+            "interval_ms": self.interval * 1000,
+            "last_ms": self.samples[-1] * 1000 if self.samples else 0.0,
+            "p50_ms": pct(50),
+            "p99_ms": pct(99),
+            "max_ms": self.max_lag * 1000
+        }
+
+class ResourceRegistry:
+    """
+    Lädt JSON-Dateien (Workflow-Templates, Schemas) einmalig und hält sie
+    geparst und fertig serialisiert im Speicher.
+    
+    Ändert sich mtime oder Größe einer Datei, wird sie beim nächsten Zugriff
+    neu geladen. Innerhalb von `check_interval` Sekunden nach der letzten
+    Prüfung wird nicht erneut geprüft, sodass Treffer ohne Syscall direkt
+    auf dem Event-Loop bedient werden können (siehe peek_text).
+    
+    Die geparsten Objekte werden geteilt und dürfen nicht verändert werden;
+    wer sie anpassen will, kopiert nur die betroffenen Teile (copy-on-write).
+    """
+    
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+    
+    def _signature(self, path: Path):
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+    
+    def get(self, path, fallback=None) -> Dict[str, Any]:
+        """
+        Liefert den Eintrag {"data", "text", "source"} für `path`.
+        
+        Args:
+            path: Pfad zur JSON-Datei
+            fallback: Optionale Funktion, deren Rückgabe verwendet wird,
+                      wenn die Datei fehlt (sonst FileNotFoundError)
+        """
+        key = str(path)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry["checked"] < self.check_interval:
+            self.hits += 1
+            return entry
+        
+        signature = self._signature(Path(path))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["signature"] == signature:
+                entry["checked"] = now
+                self.hits += 1
+                return entry
+            
+            if signature is not None:
+                text = Path(path).read_text(encoding="utf-8")
+                data = json.loads(text)
+                source = key
+            elif fallback is not None:
+                data = fallback()
+                text = json.dumps(data, indent=2)
+                source = "fallback"
+            else:
+                raise FileNotFoundError(key)
+            
+            entry = {"data": data, "text": text, "source": source,
+                     "signature": signature, "checked": now}
+            self._entries[key] = entry
+            self.loads += 1
+            return entry
+    
+    def peek_text(self, path) -> Optional[str]:
+        """Serialisierte Fassung, falls frisch geprüft im Speicher, sonst None"""
+        entry = self._entries.get(str(path))
+        if entry is not None and time.monotonic() - entry["checked"] < self.check_interval:
+            self.hits += 1
+            return entry["text"]
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "loads": self.loads,
+            "check_interval_s": self.check_interval
+        }
+
 @dataclass
 class UINTool:
     name: str
@@ -17,11 +168,25 @@ class UINTool:
     handler: callable
 
 class UINMCPServer:
-    def __init__(self, tools_dir: str = "./tools"):
+    def __init__(self, tools_dir: str = "./tools", max_workers: int = DEFAULT_MAX_WORKERS,
+                 cache_dir: Optional[str] = os.environ.get("UIN_EDGE_CACHE_DIR")):
         self.server = Server("uin-universal-image-notation")
         self.tools_dir = Path(tools_dir)
         self.tools_dir.mkdir(exist_ok=True)
         
+        # Begrenzter Worker-Pool für rechenintensive Tools; OpenCV gibt das
+        # GIL beim Dekodieren/Canny/Kodieren frei
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="uin-tool")
+        self.cache = EdgeCache(cache_dir) if cache_dir else None
+        self.loop_monitor = LoopLagMonitor()
+        
+        # Templates und Schema einmal laden, bei mtime-Änderung neu
+        self.resources = ResourceRegistry(
+            float(os.environ.get("UIN_MCP_RESOURCE_CHECK_INTERVAL", 1.0))
+        )
+        
         # Registriere alle verfügbaren Tools
         self._register_tools()
     
@@ -158,17 +323,26 @@ class UINMCPServer:
                     "name": "Basic UIN Examples",
                     "description": "Example UIN JSON files for common scenes",
                     "mimeType": "application/json"
+                },
+                {
+                    "uri": "uin://metrics/loop-lag",
+                    "name": "Event Loop Lag",
+                    "description": "Event loop lag of this server (ms)",
+                    "mimeType": "application/json"
                 }
             ]
         
         @self.server.read_resource()
         async def handle_read_resource(uri: str) -> str:
             if uri == "uin://schema/v0.6":
-                # Lade das tatsächliche Schema
-                schema_path = Path("docs/UIN_SCHEMA_v0.6.json")
-                if schema_path.exists():
-                    return schema_path.read_text()
-                return json.dumps(self._generate_schema_template(), indent=2)
+                # Aus der Registry; nur bei fälliger mtime-Prüfung in den Pool
+                text = self.resources.peek_text(SCHEMA_PATH)
+                if text is None:
+                    text = await self._run_blocking(self._read_schema)
+                return text
+            
+            elif uri == "uin://metrics/loop-lag":
+                return json.dumps(self.loop_monitor.snapshot(), indent=2)
             
             elif uri == "uin://examples/basic":
                 examples = {
@@ -186,6 +360,16 @@ class UINMCPServer:
             
             return f"Resource not found: {uri}"
     
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Führt blockierende I/O- oder CPU-Arbeit im Worker-Pool aus"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+    
+    def _read_schema(self) -> str:
+        return self.resources.get(SCHEMA_PATH, fallback=self._generate_schema_template)["text"]
+    
     async def _handle_extract_edges(self, arguments: Dict) -> List[TextContent]:
         """Handle edge extraction tool"""
         image_path = arguments["image_path"]
@@ -193,55 +377,46 @@ class UINMCPServer:
         high = arguments.get("high_threshold", 200)
         output_dir = arguments.get("output_dir", "./uin_output")
         
-        # Führe Python-Skript aus
-        cmd = [
-            "python", "utils/extract_edges.py",
-            image_path,
-            "-l", str(low),
-            "-H", str(high),
-            "-o", output_dir
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            # Finde generierte Dateien
-            base_name = Path(image_path).stem
-            edge_file = f"{output_dir}/{base_name}_edges.png"
-            json_file = f"{output_dir}/{base_name}_attributes.uin.json"
-            
-            return [
-                TextContent(
-                    type="text",
-                    text=f"✅ Successfully extracted edges!\n\n"
-                         f"• Edge map: {edge_file}\n"
-                         f"• UIN JSON: {json_file}\n\n"
-                         f"Output:\n{result.stdout[:500]}..."
-                ),
-                ImageContent(
-                    type="image",
-                    data=Path(edge_file).read_bytes() if Path(edge_file).exists() else b"",
-                    mimeType="image/png"
-                ) if Path(edge_file).exists() else None
-            ]
-        else:
+        # Extraktion im Worker-Pool, der Event-Loop bleibt frei
+        try:
+            result, edge_png = await self._run_blocking(
+                self._extract_edges, image_path, int(low), int(high), output_dir
+            )
+        except Exception as e:
             return [TextContent(
                 type="text",
-                text=f"❌ Extraction failed:\n{result.stderr}"
+                text=f"❌ Extraction failed:\n{e}"
             )]
+        
+        return [
+            TextContent(
+                type="text",
+                text=f"✅ Successfully extracted edges!\n\n"
+                     f"• Edge map: {result['edge_image']}\n"
+                     f"• UIN JSON: {result['uin_json']}\n\n"
+                     f"Edge density: {result['stats']['edge_percentage']:.2f}%"
+                     f"{' (cached)' if result.get('cache_hit') else ''}"
+            ),
+            ImageContent(
+                type="image",
+                data=base64.b64encode(edge_png).decode('ascii'),
+                mimeType="image/png"
+            )
+        ]
+    
+    def _extract_edges(self, image_path: str, low: int, high: int, output_dir: str):
+        """Erstellt das UIN-Paket und liest die Kantenkarte (läuft in einem Worker-Thread)"""
+        result = create_uin_package(image_path, output_dir, low, high, cache=self.cache)
+        return result, Path(result["edge_image"]).read_bytes()
     
     async def _handle_generate_from_uin(self, arguments: Dict) -> List[TextContent]:
         """Generate image from UIN"""
         uin_json_path = arguments["uin_json_path"]
         
-        with open(uin_json_path, 'r') as f:
-            uin_data = json.load(f)
-        
-        # Generiere Prompt
-        prompt = self._generate_mcp_prompt(uin_data)
-        
-        # Erstelle ComfyUI Workflow
-        workflow = self._create_comfyui_workflow(uin_data, prompt)
+        # Laden, Prompt, Workflow und Serialisierung außerhalb des Loops
+        uin_data, prompt, workflow_json = await self._run_blocking(
+            self._generate_from_uin, uin_json_path
+        )
         
         return [
             TextContent(
@@ -254,11 +429,24 @@ class UINMCPServer:
             ),
             TextContent(
                 type="text",
-                text=f"```json\n{json.dumps(workflow, indent=2)[:1000]}...\n```",
+                text=f"```json\n{workflow_json[:1000]}...\n```",
                 isComplete=False
             )
         ]
     
+    def _generate_from_uin(self, uin_json_path: str):
+        """Lädt UIN, erzeugt Prompt und Workflow (läuft in einem Worker-Thread)"""
+        with open(uin_json_path, 'r') as f:
+            uin_data = json.load(f)
+        
+        # Generiere Prompt
+        prompt = self._generate_mcp_prompt(uin_data)
+        
+        # Erstelle ComfyUI Workflow
+        workflow = self._create_comfyui_workflow(uin_data, prompt)
+        
+        return uin_data, prompt, json.dumps(workflow, indent=2)
+    
     async def _handle_analyze_image(self, arguments: Dict) -> List[TextContent]:
         """Analyze image and suggest UIN attributes"""
         image_path = arguments["image_path"]
@@ -300,12 +488,8 @@ class UINMCPServer:
         uin_input = arguments["uin_json"]
         
         try:
-            # Prüfe ob es ein Pfad oder direkt JSON ist
-            if Path(uin_input).exists():
-                with open(uin_input, 'r') as f:
-                    uin_data = json.load(f)
-            else:
-                uin_data = json.loads(uin_input)
+            # Prüfe ob es ein Pfad oder direkt JSON ist (außerhalb des Loops)
+            uin_data = await self._run_blocking(self._load_uin_input, uin_input)
             
             # Validiere gegen Schema
             errors = self._validate_against_schema(uin_data)
@@ -333,6 +517,12 @@ class UINMCPServer:
                 text=f"Invalid JSON: {str(e)}"
             )]
     
+    def _load_uin_input(self, uin_input: str) -> Dict:
+        if Path(uin_input).exists():
+            with open(uin_input, 'r') as f:
+                return json.load(f)
+        return json.loads(uin_input)
+    
     def _generate_mcp_prompt(self, uin_data: Dict) -> str:
         """Generate optimized prompt for MCP context"""
         prompt_parts = ["Professional photo"]
@@ -365,15 +555,19 @@ class UINMCPServer:
     
     def _create_comfyui_workflow(self, uin_data: Dict, prompt: str) -> Dict:
         """Create ComfyUI workflow from UIN"""
-        with open("workflows/comfyui-uin-basic.json", 'r') as f:
-            workflow = json.load(f)
+        template = self.resources.get(WORKFLOW_TEMPLATE_PATH)["data"]
+        
+        # Copy-on-write: nur den geänderten Prompt-Knoten kopieren
+        workflow = dict(template)
+        workflow["6"] = dict(template["6"])
+        workflow["6"]["inputs"] = dict(template["6"]["inputs"])
         
         # Modifiziere den Workflow basierend auf UIN
         workflow["6"]["inputs"]["text"] = prompt
         
         # Füge ControlNet hinzu falls Kanten vorhanden
         if uin_data.get("edge_reference", {}).get("use_as_control", False):
-            workflow = self._enhance_with_controlnet(workflow, uin_data)
+            workflow = self._enhance_with_controlnet(copy.deepcopy(workflow), uin_data)
         
         return workflow
     
@@ -428,11 +622,16 @@ async def main():
     print("  • generate_from_uin - Generate images from UIN")
     print("  • analyze_image - Analyze images for UIN attributes")
     print("  • validate_uin - Validate UIN JSON files")
+    print(f"\n⚙️  Worker pool: {server.max_workers} concurrent tool executions "
+          f"(UIN_MCP_MAX_WORKERS)")
     print("\n🔗 Connect with:")
     print("  • Claude Desktop")
     print("  • Cursor IDE")
     print("  • Any MCP-compatible client")
     
+    # Loop-Lag messen (Ressource uin://metrics/loop-lag)
+    server.loop_monitor.start()
+    
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
         await server.server.run(
             read_stream,
@@ -441,4 +640,4 @@ async def main():
         )
 
 if __name__ == "__main__":
-    asyncio.run(main()) cash
+    asyncio.run(main())
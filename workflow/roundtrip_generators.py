@@ -0,0 +1,135 @@
+# workflows/roundtrip_generators.py
+"""
+Generatoren für die Roundtrip-Validierung.
+
+Ein Generator erzeugt aus Prompt, Kantenkarte und UIN-Daten ein Bild und
+liefert dessen Pfad:
+
+    generator.generate(prompt, edge_map, uin_data, output_path) -> str
+
+    ComfyUIGenerator      echte Generierung über einen ComfyUI-Server
+    EdgePaletteGenerator  deterministischer CPU-Ersatz ohne Server: füllt
+                          die von Kanten umschlossenen Regionen mit der
+                          Palette des Pakets (für CI und Benchmarks)
+"""
+import json
+import time
+from pathlib import Path
+
+WORKFLOW_TEMPLATE = "workflows/comfyui-uin-basic.json"
+
+# Graustufen, falls das Paket keine Palette enthält
+FALLBACK_PALETTE = ["#d9d9d9", "#a6a6a6", "#737373", "#bfbfbf", "#8c8c8c"]
+
+
+class RoundtripGenerator:
+    name = "base"
+
+    def generate(self, prompt, edge_map, uin_data, output_path):
+        raise NotImplementedError
+
+
+class ComfyUIGenerator(RoundtripGenerator):
+    """Generierung über die ComfyUI-API (Upload, Prompt, Warten, Download)"""
+    name = "comfyui"
+
+    def __init__(self, client, timeout=300):
+        # Erst hier importieren: zieht websocket/Tracker nur bei Bedarf
+        from workflow.comfyui_automation import CompletionTracker
+
+        self.client = client
+        self.timeout = timeout
+        self.tracker = CompletionTracker(client)
+
+    def generate(self, prompt, edge_map, uin_data, output_path):
+        with open(WORKFLOW_TEMPLATE, "r") as f:
+            workflow = json.load(f)
+
+        workflow["6"]["inputs"]["text"] = prompt  # CLIP Text Encode
+        workflow["11"]["inputs"]["image"] = self.client.upload_image(edge_map)  # Load Image
+
+        submitted_at = time.time()
+        result = self.client.queue_prompt(workflow, client_id=self.tracker.client_id)
+        self.tracker.register(result["prompt_id"], submitted_at)
+        completion = self.tracker.wait(result["prompt_id"], self.timeout)
+        if not completion["image"]:
+            raise RuntimeError(f"Prompt {result['prompt_id']} lieferte kein Bild")
+
+        Path(output_path).write_bytes(self.client.fetch_image(completion["image"]))
+        return str(output_path)
+
+
+def _parse_palette(uin_data):
+    """Sucht eine Farbpalette (Hex-Liste) in den bekannten UIN-Feldern"""
+    candidates = [
+        uin_data.get("colors"),
+        uin_data.get("palette"),
+        (uin_data.get("attributes") or {}).get("colors"),
+        (uin_data.get("global") or {}).get("palette"),
+    ]
+    for palette in candidates:
+        if isinstance(palette, list) and palette and all(
+                isinstance(c, str) and c.startswith("#") and len(c) == 7 for c in palette):
+            return palette
+    return FALLBACK_PALETTE
+
+
+class EdgePaletteGenerator(RoundtripGenerator):
+    """
+    Rekonstruiert ein Bild nur aus Kantenkarte und Palette.
+
+    Die kantenfreien Regionen werden per Connected Components bestimmt und
+    nach Fläche absteigend reihum mit den Palettenfarben gefüllt (größte
+    Region = erste Farbe); Kanten werden in der dunkelsten Farbe gezeichnet.
+    Vollständig vektorisiert (Lookup-Tabelle über das Label-Bild) und
+    deterministisch - gleiche Eingabe, gleiches Bild.
+    """
+    name = "edge_palette"
+
+    def __init__(self, smooth_sigma=1.0):
+        self.smooth_sigma = smooth_sigma
+
+    def generate(self, prompt, edge_map, uin_data, output_path):
+        import cv2
+        import numpy as np
+
+        edges = cv2.imread(str(edge_map), cv2.IMREAD_GRAYSCALE)
+        if edges is None:
+            raise ValueError(f"Konnte Kantenkarte nicht laden: {edge_map}")
+
+        # Auf Originalgröße bringen, falls die Kanten verkleinert extrahiert wurden
+        dims = (uin_data.get("metadata", {}).get("statistics", {})
+                .get("original_dimensions"))
+        if dims and (dims["width"], dims["height"]) != (edges.shape[1], edges.shape[0]):
+            edges = cv2.resize(edges, (dims["width"], dims["height"]),
+                               interpolation=cv2.INTER_NEAREST)
+
+        palette_hex = _parse_palette(uin_data)
+        # Hex -> BGR
+        palette = np.array([[int(c[5:7], 16), int(c[3:5], 16), int(c[1:3], 16)]
+                            for c in palette_hex], dtype=np.uint8)
+
+        # Lücken in Kanten schließen, damit Regionen nicht ineinanderlaufen
+        barrier = cv2.dilate((edges > 127).astype(np.uint8), np.ones((3, 3), np.uint8))
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(1 - barrier, connectivity=4)
+
+        # Label 0 = Kanten; übrige nach Fläche sortiert reihum einfärben
+        order = np.argsort(-stats[1:, cv2.CC_STAT_AREA], kind="stable") + 1
+        lut = np.zeros((count, 3), dtype=np.uint8)
+        lut[order] = palette[np.arange(len(order)) % len(palette)]
+        darkest = palette[np.argmin(palette.astype(np.int32).sum(axis=1))]
+        lut[0] = darkest
+
+        image = lut[labels]
+        if self.smooth_sigma:
+            image = cv2.GaussianBlur(image, (0, 0), self.smooth_sigma)
+        image[edges > 127] = darkest // 2
+
+        cv2.imwrite(str(output_path), image)
+        return str(output_path)
+
+
+GENERATORS = {
+    ComfyUIGenerator.name: ComfyUIGenerator,
+    EdgePaletteGenerator.name: EdgePaletteGenerator,
+}
@@ -0,0 +1,308 @@
+# workflows/roundtrip_metrics.py
+"""
+Bildvergleichs-Metriken für die Roundtrip-Validierung.
+
+Alle Funktionen arbeiten auf einzelnen Bildern (H x W [x C]) oder auf
+Stapeln (N x H x W [x C]) und sind mit NumPy/OpenCV vektorisiert:
+
+    ssim      Gaussian-gewichtete SSIM (11er Fenster, sigma 1.5) über die
+              Luminanz; cv2.GaussianBlur filtert separabel (SIMD) auf
+              float32-Ebenen
+    psnr      Peak Signal-to-Noise Ratio in dB (BGR)
+    edge_f1   F1 der Canny-Kantenkarten mit Lagetoleranz in Pixeln
+"""
+import time
+
+import cv2
+import numpy as np
+
+SSIM_WINDOW = 11
+SSIM_SIGMA = 1.5
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+
+def _as_stack(images):
+    """Einzelbild (H x W oder H x W x 3/4) oder Stapel -> Array N x H x W [x C]"""
+    if isinstance(images, np.ndarray):
+        if images.ndim == 2 or (images.ndim == 3 and images.shape[2] in (3, 4)):
+            return images[np.newaxis], True
+        return images, False
+    return np.stack(images), False
+
+
+def to_luma(img):
+    """BGR- oder Graustufenbild -> Luminanz als float32"""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    return img.astype(np.float32)
+
+
+def match_size(original, generated):
+    """Skaliert das generierte Bild auf die Größe des Originals"""
+    height, width = original.shape[:2]
+    if generated.shape[:2] != (height, width):
+        generated = cv2.resize(generated, (width, height), interpolation=cv2.INTER_AREA)
+    if original.ndim != generated.ndim:
+        if generated.ndim == 2:
+            generated = cv2.cvtColor(generated, cv2.COLOR_GRAY2BGR)
+        else:
+            generated = cv2.cvtColor(generated, cv2.COLOR_BGR2GRAY)
+    return generated
+
+
+def _ssim_single(x, y, c1, c2, sigma, window):
+    """Mittlere SSIM zweier float32-Luminanzebenen"""
+    def blur(plane):
+        return cv2.GaussianBlur(plane, (window, window), sigma, borderType=cv2.BORDER_REFLECT)
+
+    mu_x = blur(x)
+    mu_y = blur(y)
+    mu_xx = mu_x * mu_x
+    mu_yy = mu_y * mu_y
+    mu_xy = mu_x * mu_y
+    sigma_x = blur(x * x) - mu_xx
+    sigma_y = blur(y * y) - mu_yy
+    sigma_xy = blur(x * y) - mu_xy
+
+    ssim_map = ((2 * mu_xy + c1) * (2 * sigma_xy + c2)) / \
+               ((mu_xx + mu_yy + c1) * (sigma_x + sigma_y + c2))
+    return float(cv2.mean(ssim_map)[0])
+
+
+def ssim(images1, images2, data_range=255.0, sigma=SSIM_SIGMA, window=SSIM_WINDOW):
+    """
+    Structural Similarity Index (Wang et al. 2004) auf der Luminanz.
+
+    Returns:
+        float für ein Bildpaar, sonst Array der Länge N
+    """
+    stack1, single = _as_stack(images1)
+    stack2, _ = _as_stack(images2)
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+
+    scores = np.array([
+        _ssim_single(to_luma(img1), to_luma(img2), c1, c2, sigma, window)
+        for img1, img2 in zip(stack1, stack2)
+    ])
+    return float(scores[0]) if single else scores
+
+
+def psnr(images1, images2, data_range=255.0):
+    """
+    Peak Signal-to-Noise Ratio in dB (inf bei identischen Bildern).
+
+    Returns:
+        float für ein Bildpaar, sonst Array der Länge N
+    """
+    stack1, single = _as_stack(images1)
+    stack2, _ = _as_stack(images2)
+    # Quadratsumme der Differenzen direkt in OpenCV (ohne float-Kopie)
+    mse = np.array([
+        cv2.norm(img1, img2, cv2.NORM_L2SQR) / img1.size
+        for img1, img2 in zip(stack1, stack2)
+    ])
+    with np.errstate(divide="ignore"):
+        scores = 10 * np.log10((data_range ** 2) / mse)
+    return float(scores[0]) if single else scores
+
+
+def edge_f1(images1, images2, low_threshold=100, high_threshold=200, tolerance=1):
+    """
+    F1-Score der Canny-Kanten: Präzision = Anteil generierter Kanten nahe
+    einer Originalkante, Recall = Anteil Originalkanten nahe einer
+    generierten Kante (Abstand <= tolerance Pixel).
+
+    Returns:
+        dict mit precision, recall, f1 (floats oder Arrays der Länge N)
+    """
+    stack1, single = _as_stack(images1)
+    stack2, _ = _as_stack(images2)
+    n = stack1.shape[0]
+    kernel = np.ones((2 * tolerance + 1, 2 * tolerance + 1), np.uint8)
+
+    def canny(img):
+        return cv2.Canny(to_luma(img).astype(np.uint8), low_threshold, high_threshold)
+
+    counts = np.zeros((n, 4), dtype=np.float64)
+    for i in range(n):
+        edges1 = canny(stack1[i])
+        edges2 = canny(stack2[i])
+        near1 = cv2.dilate(edges1, kernel) if tolerance else edges1
+        near2 = cv2.dilate(edges2, kernel) if tolerance else edges2
+        counts[i] = (
+            cv2.countNonZero(edges1), cv2.countNonZero(edges2),
+            cv2.countNonZero(cv2.bitwise_and(edges2, near1)),
+            cv2.countNonZero(cv2.bitwise_and(edges1, near2))
+        )
+
+    total1, total2, matched2, matched1 = counts.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(total2 > 0, matched2 / total2, total1 == 0)
+        recall = np.where(total1 > 0, matched1 / total1, total2 == 0)
+        f1 = np.where(precision + recall > 0,
+                      2 * precision * recall / (precision + recall), 0.0)
+
+    if single:
+        return {"precision": float(precision[0]), "recall": float(recall[0]), "f1": float(f1[0])}
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def evaluate(originals, generated, **edge_kwargs):
+    """
+    Alle Metriken für ein Bildpaar oder einen Stapel gleich großer Bilder.
+
+    Returns:
+        {"ssim", "psnr", "edge_f1", "edge_precision", "edge_recall"}
+    """
+    edges = edge_f1(originals, generated, **edge_kwargs)
+    return {
+        "ssim": ssim(originals, generated),
+        "psnr": psnr(originals, generated),
+        "edge_f1": edges["f1"],
+        "edge_precision": edges["precision"],
+        "edge_recall": edges["recall"]
+    }
+
+
+class StreamingStats:
+    """
+    Laufende Statistik einer Metrik mit konstantem Speicherbedarf.
+    
+    Mittelwert und Standardabweichung nach Welford; Perzentile werden aus
+    einem Histogramm mit festen Grenzen geschätzt (lineare Interpolation im
+    Bin). Werte außerhalb von [low, high) landen in Unter-/Überlauf,
+    nicht-endliche Werte (z.B. PSNR = inf) werden separat gezählt.
+    """
+    
+    def __init__(self, low, high, bins=100):
+        self.low = low
+        self.high = high
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+        self.non_finite = 0
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+    
+    def add(self, value):
+        value = float(value)
+        if not np.isfinite(value):
+            self.non_finite += 1
+            return
+        
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        
+        if value < self.low:
+            self.underflow += 1
+        elif value >= self.high:
+            self.overflow += 1
+        else:
+            index = min(int((value - self.low) / (self.high - self.low) * len(self.counts)),
+                        len(self.counts) - 1)
+            self.counts[index] += 1
+    
+    def percentile(self, q):
+        """Geschätztes q-Perzentil (0-100) der endlichen Werte"""
+        if self.count == 0:
+            return None
+        target = q / 100 * self.count
+        if target <= self.underflow:
+            return self.min
+        cumulative = self.underflow
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= target:
+                fraction = (target - cumulative) / n
+                value = self.edges[i] + fraction * (self.edges[i + 1] - self.edges[i])
+                return float(min(max(value, self.min), self.max))
+            cumulative += n
+        return self.max
+    
+    def summary(self):
+        std = (self._m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+        return {
+            "count": self.count,
+            "non_finite": self.non_finite,
+            "mean": self.mean if self.count else None,
+            "std": std,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p05": self.percentile(5),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "histogram": {
+                "edges": [float(e) for e in self.edges],
+                "counts": self.counts.tolist(),
+                "underflow": self.underflow,
+                "overflow": self.overflow
+            }
+        }
+
+
+def benchmark(width=1024, height=1024, batch=8, repeat=3):
+    """
+    Durchsatz der Metriken auf synthetischen Bildpaaren.
+
+    Returns:
+        {Metrik: {"ms", "mpix_per_s"}}
+    """
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (batch, height, width, 3), dtype=np.uint8)
+                            .reshape(batch * height, width, 3), (7, 7), 2)
+    originals = base.reshape(batch, height, width, 3)
+    noise = rng.normal(0, 8, originals.shape).astype(np.float32)
+    generated = np.clip(originals + noise, 0, 255).astype(np.uint8)
+    megapixels = batch * width * height / 1e6
+
+    report = {}
+    for name, func in (("ssim", ssim), ("psnr", psnr), ("edge_f1", edge_f1)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(originals, generated)
+            best = min(best, time.perf_counter() - start)
+        report[name] = {"ms": best * 1000, "mpix_per_s": megapixels / best}
+    return report
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SSIM/PSNR/Kanten-F1 zwischen Original und Generierung')
+    parser.add_argument('original', nargs='?', help='Originalbild')
+    parser.add_argument('generated', nargs='?', help='Generiertes Bild')
+    parser.add_argument('--benchmark', action='store_true', help='Durchsatz messen')
+    parser.add_argument('--size', type=int, default=1024, help='Kantenlänge der Benchmark-Bilder')
+    parser.add_argument('--batch', type=int, default=8, help='Bilder pro Stapel im Benchmark')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        report = benchmark(args.size, args.size, args.batch)
+        print(f"📊 {args.batch} x {args.size}x{args.size} px:")
+        for name, r in report.items():
+            print(f"   {name:8s} {r['ms']:8.1f} ms  {r['mpix_per_s']:8.1f} MP/s")
+        return
+
+    if not (args.original and args.generated):
+        parser.error("original und generated angeben (oder --benchmark)")
+
+    original = cv2.imread(args.original)
+    generated = cv2.imread(args.generated)
+    if original is None or generated is None:
+        raise SystemExit("Konnte Bilder nicht laden")
+    metrics = evaluate(original, match_size(original, generated))
+    for name, value in metrics.items():
+        print(f"   {name:15s} {value:.4f}")
+
+
+if __name__ == "__main__":
+    main()
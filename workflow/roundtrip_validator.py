@@ -1,43 +1,100 @@
 # workflows/roundtrip_validator.py
 import json
-import subprocess
-import cv2
-import numpy as np
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-import matplotlib.pyplot as plt
+
+# cv2 und matplotlib werden erst bei Bedarf importiert (Import-Zeit)
+
+# Gemeinsamer Code liegt in den Paketen utils/, uin_capsule/ und workflow/
+# der Repo-Wurzel
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(1, str(REPO_ROOT))
+
+from workflow.comfyui_client import ComfyUIClient
+from workflow.roundtrip_generators import GENERATORS, ComfyUIGenerator
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+# Feste Histogramm-Grenzen für die Batch-Statistik: (untere, obere Grenze, Bins)
+AGGREGATE_RANGES = {
+    "ssim": (-1.0, 1.0, 200),
+    "psnr": (0.0, 60.0, 120),
+    "edge_preservation": (0.0, 1.0, 100),
+    "compression_ratio": (0.0, 200.0, 200)
+}
 
 class UINRoundtripValidator:
-    def __init__(self, comfyui_url="http://localhost:8188"):
+    def __init__(self, comfyui_url="http://localhost:8188", generator=None):
+        """
+        Args:
+            comfyui_url: ComfyUI Server-URL (für den Standard-Generator)
+            generator: Objekt mit generate(prompt, edge_map, uin_data, output_path);
+                       Standard ist ComfyUIGenerator, offline z.B. EdgePaletteGenerator
+        """
         self.comfyui_url = comfyui_url
+        self.client = ComfyUIClient(comfyui_url)
+        self._generator = generator
+    
+    @property
+    def generator(self):
+        # ComfyUI-Generator erst bei Bedarf (Import von Tracker/websocket)
+        if self._generator is None:
+            self._generator = ComfyUIGenerator(self.client)
+        return self._generator
         
-    def validate_single_image(self, image_path, uin_json_path=None):
-        """Vollständiger Roundtrip-Test für ein einzelnes Bild"""
-        results = {}
+    def validate_single_image(self, image_path, uin_json_path=None,
+                              output_dir="./validation_output", report=True):
+        """
+        Vollständiger Roundtrip-Test für ein einzelnes Bild
+        
+        Returns:
+            {"metrics", "generated_image", "report", "timings_ms"} mit Zeiten
+            der Stufen package, generate und metrics; report ist der Pfad des
+            Reports oder None
+        """
+        timings = {}
+        start = time.perf_counter()
+        # Endung im Namen: a.jpg und a.png dürfen sich nicht überschreiben
+        name = f"{Path(image_path).stem}_{Path(image_path).suffix.lstrip('.')}"
+        package_dir = Path(output_dir) / name
         
         # 1. Falls kein UIN vorhanden: Erstelle es aus dem Bild
+        #    (im Prozess, eigenes Unterverzeichnis pro Bild -> parallel nutzbar)
         if not uin_json_path:
-            print("🔄 Erstelle UIN-Paket aus Bild...")
-            result = subprocess.run(
-                ["python", "utils/extract_edges.py", image_path, 
-                 "-o", "./validation_output"],
-                capture_output=True,
-                text=True
-            )
-            uin_json_path = "./validation_output/attributes.uin.json"
+            from utils.extract_edges import create_uin_package
+            
+            package = create_uin_package(image_path, package_dir, preview=False)
+            uin_json_path = package["uin_json"]
         
         # 2. Lade UIN und generiere Prompt
         with open(uin_json_path, 'r') as f:
             uin_data = json.load(f)
         
         prompt = self._generate_prompt(uin_data)
-        edge_map = uin_data["edge_reference"]["file_name"]
+        # Kantenbild liegt neben dem UIN-JSON
+        edge_map = str(Path(uin_json_path).parent / uin_data["edge_reference"]["file_name"])
         
-        # 3. Generiere Bild via ComfyUI API
-        generated_image = self._generate_via_comfyui(prompt, edge_map)
+        timings["package"] = (time.perf_counter() - start) * 1000
+        
+        # 3. Generiere Bild (ComfyUI oder lokaler Ersatz)
+        start = time.perf_counter()
+        package_dir.mkdir(parents=True, exist_ok=True)
+        generated_image = self.generator.generate(
+            prompt, edge_map, uin_data, package_dir / f"{name}_generated.png"
+        )
+        timings["generate"] = (time.perf_counter() - start) * 1000
         
         # 4. Berechne Metriken
+        start = time.perf_counter()
+        import cv2
+        from workflow import roundtrip_metrics
         original = cv2.imread(image_path)
-        generated = cv2.imread(generated_image)
+        # Generierung hat oft eine andere Auflösung als das Original
+        generated = roundtrip_metrics.match_size(original, cv2.imread(generated_image))
         
         metrics = {
             "ssim": self._calculate_ssim(original, generated),
@@ -47,39 +104,137 @@ class UINRoundtripValidator:
                                 (Path(uin_json_path).stat().st_size + 
                                  Path(edge_map).stat().st_size)
         }
+        timings["metrics"] = (time.perf_counter() - start) * 1000
         
         # 5. Visualisiere Ergebnisse
-        self._create_validation_report(image_path, generated_image, metrics, uin_data)
+        report_path = None
+        if report:
+            report_path = self._create_validation_report(image_path, generated_image, metrics,
+                                                         uin_data, output_dir, name)
         
-        return {"metrics": metrics, "generated_image": generated_image}
+        return {"metrics": metrics, "generated_image": generated_image,
+                "report": report_path, "timings_ms": timings}
     
-    def batch_validation(self, image_dir, output_dir="./batch_validation"):
-        """Validierung für einen ganzen Datensatz"""
-        Path(output_dir).mkdir(exist_ok=True)
-        
-        results = []
-        image_files = list(Path(image_dir).glob("*.jpg")) + \
-                     list(Path(image_dir).glob("*.png"))
-        
-        for img_path in image_files[:10]:  # Teste erst 10 Bilder
-            print(f"Teste: {img_path.name}")
-            try:
-                result = self.validate_single_image(str(img_path))
-                results.append({
-                    "image": img_path.name,
-                    **result["metrics"]
-                })
+    def batch_validation(self, image_dir, output_dir="./batch_validation", workers=4,
+                         limit=None, report=False):
+        """
+        Validierung für einen ganzen Datensatz
+        
+        Bilder werden parallel validiert (höchstens 2 x workers gleichzeitig
+        angenommen). Jedes Ergebnis wird sofort als Zeile an results.jsonl
+        angehängt; die Statistik (Mittelwert, Perzentile, Histogramme) wird
+        laufend aktualisiert, ohne alle Ergebnisse im Speicher zu halten.
+        Mit report=True stehen die Report-Pfade in den Zeilen und, nach Bild
+        sortiert, unter "reports" in der Zusammenfassung.
+        
+        Returns:
+            Zusammenfassung (wie summary.json)
+        """
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        
+        from workflow import roundtrip_metrics
+        aggregates = {
+            name: roundtrip_metrics.StreamingStats(low, high, bins)
+            for name, (low, high, bins) in AGGREGATE_RANGES.items()
+        }
+        processed = failed = 0
+        stage_totals = {}
+        reports = []
+        start = time.perf_counter()
+        
+        def run(img_path):
+            result = self.validate_single_image(str(img_path), output_dir=output_dir,
+                                                report=report)
+            return {"image": img_path.name, **result["metrics"],
+                    "report": result["report"], "timings_ms": result["timings_ms"]}
+        
+        with open(Path(output_dir) / "results.jsonl", "w") as journal, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            images = iter(self._iter_images(image_dir, limit))
+            exhausted = False
+            
+            while pending or not exhausted:
+                # Fenster auffüllen, ohne den ganzen Datensatz einzureihen
+                while not exhausted and len(pending) < 2 * workers:
+                    img_path = next(images, None)
+                    if img_path is None:
+                        exhausted = True
+                    else:
+                        pending[executor.submit(run, img_path)] = img_path
+                if not pending:
+                    break
                 
-                # Speichere Fortschritt
-                with open(f"{output_dir}/progress.json", "w") as f:
-                    json.dump(results, f, indent=2)
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    img_path = pending.pop(future)
+                    processed += 1
+                    try:
+                        record = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"Fehler bei {img_path}: {e}")
+                        record = {"image": img_path.name, "error": str(e)}
+                    else:
+                        for name, stats in aggregates.items():
+                            if record.get(name) is not None:
+                                stats.add(record[name])
+                        for stage, ms in record["timings_ms"].items():
+                            stage_totals[stage] = stage_totals.get(stage, 0.0) + ms
+                        if record["report"]:
+                            reports.append({"image": record["image"],
+                                            "report": record["report"]})
                     
-            except Exception as e:
-                print(f"Fehler bei {img_path}: {e}")
+                    journal.write(json.dumps(record) + "\n")
+                    journal.flush()
+                    if processed % 100 == 0:
+                        print(f"   {processed} Bilder validiert ({failed} Fehler)")
+        
+        elapsed = time.perf_counter() - start
+        summary = {
+            "images": processed,
+            "succeeded": processed - failed,
+            "failed": failed,
+            "workers": workers,
+            "elapsed_s": elapsed,
+            "images_per_s": processed / elapsed if elapsed > 0 else 0.0,
+            "generator": getattr(self.generator, "name", type(self.generator).__name__),
+            "stage_mean_ms": {stage: total / (processed - failed)
+                              for stage, total in stage_totals.items()},
+            "metrics": {name: stats.summary() for name, stats in aggregates.items()},
+            "reports": sorted(reports, key=lambda r: r["image"])
+        }
         
         # Erstelle Zusammenfassung
-        self._create_batch_summary(results, output_dir)
-        return results
+        self._create_batch_summary(summary, output_dir)
+        return summary
+    
+    def _iter_images(self, image_dir, limit=None):
+        """Bilder eines Ordners in einem Verzeichnisdurchlauf (sortiert)"""
+        with os.scandir(image_dir) as entries:
+            names = sorted(
+                entry.name for entry in entries
+                if entry.is_file() and Path(entry.name).suffix.lower() in IMAGE_SUFFIXES
+            )
+        for name in names[:limit]:
+            yield Path(image_dir) / name
+    
+    def _create_batch_summary(self, summary, output_dir):
+        """Schreibt summary.json und gibt die Kernzahlen aus"""
+        with open(Path(output_dir) / "summary.json", "w") as f:
+            json.dump(summary, f, indent=2)
+        
+        print(f"✅ {summary['succeeded']}/{summary['images']} Bilder validiert "
+              f"({summary['images_per_s']:.2f} Bilder/s, {summary['workers']} Worker)")
+        if summary["stage_mean_ms"]:
+            print("   Ø Stufen: " + ", ".join(f"{stage} {ms:.1f} ms"
+                                              for stage, ms in summary["stage_mean_ms"].items()))
+        for name, stats in summary["metrics"].items():
+            if stats["count"]:
+                print(f"   {name:18s} Ø {stats['mean']:.3f}  p50 {stats['p50']:.3f}  "
+                      f"p95 {stats['p95']:.3f}")
+        if summary["reports"]:
+            print(f"   📊 {len(summary['reports'])} Reports in {output_dir}")
     
     def _generate_prompt(self, uin_data):
         """Generiere Prompt aus UIN (wie in React-Tool)"""
@@ -95,34 +250,62 @@ class UINRoundtripValidator:
         prompt += "sharp focus, masterpiece"
         return prompt
     
-    def _generate_via_comfyui(self, prompt, edge_map):
-        """Sende Generation an ComfyUI"""
-        import requests
-        
-        # Lade Workflow-Template
-        with open("workflows/comfyui-uin-basic.json", "r") as f:
-            workflow = json.load(f)
-        
-        # Ersetze Platzhalter
-        # ... (Implementierung basierend auf deinem Workflow) ...
-        
-        response = requests.post(f"{self.comfyui_url}/prompt", json={"prompt": workflow})
-        return response.json()["generated_image_path"]
-    
     def _calculate_ssim(self, img1, img2):
         """Structural Similarity Index"""
-        # Implementierung mit skimage oder OpenCV
-        return 0.85  # Beispielwert
+        from workflow import roundtrip_metrics
+        return roundtrip_metrics.ssim(img1, img2)
+    
+    def _calculate_psnr(self, img1, img2):
+        """Peak Signal-to-Noise Ratio in dB"""
+        from workflow import roundtrip_metrics
+        return roundtrip_metrics.psnr(img1, img2)
     
-    def _create_validation_report(self, original_path, generated_path, metrics, uin_data):
-        """Erstelle visuellen Report"""
-        fig, axes = plt.subplots(2, 3, figsize=(15, 10))
+    def _edge_preservation_score(self, img1, img2):
+        """F1 der Canny-Kanten von Original und Generierung"""
+        from workflow import roundtrip_metrics
+        return roundtrip_metrics.edge_f1(img1, img2)["f1"]
+    
+    def _create_validation_report(self, original_path, generated_path, metrics, uin_data,
+                                  output_dir="./validation_output", name=None):
+        """Erstelle visuellen Report und gib dessen Pfad zurück"""
+        # Figure statt pyplot: ohne globalen Zustand, thread-sicher in Batches
+        from matplotlib.figure import Figure
+        
+        fig = Figure(figsize=(15, 10))
+        axes = fig.subplots(2, 3)
         
         # Visualisierungen...
-        plt.savefig(f"./validation_output/report_{Path(original_path).stem}.png")
-        plt.close()
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        report_path = Path(output_dir) / f"report_{name or Path(original_path).stem}.png"
+        fig.savefig(report_path)
+        return str(report_path)
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='UIN Roundtrip-Validierung (Bild -> UIN -> ComfyUI -> Bild)')
+    parser.add_argument('input', nargs='?', default='examples/test_image.jpg',
+                        help='Bild oder (mit --batch) Ordner mit Bildern')
+    parser.add_argument('--uin', help='Vorhandenes UIN-JSON statt Neuerstellung')
+    parser.add_argument('--batch', action='store_true', help='Ganzen Ordner validieren')
+    parser.add_argument('-o', '--output', default='./batch_validation', help='Ausgabe-Ordner (Batch)')
+    parser.add_argument('--comfyui-url', default='http://localhost:8188', help='ComfyUI Server-URL')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='Parallele Validierungen (Batch)')
+    parser.add_argument('--limit', type=int, help='Nur die ersten N Bilder validieren (Batch)')
+    parser.add_argument('--generator', choices=sorted(GENERATORS), default='comfyui',
+                        help='Bildgenerator (edge_palette: offline, ohne ComfyUI)')
+    parser.add_argument('--offline', action='store_true', help='Kurz für --generator edge_palette')
+    parser.add_argument('--no-report', action='store_true', help='Keinen Report (Matplotlib) erstellen')
+    args = parser.parse_args()
+    
+    generator_name = 'edge_palette' if args.offline else args.generator
+    generator = None if generator_name == 'comfyui' else GENERATORS[generator_name]()
+    validator = UINRoundtripValidator(args.comfyui_url, generator)
+    if args.batch:
+        validator.batch_validation(args.input, args.output, args.workers, args.limit)
+    else:
+        result = validator.validate_single_image(args.input, args.uin, report=not args.no_report)
+        print(f"Roundtrip-Score: {result['metrics']['ssim']:.2%}")
 
-# Usage
-validator = UINRoundtripValidator()
-result = validator.validate_single_image("examples/test_image.jpg")
-print(f"Roundtrip-Score: {result['metrics']['ssim']:.2%}")
+if __name__ == "__main__":
+    main()